@@ -0,0 +1,141 @@
+"""Admission control: per-endpoint concurrency caps with immediate load shedding.
+
+Each capped endpoint (or named pool, such as the LLM calls inside ``/chat``)
+admits up to ``limit`` requests at a time in this worker; up to ``queue``
+more may wait ``queue_timeout`` seconds for a slot, and anything beyond that
+is refused at once with 503 and a Retry-After estimated from recent service
+times. Endpoints without a cap are never held back, so cheap requests keep
+flowing while expensive ones are saturated. Caps are per worker process.
+
+Limits are given as ``{"/generate_script": 4, "llm": 8}`` or parsed from a
+string like ``"/generate_script=4,llm=8"`` (see ``parse_limits``).
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, jsonify, request
+
+
+class Shed(Exception):
+    """Raised by ``AdmissionController.slot`` when a pool is saturated."""
+
+    def __init__(self, pool, retry_after):
+        super().__init__(f"{pool} is saturated")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+def parse_limits(value, defaults=None):
+    limits = dict(defaults or {})
+    for item in (value or "").split(","):
+        name, _, limit = item.strip().partition("=")
+        if name and limit:
+            limits[name] = int(limit)
+    return limits
+
+
+class _Pool:
+    __slots__ = ("limit", "queue", "in_flight", "waiting", "condition", "service_time")
+
+    def __init__(self, limit, queue):
+        self.limit = limit
+        self.queue = queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+        self.service_time = 1.0  # EWMA of seconds per request
+
+
+class AdmissionController:
+    def __init__(self, limits, queue=None, queue_timeout=0.5, registry=None):
+        self.pools = {name: _Pool(limit, limit if queue is None else queue) for name, limit in limits.items()}
+        self.queue_timeout = queue_timeout
+        self.registry = registry
+        if registry is not None:
+            registry.counter("admission_shed_total", "Requests refused with 503 because a pool was saturated.")
+            registry.gauge("admission_queued", "Requests waiting for a slot, by pool.")
+
+    def acquire(self, name):
+        """Take a slot in pool ``name`` (True), or None if it has no cap; raises Shed when saturated."""
+        pool = self.pools.get(name)
+        if pool is None:
+            return None
+        with pool.condition:
+            if pool.in_flight < pool.limit:
+                pool.in_flight += 1
+                return True
+            if pool.waiting >= pool.queue or self.queue_timeout <= 0:
+                raise self._shed(name, pool)
+            pool.waiting += 1
+            self._gauge(name, pool)
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while pool.in_flight >= pool.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._shed(name, pool)
+                    pool.condition.wait(remaining)
+                pool.in_flight += 1
+                return True
+            finally:
+                pool.waiting -= 1
+                self._gauge(name, pool)
+
+    def release(self, name, seconds):
+        pool = self.pools[name]
+        with pool.condition:
+            pool.in_flight -= 1
+            pool.service_time += 0.2 * (seconds - pool.service_time)
+            pool.condition.notify()
+
+    @contextmanager
+    def slot(self, name):
+        """Hold a slot in pool ``name`` for the duration of the block."""
+        admitted = self.acquire(name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            if admitted:
+                self.release(name, time.monotonic() - started)
+
+    def snapshot(self):
+        return {name: {"limit": pool.limit, "in_flight": pool.in_flight, "waiting": pool.waiting,
+                       "service_time": round(pool.service_time, 3)} for name, pool in self.pools.items()}
+
+    def _shed(self, name, pool):
+        if self.registry is not None:
+            self.registry.inc("admission_shed_total", pool=name)
+        # Time for the backlog ahead of a new request to drain through the pool's slots.
+        backlog = pool.in_flight + pool.waiting
+        return Shed(name, max(1, math.ceil(pool.service_time * backlog / max(1, pool.limit))))
+
+    def _gauge(self, name, pool):
+        if self.registry is not None:
+            self.registry.set("admission_queued", pool.waiting, pool=name)
+
+    # ✅ Flask integration: endpoint caps checked before the view runs
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.teardown_request(self._teardown)
+        app.errorhandler(Shed)(shed_response)
+
+    def _before(self):
+        name = request.url_rule.rule if request.url_rule else None
+        if name in self.pools:
+            self.acquire(name)  # Shed propagates to the error handler
+            g.admission = (name, time.monotonic())
+
+    def _teardown(self, error=None):
+        admitted = g.pop("admission", None)
+        if admitted is not None:
+            self.release(admitted[0], time.monotonic() - admitted[1])
+
+
+def shed_response(error):
+    response = jsonify({"error": "⚠️ The server is busy. Please try again shortly.", "retry_after": error.retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
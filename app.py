@@ -1,78 +1,591 @@
+import hashlib
 import os
-import subprocess
-from flask import Flask, request, jsonify, send_file
+import sqlite3
+import time
+import uuid
+
+import click
+import numpy as np
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
-import openai
+from flask_caching import Cache
+from werkzeug.utils import safe_join
+
+import admission
+import circuit_breaker
+import conversation_memory
+import downsample
+import fallbacks
+import fragments
+import idempotency
+import inp_parser
+import job_estimator
+import job_queue
+import llm
+import mesh_preview
+import metrics
+import prompt_builder
+import rate_limiter
+import results_store
+import script_generator
+import shared_db
+import traffic_recorder
+import usage_ledger
 
 app = Flask(__name__)
 CORS(app)
 
-# ✅ Load API Key from Environment Variables
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("❌ OpenAI API Key is missing. Set OPENAI_API_KEY in environment variables.")
+# ✅ Bounded cache for repeated result views (oldest entries are pruned past the threshold)
+cache = Cache(app, config={'CACHE_TYPE': 'simple', 'CACHE_THRESHOLD': int(os.getenv("VIEW_CACHE_SIZE", 256))})
+
+# ✅ OpenAI Client (OPENAI_API_KEY / OPENAI_BASE_URL) is built on first use by llm.get_client(), keeping cold starts fast
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+
+# ✅ Runtime data (uploaded decks, parse caches) lives outside the tracked tree
+DATA_DIR = os.getenv("DATA_DIR", "instance")
+INP_CACHE_DIR = os.path.join(DATA_DIR, "inp_cache")
+MODELS_DIR = os.path.join(DATA_DIR, "models")  # uploaded decks: the only files /run_script accepts by path
+MODEL_UPLOAD_TTL = int(os.getenv("MODEL_UPLOAD_TTL", 86400))
+
+def model_deck(path):
+    """Absolute path of an existing .inp deck under MODELS_DIR named by ``path`` (relative to DATA_DIR), else None."""
+    deck = safe_join(DATA_DIR, path)
+    if not deck or not deck.lower().endswith(".inp"):
+        return None
+    deck = os.path.realpath(deck)
+    if os.path.dirname(deck) != os.path.realpath(MODELS_DIR) or not os.path.isfile(deck):
+        return None
+    return deck
+
+def prune_uploads():
+    """Delete uploaded decks older than MODEL_UPLOAD_TTL."""
+    cutoff = time.time() - MODEL_UPLOAD_TTL
+    try:
+        entries = list(os.scandir(MODELS_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass  # removed by another worker
+
+# ✅ Sampled, Scrubbed Traffic Recording for Replay Load Tests (replay.py)
+traffic_recorder.TrafficRecorder(
+    os.getenv("TRAFFIC_RECORD_PATH", os.path.join(DATA_DIR, "traffic", "requests.jsonl")),
+    sample_rate=float(os.getenv("TRAFFIC_SAMPLE_RATE", 0)),
+).init_app(app)
+
+# ✅ Metrics: per-endpoint and per-stage latency, tokens, cache and job timings, summed across workers at /metrics
+registry = metrics.Registry(os.getenv("METRICS_DIR", os.path.join(DATA_DIR, "metrics")))
+registry.init_app(app)
+registry.histogram("abaqus_job_queue_wait_seconds", "Time Abaqus jobs waited in the queue.", metrics.JOB_BUCKETS)
+registry.histogram("abaqus_job_runtime_seconds", "Abaqus subprocess wall time by kind and status.", metrics.JOB_BUCKETS)
+registry.histogram("results_ingest_seconds", "Time to ingest a finished job's solver output.")
+
+# ✅ Upstream Connection Pool: one keep-alive client per worker, pre-warmed, with reuse metrics at /metrics
+llm.transport.init_metrics(registry)
+llm.transport.init_app(app)
+
+# ✅ Token and Cost Accounting per user, endpoint, model and cache outcome (reported at /usage)
+ledger = usage_ledger.UsageLedger(
+    os.path.join(DATA_DIR, "usage.sqlite3"),
+    prices=usage_ledger.load_prices(os.getenv("MODEL_PRICES")),
+)
+
+# ✅ Abaqus Job Queue (shortest expected job first, with aging)
+estimator = job_estimator.JobEstimator(os.path.join(DATA_DIR, "estimator.json"))
+jobs = job_queue.JobQueue(
+    estimator,
+    os.path.join(DATA_DIR, "jobs"),
+    workers=int(os.getenv("ABAQUS_WORKERS", 1)),
+    aging_rate=float(os.getenv("JOB_AGING_RATE", 1.0)),
+    script_command=os.getenv("ABAQUS_COMMAND", job_queue.SCRIPT_COMMAND),
+    deck_command=os.getenv("ABAQUS_DECK_COMMAND", job_queue.DECK_COMMAND),
+)
+# ✅ Post-processing: record job timings, then parse .sta/.msg/.dat into the columnar results store
+def record_job_metrics(job):
+    kind = "deck" if job.script_path.endswith(".inp") else "script"
+    if job.started_at is not None:
+        registry.observe("abaqus_job_queue_wait_seconds", job.started_at - job.submitted_at, kind=kind)
+        registry.observe("abaqus_job_runtime_seconds", job.finished_at - job.started_at, kind=kind, status=job.status)
+
+def ingest_job_results(job):
+    with registry.timer("results_ingest_seconds"):
+        results_store.ingest_job(job.work_dir)
+
+jobs.on_complete.append(record_job_metrics)
+jobs.on_complete.append(ingest_job_results)
+
+# ✅ Stable Prompt Prefix (instructions + Abaqus reference) so upstream prompt caching can hit
+script_prompt = prompt_builder.PromptBuilder(
+    prompt_builder.Segment("script-instructions", prompt_builder.STATIC, "1", "You are an expert in Abaqus scripting."),
+    prompt_builder.reference_segment(),
+)
+# Structured mode: the model returns a model spec (model_spec.py) that is rendered locally
+spec_prompt = prompt_builder.PromptBuilder(
+    prompt_builder.Segment("spec-instructions", prompt_builder.STATIC, "1",
+                           "You are an expert in Abaqus modelling. Describe the requested model by calling "
+                           "emit_model_spec; the script is generated from it. Use mm, N, MPa, tonne/mm^3 and s. "
+                           "Beams run along x and solids along z from the fixed end at 0 to the free end; "
+                           "shells are plates in the XY plane fixed along x=0."),
+    prompt_builder.reference_segment(),
+)
+prompt_cache_stats = prompt_builder.PrefixCacheStats()
+SCRIPT_MODES = ("text", "spec")
+SCRIPT_MODE = os.getenv("SCRIPT_MODE", "text")
+registry.counter("script_spec_total", "Structured script requests by outcome (generated, cached, invalid).")
+# Components (materials, step sequences, sections, meshes) known before the call are not asked of the model again
+fragment_store = fragments.FragmentStore(os.path.join(DATA_DIR, "fragments.sqlite3"), registry=registry)
+
+# ✅ Idempotency-Key Support: retries and double-clicks replay the first response instead of rerunning it
+idempotency.IdempotencyStore(
+    os.path.join(DATA_DIR, "idempotency.sqlite3"),
+    ttl=int(os.getenv("IDEMPOTENCY_TTL", 86400)),
+    max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10000)),
+).init_app(app, ["/generate_script", "/run_script"])
+
+# ✅ Rate Limits per user and per IP (requests and estimated LLM tokens), shared by all workers
+rate_limiter.RateLimiter(
+    os.path.join(DATA_DIR, "ratelimit.sqlite3"),
+    {
+        "/generate_script": rate_limiter.Rule(
+            requests=os.getenv("RATE_LIMIT_REQUESTS", "10/min"),
+            tokens=os.getenv("RATE_LIMIT_TOKENS", "60000/hour"),
+            cost=lambda req: script_generator.MAX_TOKENS + conversation_memory.estimate_tokens(
+                str((req.get_json(silent=True) or {}).get("description", ""))),
+        ),
+        "/run_script": rate_limiter.Rule(requests=os.getenv("RATE_LIMIT_RUNS", "30/hour")),
+    },
+    trust_proxy=os.getenv("RATE_LIMIT_TRUST_PROXY") == "1",
+    registry=registry,
+).init_app(app)
+
+# ✅ Admission Control: expensive endpoints get small concurrency caps and shed excess load with 503 + Retry-After
+admission_control = admission.AdmissionController(
+    admission.parse_limits(os.getenv("ADMISSION_LIMITS"), {
+        "/generate_script": 4, "/run_script": 8, "/preview": 2, "/inp/stats": 2,
+    }),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 0.5)),
+    registry=registry,
+)
+admission_control.init_app(app)
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# ✅ Circuit Breaker around the LLM: adaptive timeouts, template scripts while upstream is down
+llm_breaker = circuit_breaker.CircuitBreaker("openai", timeout_ceiling=float(os.getenv("LLM_TIMEOUT_MAX", 60)))
+registry.counter("fallback_responses_total", "Degraded responses while the LLM was unavailable, by kind.")
+
+def complete(builder, body, user_id):
+    with registry.stage("upstream"):
+        response = llm_breaker.call(
+            lambda timeout: llm.get_client().with_options(timeout=timeout, max_retries=0).chat.completions.create(**body))
+    prompt_cache_stats.record(builder, response.usage)
+    registry.count_tokens(response.usage, model=OPENAI_MODEL)
+    ledger.record_usage(user_id, "/generate_script", OPENAI_MODEL, "none", response.usage)
+    return response
+
+def generate_model_spec(user_request, user_id):
+    """A validated model spec for the request, cached by normalised description; None if the model's answer is invalid."""
+    import model_spec  # pydantic loads on first use, not at startup (see import_budget.py)
+
+    description = " ".join(user_request.lower().split())
+    key = f"model_spec:{spec_prompt.fingerprint}:{hashlib.sha256(description.encode()).hexdigest()}"
+    with registry.stage("cache_get"):
+        cached = cache.get(key)
+    if cached is not None:
+        registry.inc("script_spec_total", outcome="cached")
+        ledger.record(user_id, "/generate_script", OPENAI_MODEL, "hit",
+                      sum(conversation_memory.message_tokens(message) for message in spec_prompt.messages(user_request)),
+                      conversation_memory.estimate_tokens(cached))
+        return model_spec.from_json(cached)
+    known, outcomes = fragment_store.resolve(user_request)
+    while True:
+        body = model_spec.request_body(spec_prompt, user_request, OPENAI_MODEL, known)
+        response = complete(spec_prompt, body, user_id)
+        try:
+            spec = model_spec.parse_message(response.choices[0].message, known)
+            break
+        except model_spec.SpecError as e:
+            if known:  # the reused components may not fit what the model chose; ask for everything once
+                known, outcomes = {}, dict.fromkeys(outcomes, "miss")
+                continue
+            registry.inc("script_spec_total", outcome="invalid")
+            app.logger.warning("⚠️ Falling back to a text script: %s", e)
+            return None
+    registry.inc("script_spec_total", outcome="generated")
+    fragment_store.remember(spec.model_dump())
+    fragment_store.record(known, outcomes)
+    cache.set(key, model_spec.spec_json(spec), timeout=86400)
+    return spec
 
 # ✅ Function to Generate Abaqus Python Scripts
-def generate_abaqus_script(user_request):
-    """Uses AI to generate an Abaqus Python script based on user input."""
-    prompt = f"Generate a complete Abaqus Python script for: {user_request}"
-
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an expert in Abaqus scripting."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=500,
-        temperature=0.3
-    )
-
-    script = response.choices[0].message.content.strip()
+def generate_abaqus_script(user_request, user_id="anonymous", mode=SCRIPT_MODE):
+    """Uses AI to generate an Abaqus Python script based on user input.
+
+    In "spec" mode the model only fills in a model spec, rendered locally (text mode if that fails).
+    Returns (script path, degraded, spec); degraded scripts come from a template when the LLM is unavailable.
+    """
+    spec = None
+    try:
+        if mode == "spec":
+            spec = generate_model_spec(user_request, user_id)
+        if spec is not None:
+            import model_spec
+
+            with registry.stage("render"):
+                script = model_spec.render(spec, user_request)
+        else:
+            response = complete(script_prompt, script_generator.request_body(script_prompt, user_request, OPENAI_MODEL),
+                                user_id)
+            script = script_generator.extract_code(response.choices[0].message.content)
+        degraded = False
+    except (circuit_breaker.CircuitOpen, *circuit_breaker.UPSTREAM_ERRORS):
+        registry.inc("fallback_responses_total", kind="template_script")
+        script = fallbacks.template_script(user_request)
+        degraded = True
 
     script_path = "static/generated_script.py"
-    with open(script_path, "w") as file:
+    with registry.stage("file_write"), open(script_path, "w") as file:
         file.write(script)
 
-    return script_path
+    return script_path, degraded, spec
+
+# ✅ CLI for Bulk Generation: flask --app app generate-scripts descriptions.jsonl
+@app.cli.command("generate-scripts")
+@click.argument("input_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--out", "out_dir", default=os.path.join(DATA_DIR, "generated"), show_default=True,
+              help="Output directory (manifest, batch state and content-addressed scripts).")
+@click.option("--mode", type=click.Choice(["auto", "batch", "pool"]), default="auto", show_default=True,
+              help="auto: Batch API with a concurrent fallback; batch: Batch API only; pool: concurrent requests only.")
+@click.option("--concurrency", default=8, show_default=True, help="Concurrent requests without the Batch API.")
+@click.option("--poll-interval", default=30.0, show_default=True, help="Seconds between batch status checks.")
+@click.option("--column", default="description", show_default=True, help="JSONL field / CSV column to read.")
+def generate_scripts_command(input_path, out_dir, mode, concurrency, poll_interval, column):
+    """Generate scripts for every description in a JSONL or CSV file (resumable)."""
+    try:
+        items = script_generator.read_descriptions(input_path, column)
+    except (ValueError, KeyError) as e:
+        raise click.ClickException(str(e))
+
+    run = script_generator.BulkRun(llm.get_client(), script_prompt, OPENAI_MODEL, out_dir)
+    counts = run.run(items, mode=mode, concurrency=concurrency, poll_interval=poll_interval)
+    click.echo(f"✅ {counts['ok']} generated, {counts['invalid']} failed validation, "
+               f"{counts['failed']} failed (retried on the next run), {counts['skipped']} already done. "
+               f"Manifest: {run.manifest_path}")
 
 # ✅ API Endpoint to Generate Script
 @app.route('/generate_script', methods=['POST'])
 def generate_script():
     data = request.get_json()
     user_request = data.get("description", "a simple Abaqus model")
+    mode = data.get("mode", SCRIPT_MODE)
+    if mode not in SCRIPT_MODES:
+        return jsonify({"error": f"⚠️ mode must be one of {', '.join(SCRIPT_MODES)}."}), 400
 
-    script_path = generate_abaqus_script(user_request)
+    try:
+        script_path, degraded, spec = generate_abaqus_script(user_request, str(data.get("user_id", "anonymous")), mode)
+    except ValueError as e:  # no API key configured
+        return jsonify({"error": str(e)}), 503
+    if degraded:
+        return jsonify({"message": "⚠️ The AI service is unavailable; generated a template script instead.",
+                        "script_path": script_path, "degraded": True})
+    if spec is not None:
+        return jsonify({"message": "✅ Abaqus script generated from a model spec!", "script_path": script_path,
+                        "spec": spec.model_dump()})
     return jsonify({"message": "✅ Abaqus script generated successfully!", "script_path": script_path})
 
+# ✅ API Endpoint for Spec Fragment Reuse: hit rate per component and completion tokens saved
+@app.route('/fragments/stats')
+def fragment_report():
+    return jsonify(fragment_store.report())
+
+# ✅ API Endpoint for the Upstream Prompt-Cache Hit Rate per Prompt Prefix
+@app.route('/prompt_cache/stats')
+def prompt_cache_report():
+    return jsonify({"model": OPENAI_MODEL, "prefixes": prompt_cache_stats.report()})
+
+# ✅ API Endpoint for Token Throughput, Spend and Cache Savings (?window=seconds&group_by=user|endpoint|model|cache)
+@app.route('/usage')
+def usage_report():
+    window = max(60, min(request.args.get("window", 3600, type=int), 30 * 86400))
+    group_by = request.args.get("group_by", "endpoint")
+    if group_by not in usage_ledger.GROUPS:
+        return jsonify({"error": f"⚠️ group_by must be one of {', '.join(usage_ledger.GROUPS)}."}), 400
+    return jsonify(ledger.report(window, group_by))
+
+# ✅ Readiness Probe: answers before the LLM client exists and never calls upstream
+@app.route('/healthz')
+def healthz():
+    checks = {"llm_configured": llm.configured(), "llm_client": "ready" if llm.client_ready() else "lazy",
+              "llm_circuit": llm_breaker.snapshot()["state"],
+              "upstream_idle_connections": llm.transport.idle_connections(), "state_db": True}
+    try:
+        shared_db.connect(ledger.path).execute("SELECT 1")
+    except sqlite3.Error:
+        checks["state_db"] = False
+    ready = checks["llm_configured"] and checks["state_db"]
+    return jsonify({"status": "ok" if ready else "unavailable", **checks}), 200 if ready else 503
+
 # ✅ API Endpoint to Download the Script
 @app.route('/download_script')
 def download_script():
     return send_file("static/generated_script.py", as_attachment=True)
 
-# ✅ API Endpoint to Run Abaqus Script
+# ✅ API Endpoint to Queue an Abaqus Run (the generated script, or a deck under DATA_DIR)
 @app.route('/run_script', methods=['POST'])
 def run_script():
-    script_path = "static/generated_script.py"
+    data = request.get_json(silent=True) or {}
+    if data.get("path"):
+        # Only uploaded .inp decks: anything else would run as an arbitrary CAE Python script.
+        script_path = model_deck(str(data["path"]))
+        if script_path is None:
+            return jsonify({"error": "⚠️ path must name an uploaded .inp deck under models/."}), 400
+    else:
+        script_path = "static/generated_script.py"
 
     if not os.path.exists(script_path):
         return jsonify({"error": "⚠️ Script not found. Generate it first."}), 404
 
     try:
-        # 🛠️ Run Abaqus CAE in the background
-        abaqus_command = f"abaqus cae noGUI={script_path}"
-        process = subprocess.run(abaqus_command, shell=True, capture_output=True, text=True)
+        with registry.stage("submit"):
+            job = jobs.submit(script_path)
+    except (ValueError, OSError) as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+    now = time.time()
+    predicted_start, predicted_finish = jobs.schedule().get(job.id, (now, now))
+    return jsonify({
+        "message": f"✅ Abaqus job queued! Expected to start in ~{predicted_start - now:.0f} s "
+                   f"and finish in ~{predicted_finish - now:.0f} s.",
+        "job": job.to_dict({job.id: (predicted_start, predicted_finish)}),
+    }), 202
+
+# ✅ API Endpoints for Job Status and Predicted Start/Finish Times
+@app.route('/jobs')
+def list_jobs():
+    plan = jobs.schedule()
+    return jsonify({"jobs": [job.to_dict(plan) for job in jobs.list()], "estimator": estimator.state()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "⚠️ Job not found."}), 404
+    return jsonify(job.to_dict(jobs.schedule()))
+
+# ✅ API Endpoints to Query Parsed Results (re-ingests only what the solver appended)
+def job_dir(job_id):
+    path = safe_join(DATA_DIR, "jobs", job_id)
+    return path if path and os.path.isdir(path) else None
+
+@app.route('/results/<job_id>')
+def results_summary(job_id):
+    work_dir = job_dir(job_id)
+    if work_dir is None:
+        return jsonify({"error": "⚠️ Job not found."}), 404
+
+    results_store.ingest_job(work_dir)
+    summaries = {
+        analysis: results_store.open_store(work_dir, analysis).summary()
+        for analysis in results_store.analyses(work_dir)
+    }
+    return jsonify({"job_id": job_id, "analyses": summaries})
+
+@app.route('/results/<job_id>/<analysis>/<path:table>')
+def results_table(job_id, analysis, table):
+    work_dir = job_dir(job_id)
+    if work_dir is None:
+        return jsonify({"error": "⚠️ Job not found."}), 404
+
+    store = results_store.open_store(work_dir, analysis)
+    step = request.args.get("step", type=int)
+    frame = request.args.get("frame", type=int)
+    limit = request.args.get("limit", 10000, type=int)
+    try:
+        ids = [int(value) for value in request.args["ids"].split(",")] if request.args.get("ids") else None
+    except ValueError:
+        return jsonify({"error": "⚠️ ids must be a comma-separated list of integers."}), 400
+    try:
+        if table.startswith("field/"):
+            rows = store.field(table.split("/", 1)[1], step=step, frame=frame, ids=ids)
+        elif table == "frames":
+            rows = store.frames(step)
+        else:
+            rows = store.table(table).read()
+            if step is not None and "step" in rows:
+                mask = rows["step"] == step
+                rows = {name: values[mask] for name, values in rows.items()}
+    except KeyError:
+        return jsonify({"error": f"⚠️ No table '{table}' for this analysis."}), 404
+
+    total = len(next(iter(rows.values()), []))
+    return jsonify({
+        "table": table,
+        "rows": total,
+        "truncated": total > limit,
+        "columns": {name: values[:limit].tolist() for name, values in rows.items()},
+    })
+
+# ✅ Downsampled Views for the Browser, sent as little-endian typed arrays instead of JSON lists
+def binary_response(arrays, **headers):
+    payload = b"".join(array.tobytes() for _, array in arrays)
+    layout = ",".join(f"{name}:{array.dtype.str}" for name, array in arrays)
+    response = Response(payload, mimetype="application/octet-stream")
+    response.headers["X-Layout"] = layout
+    for name, value in headers.items():
+        response.headers[f"X-{name.replace('_', '-').title()}"] = str(value)
+    return response
+
+def cached_view(key, build):
+    with registry.stage("cache_get"):
+        payload = cache.get(key)
+    registry.inc("cache_requests_total", cache="views", result="miss" if payload is None else "hit")
+    if payload is None:
+        with registry.stage("build"):
+            payload = build()
+        with registry.stage("cache_set"):
+            cache.set(key, payload, timeout=3600)
+    return payload
 
-        if process.returncode == 0:
-            return jsonify({"message": "✅ Abaqus script executed successfully!"})
+@app.route('/results/<job_id>/<analysis>/history/<path:name>')
+def results_history(job_id, analysis, name):
+    work_dir = job_dir(job_id)
+    if work_dir is None:
+        return jsonify({"error": "⚠️ Job not found."}), 404
+
+    store = results_store.open_store(work_dir, analysis)
+    points = max(3, min(request.args.get("points", 1000, type=int), 100000))
+    method = request.args.get("method", "lttb")
+    x_column = request.args.get("x", "total_time")
+    entity = request.args.get("id", type=int)
+    point = request.args.get("point", type=int)
+    if method not in downsample.METHODS:
+        return jsonify({"error": f"⚠️ Unknown method '{method}' (use lttb or minmax)."}), 400
+
+    def build():
+        if name in store.fields():
+            if entity is None:
+                raise ValueError("Field histories need an ?id= node or element label.")
+            rows = store.history(name, entity, point)
+            y = rows["value"]
         else:
-            return jsonify({"error": f"Abaqus execution failed: {process.stderr}"}), 500
+            table_name, _, column = name.rpartition("/")
+            rows = store.table(table_name).read()
+            y = rows[column]
+        x = rows[x_column] if x_column in rows else np.arange(len(y))
+        keep = downsample.METHODS[method](x, y, points)
+        return {
+            "arrays": [("x", np.asarray(x)[keep].astype("<f4")), ("y", np.asarray(y)[keep].astype("<f4"))],
+            "original": len(y),
+        }
 
-    except Exception as e:
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    try:
+        table_rows = len(store.table(f"field/{name}" if name in store.fields() else name.rpartition("/")[0]))
+        key = f"history:{job_id}:{analysis}:{name}:{entity}:{point}:{x_column}:{method}:{points}:{table_rows}"
+        view = cached_view(key, build)
+    except KeyError:
+        return jsonify({"error": f"⚠️ No data '{name}' for this analysis."}), 404
+    except ValueError as e:
+        return jsonify({"error": f"⚠️ {str(e)}"}), 400
+
+    return binary_response(view["arrays"], count=len(view["arrays"][0][1]), original_count=view["original"])
+
+@app.route('/results/<job_id>/<analysis>/snapshot/<field>')
+def results_snapshot(job_id, analysis, field):
+    work_dir = job_dir(job_id)
+    if work_dir is None:
+        return jsonify({"error": "⚠️ Job not found."}), 404
+
+    store = results_store.open_store(work_dir, analysis)
+    points = max(2, min(request.args.get("points", 20000, type=int), 1000000))
+    frame = request.args.get("frame", type=int)
+
+    def build():
+        frames = store.frames()["frame"]
+        selected = int(frames[-1]) if frame is None and len(frames) else frame
+        rows = store.field(field, frame=selected)
+        keep = downsample.decimate(rows["value"], points)
+        return {
+            "arrays": [
+                ("id", np.asarray(rows["id"])[keep].astype("<u4")),
+                ("point", np.asarray(rows["point"])[keep].astype("<u2")),
+                ("value", np.asarray(rows["value"])[keep].astype("<f4")),
+            ],
+            "original": len(rows["value"]),
+            "frame": selected,
+        }
+
+    try:
+        key = f"snapshot:{job_id}:{analysis}:{field}:{frame}:{points}:{len(store.table(f'field/{field}'))}"
+        view = cached_view(key, build)
+    except KeyError:
+        return jsonify({"error": f"⚠️ No field '{field}' for this analysis."}), 404
+
+    return binary_response(view["arrays"], count=len(view["arrays"][0][1]),
+                           original_count=view["original"], frame=view["frame"])
+
+# ✅ API Endpoint to Inspect an Input Deck (upload a .inp or name one under DATA_DIR)
+@app.route('/inp/stats', methods=['POST'])
+def inp_stats():
+    upload = request.files.get("file")
+    stored = None
+    if upload is not None:
+        # A generated name: uploads never overwrite each other and can only ever be .inp decks.
+        prune_uploads()
+        os.makedirs(MODELS_DIR, exist_ok=True)
+        stored = f"{uuid.uuid4().hex}.inp"
+        inp_path = os.path.join(MODELS_DIR, stored)
+        upload.save(inp_path)
+    else:
+        data = request.get_json(silent=True) or {}
+        inp_path = safe_join(DATA_DIR, data.get("path", ""))
+
+    if not inp_path or not os.path.isfile(inp_path):
+        return jsonify({"error": "⚠️ Input deck not found."}), 404
+
+    try:
+        deck, load_seconds = inp_parser.timed_load(inp_path, INP_CACHE_DIR)
+    except (ValueError, OSError) as e:
+        if stored:
+            os.remove(inp_path)
+        return jsonify({"error": f"Could not parse input deck: {str(e)}"}), 422
+
+    stats = inp_parser.mesh_stats(deck)
+    stats["load_seconds"] = round(load_seconds, 4)
+    if stored:
+        stats["path"] = f"models/{stored}"  # pass to /run_script or /preview
+    return jsonify(stats)
+
+# ✅ API Endpoint for a Decimated Surface Preview (binary vertex/index buffer, cached by content hash)
+@app.route('/preview', methods=['POST'])
+def preview():
+    data = request.get_json(silent=True) or {}
+    try:
+        budget = max(100, min(int(data.get("triangles", mesh_preview.DEFAULT_TRIANGLES)), 2000000))
+    except (ValueError, TypeError):
+        return jsonify({"error": "⚠️ triangles must be an integer."}), 400
+    preview_dir = os.path.join(DATA_DIR, "previews")
+
+    try:
+        if data.get("nodes") is not None:
+            content_hash = mesh_preview.payload_hash({"nodes": data["nodes"], "elements": data.get("elements", {})})
+            payload = mesh_preview.cached_preview(preview_dir, content_hash, budget, lambda: mesh_preview.preview_arrays(
+                data["nodes"], data.get("elements", {}), budget))
+        else:
+            inp_path = safe_join(DATA_DIR, data.get("path", ""))
+            if not inp_path or not os.path.isfile(inp_path):
+                return jsonify({"error": "⚠️ Input deck not found."}), 404
+            deck = inp_parser.load_inp(inp_path, INP_CACHE_DIR)
+            payload = mesh_preview.cached_preview(preview_dir, mesh_preview.deck_hash(deck), budget,
+                                                  lambda: mesh_preview.preview_deck(deck, budget))
+    except (ValueError, TypeError, OSError) as e:
+        return jsonify({"error": f"Could not build preview: {str(e)}"}), 422
+
+    return Response(payload, mimetype="application/octet-stream")
 
 # ✅ Run Flask
+# Development server only; deploy with: gunicorn -c gunicorn.conf.py
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 10000)), debug=True)
+    app.run(host='0.0.0.0', port=int(os.environ.get("PORT", 10000)), debug=os.getenv("FLASK_DEBUG", "1") == "1")
 
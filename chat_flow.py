@@ -0,0 +1,257 @@
+"""Data-driven guided flow for /chat: states, slots and local slot extraction.
+
+The flow is declared as data. Each :class:`Slot` (model type, analysis
+type, units, material) carries the question that asks for it, its values
+with their synonyms and regexes, and whether the user may skip it. Every
+slot has a ``waiting_for_<slot>`` state. ``TRANSITIONS`` maps (state, event)
+to a target state and an action. :class:`ChatFlow` compiles all of this
+once, at load time, into a lookup table and one keyword regex per slot. A
+table that leaves a (state, event) pair uncovered, or that names an unknown
+state, raises ValueError at load time.
+
+Before ``ready``, a message runs through every extractor, so "static steel
+beam in mm" fills four slots and goes straight to ``ready``. Short answers
+that match no keyword are fuzzy-matched against the awaited slot's synonyms
+(difflib), so "bem" or "alumnium" still count. A question asked mid-flow
+can fill only the slot being asked for. A short answer that fits no slot
+(or any answer to the required model type) is asked for again, never
+filled with arbitrary text; "no" or "skip" passes over an optional slot.
+A sentence instead of an optional answer ends the flow and is answered as
+a question. Nothing here calls the LLM. The filled slots become
+the user-context lines of the prompt.
+"""
+import difflib
+import re
+
+START = "start"
+READY = "ready"
+NEXT = "next"  # transition target: the state waiting for the first missing slot, or ready
+STAY = "stay"  # transition target: the current state
+EVENTS = ("restart", "message", "answered", "skipped", "unclear", "unrecognised")
+
+SKIP = re.compile(r"^\s*(?:skip|pass|any|none|n/?a|no|nope|nah|no thanks|none of (?:those|these|them)|"
+                  r"not sure|no idea|(?:i )?don'?t know|dunno|later|no preference|doesn'?t matter)\s*[.!]?\s*$",
+                  re.IGNORECASE)
+RESTART = re.compile(r"^\s*(?:start over|restart|reset|new model)\s*[.!]?\s*$", re.IGNORECASE)
+QUESTION = re.compile(r"\?\s*$|^\s*(?:how|what|why|when|where|which|can|could|should|is|are|does|do)\b", re.IGNORECASE)
+FUZZY_WORDS = 3  # longer messages are sentences, not answers: never fuzzy-matched, never asked again
+FUZZY_CUTOFF = 0.85  # "bem" -> beam and "alumnium" -> aluminium, but not "hello" -> shell or "wool" -> wood
+
+
+class Slot:
+    """One piece of user context: how to ask for it and how to recognise an answer."""
+
+    def __init__(self, name, label, question, values, patterns=(), phrase="{}", required=False, ordered=False):
+        """``values`` maps each value to its synonyms (whole words). ``patterns`` holds extra
+        (value, regex) pairs. With ``ordered``, a message naming several values gets the first
+        declared value; otherwise the slot stays unfilled."""
+        self.name = name
+        self.label = label
+        self.question = question
+        self.phrase = phrase
+        self.required = required
+        self.ordered = ordered
+        self.order = list(values)
+        self.synonyms = {synonym.lower(): value for value, synonyms in values.items() for synonym in synonyms}
+        alternatives = sorted(self.synonyms, key=len, reverse=True)  # longest first: "si-mm" before "si"
+        self.keywords = re.compile(r"\b(?:" + "|".join(map(re.escape, alternatives)) + r")\b", re.IGNORECASE)
+        self.patterns = [(value, re.compile(pattern, re.IGNORECASE)) for value, pattern in patterns]
+        self.vocabulary = [synonym for synonym in self.synonyms if len(synonym) >= 4]
+
+    def extract(self, text):
+        found = {self.synonyms[match.lower()] for match in self.keywords.findall(text)}
+        found.update(value for value, pattern in self.patterns if pattern.search(text))
+        if len(found) == 1:
+            return found.pop()
+        if found and self.ordered:
+            return next(value for value in self.order if value in found)
+        return None  # nothing, or an ambiguous mention such as "beam or shell?"
+
+    def guess(self, text):
+        """Fuzzy match of a short answer's single words against the synonyms, for typos."""
+        words = re.findall(r"[\w-]+", text.lower())
+        if not 0 < len(words) <= FUZZY_WORDS:
+            return None
+        found = set()
+        for word in words:
+            if len(word) < 3:
+                continue
+            close = difflib.get_close_matches(word, self.vocabulary, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                found.add(self.synonyms[close[0]])
+        return found.pop() if len(found) == 1 else None
+
+
+SLOTS = (
+    Slot("model_type", "Model type", "What kind of model are you working on? (Beam, Shell, or Solid?)", {
+        "Beam": ("beam", "beams", "frame", "frames", "truss", "trusses", "rod", "rods", "1d", "wire"),
+        "Shell": ("shell", "shells", "plate", "plates", "sheet", "panel", "panels", "membrane", "thin-walled"),
+        "Solid": ("solid", "solids", "3d", "block", "brick", "continuum"),
+        "Axisymmetric": ("axisymmetric", "axisym", "axi-symmetric"),
+        "2D planar": ("2d", "planar", "plane stress", "plane strain"),
+    }, phrase="{} model", required=True),
+    Slot("analysis_type", "Analysis type",
+         "Which analysis are you running? (static, frequency, buckling, dynamic implicit or explicit, "
+         "heat transfer; say skip if unsure)", {
+             "static": ("static", "statics", "quasi-static", "stress analysis"),
+             "frequency": ("frequency", "frequencies", "modal", "eigenfrequency", "eigenvalue", "mode shapes",
+                           "natural frequency", "natural frequencies", "vibration"),
+             "buckling": ("buckling", "buckle", "riks", "post-buckling"),
+             "dynamic explicit": ("explicit", "impact", "crash", "drop test"),
+             "dynamic implicit": ("implicit dynamic", "dynamic implicit", "transient", "time history"),
+             "heat transfer": ("heat transfer", "thermal", "temperature", "heat"),
+         }, phrase="{} analysis"),
+    Slot("units", "Units", "Which unit system do you use? (SI in m, SI-mm, or US in inches; say skip if unsure)", {
+        "SI-mm (mm, N, tonne, s, MPa)": ("si-mm", "mm", "millimetre", "millimetres", "millimeter", "millimeters",
+                                         "mpa", "n-mm", "tonne"),
+        "US (in, lbf, s, psi)": ("inch", "inches", "psi", "lbf", "imperial", "us customary"),
+        "SI (m, N, kg, s, Pa)": ("si", "metre", "metres", "meter", "meters", "pascal", "pa", "kg"),
+    }, patterns=(("SI (m, N, kg, s, Pa)", r"^\s*m\s*$"),), ordered=True),
+    Slot("material", "Material", "Which material? (e.g. steel, aluminium, concrete; say skip if unsure)", {
+        "steel": ("steel", "stainless", "stainless steel", "carbon steel", "structural steel"),
+        "aluminium": ("aluminium", "aluminum", "alu"),
+        "concrete": ("concrete", "reinforced concrete"),
+        "titanium": ("titanium", "ti-6al-4v"),
+        "copper": ("copper", "brass", "bronze"),
+        "rubber": ("rubber", "elastomer", "hyperelastic"),
+        "composite": ("composite", "cfrp", "gfrp", "carbon fibre", "carbon fiber", "laminate"),
+        "timber": ("timber", "wood", "glulam"),
+    }, patterns=(("steel", r"\b(?:s\d{3}(?:jr|j0|j2)?|a36|a992)\b"),
+                 ("aluminium", r"\b[1-7]\d{3}-t\d+\b"))),
+)
+
+# (state, event, target, action). "*" matches every state and "waiting" every slot state;
+# the first matching row wins, so specific rows come before wildcards.
+TRANSITIONS = (
+    ("*", "restart", NEXT, "restart"),
+    (START, "message", NEXT, "start"),
+    ("waiting", "answered", NEXT, "ask"),
+    ("waiting", "skipped", NEXT, "ask"),
+    ("waiting", "unclear", STAY, "reask"),  # a short answer we could not place: ask again, not the LLM
+    ("waiting_for_model_type", "unrecognised", STAY, "reask"),
+    ("waiting", "unrecognised", READY, "pass"),  # a sentence instead of an optional answer is really a question
+    (READY, "message", READY, "pass"),
+)
+ACTIONS = ("start", "ask", "reask", "restart", "pass")
+
+
+class Turn:
+    __slots__ = ("step", "slots", "event", "action", "reply", "became_ready")
+
+    def __init__(self, step, slots, event, action, reply, became_ready):
+        self.step = step
+        self.slots = slots
+        self.event = event
+        self.action = action
+        self.reply = reply  # None: answer the message as a question
+        self.became_ready = became_ready
+
+
+class ChatFlow:
+    def __init__(self, slots=SLOTS, transitions=TRANSITIONS, registry=None):
+        self.slots = slots
+        self.waiting = {f"waiting_for_{slot.name}": slot for slot in slots}
+        self.states = (START, *self.waiting, READY)
+        self.table = self._compile(transitions)
+        self.registry = registry
+        if registry is not None:
+            registry.counter("chat_flow_total", "Guided-flow turns by state and event (all but 'pass' answered locally).")
+
+    # ✅ Load time: expand wildcards and check that every (state, event) pair has a transition
+    def _compile(self, transitions):
+        table = {}
+        for state, event, target, action in transitions:
+            if event not in EVENTS or action not in ACTIONS or target not in (*self.states, NEXT, STAY):
+                raise ValueError(f"⚠️ Bad transition {(state, event, target, action)!r}")
+            states = (self.states if state == "*" else tuple(self.waiting) if state == "waiting" else (state,))
+            for name in states:
+                if name not in self.states:
+                    raise ValueError(f"⚠️ Transition from unknown state {name!r}")
+                table.setdefault((name, event), (target, action))
+        for state in self.states:
+            events = (("restart", "answered", "skipped", "unclear", "unrecognised") if state in self.waiting
+                      else ("restart", "message"))
+            missing = [event for event in events if (state, event) not in table]
+            if missing:
+                raise ValueError(f"⚠️ No transition from {state!r} on {', '.join(missing)}")
+        return table
+
+    # ✅ Run time: classify the message, look up the transition, reply locally when possible
+    def advance(self, step, slots, message):
+        """The :class:`Turn` for ``message`` from state ``step`` with the session's ``slots``."""
+        state = step if step in self.states else START  # unknown (renamed) states start over
+        slots, found = dict(slots), {}
+        if RESTART.match(message):
+            event, slots = "restart", {}
+        elif state in (START, READY):
+            event = "message"
+            if state == START:
+                found = self.extract(message)
+        else:
+            awaited = self.waiting[state]
+            if QUESTION.search(message):  # a question mid-flow only answers the slot being asked for
+                value = awaited.extract(message)
+                found = {} if value is None else {awaited.name: value}
+            else:
+                found = self.extract(message)
+            if awaited.name not in found and not QUESTION.search(message):
+                guess = awaited.guess(message)
+                if guess is not None:
+                    found[awaited.name] = guess
+            if found:
+                event = "answered"
+            elif not awaited.required and SKIP.match(message):
+                event, found = "skipped", {awaited.name: None}  # None: asked and declined, do not ask again
+            elif not QUESTION.search(message) and len(message.split()) <= FUZZY_WORDS:
+                event = "unclear"
+            else:
+                event = "unrecognised"
+        slots.update(found)
+
+        target, action = self.table[(state, event)]
+        if target == NEXT:
+            target = self.next_state(slots)
+        elif target == STAY:
+            target = state
+        if self.registry is not None:
+            self.registry.inc("chat_flow_total", state=state, event=event)
+        return Turn(target, slots, event, action, self._reply(action, target, found, slots),
+                    target == READY and state != READY)
+
+    def extract(self, text):
+        """{slot name: value} for every slot the text names unambiguously."""
+        return {slot.name: value for slot in self.slots for value in [slot.extract(text)] if value is not None}
+
+    def next_state(self, slots):
+        for state, slot in self.waiting.items():
+            if slot.name not in slots:
+                return state
+        return READY
+
+    def _reply(self, action, target, found, slots):
+        if action == "pass":
+            return None
+        if target == READY:
+            prefix = "Starting over. " if action == "restart" else ""
+            return f"{prefix}Got it! You are working on a {self.describe(slots)}. What do you need help with next?"
+        question = self.waiting[target].question
+        if action == "reask":
+            return f"Sorry, I didn't recognise that. {question}"
+        if action == "restart":
+            return f"Starting over. {question}"
+        noted = [slot.phrase.format(found[slot.name]) for slot in self.slots if found.get(slot.name)]
+        return f"Noted: {', '.join(noted)}. {question}" if noted else question
+
+    # ✅ What the slots contribute to the prompt and to cache keys
+    def describe(self, slots):
+        phrases = [slot.phrase.format(slots[slot.name]) for slot in self.slots if slots.get(slot.name)]
+        if not phrases:
+            return "model"
+        return phrases[0] + (f" ({', '.join(phrases[1:])})" if len(phrases) > 1 else "")
+
+    def context(self, slots):
+        """Per-user context lines for the prompt: {label: value} of the filled slots."""
+        return {slot.label: slots[slot.name] for slot in self.slots if slots.get(slot.name)}
+
+    def signature(self, slots):
+        return "|".join(slots.get(slot.name) or "" for slot in self.slots)
@@ -0,0 +1,136 @@
+"""Circuit breaker with latency-adaptive timeouts for upstream LLM calls.
+
+Closed: calls pass with a timeout of ``multiplier`` x the recent p99 latency
+(clamped to [floor, ceiling]), so a slow upstream is cut off long before the
+client default. Too many consecutive failures, or a failure rate over
+``failure_rate`` across the last ``window`` calls, opens the breaker: calls
+fail immediately with :class:`CircuitOpen` (carrying a Retry-After) for
+``open_seconds``, doubling up to ``max_open_seconds`` on repeated trips.
+Afterwards it is half-open: ``probes`` concurrent calls are let through and
+the first success closes it again. State is per worker process.
+"""
+import threading
+import time
+from collections import deque
+
+
+def upstream_errors():
+    """Upstream trouble; other errors (bad requests, our own bugs) don't count against the circuit.
+
+    ``openai`` is imported here rather than at module import because it is slow to load.
+    """
+    import openai
+
+    return (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError)
+
+
+def __getattr__(name):
+    if name == "UPSTREAM_ERRORS":  # for except clauses, evaluated only once something was raised
+        return upstream_errors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit is open; retry in {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, failure_rate=0.5, window=20, open_seconds=15.0,
+                 max_open_seconds=120.0, probes=1, initial_timeout=30.0, timeout_floor=5.0,
+                 timeout_ceiling=60.0, multiplier=3.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.outcomes = deque(maxlen=window)
+        self.latencies = deque(maxlen=100)
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probes = probes
+        self.initial_timeout = initial_timeout
+        self.timeout_floor = timeout_floor
+        self.timeout_ceiling = timeout_ceiling
+        self.multiplier = multiplier
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probes_in_flight = 0
+
+    def timeout(self):
+        """Seconds to allow the next call: a multiple of the recent p99 latency."""
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) < 5:
+            return self.initial_timeout
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        return min(self.timeout_ceiling, max(self.timeout_floor, p99 * self.multiplier))
+
+    def retry_after(self):
+        with self.lock:
+            return max(1.0, self.open_until - time.monotonic()) if self.state == OPEN else 1.0
+
+    def call(self, function):
+        """``function(timeout)`` through the breaker; raises CircuitOpen when calls are being shed."""
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            result = function(self.timeout())
+        except BaseException as error:
+            if isinstance(error, upstream_errors()):
+                self._record(False, probe)
+                raise
+            if probe:
+                with self.lock:
+                    self.probes_in_flight -= 1
+            raise
+        self._record(True, probe, time.monotonic() - started)
+        return result
+
+    def snapshot(self):
+        with self.lock:
+            failures = self.outcomes.count(False)
+            return {"state": self.state, "trips": self.trips, "recent_calls": len(self.outcomes),
+                    "recent_failures": failures, "open_for": max(0.0, self.open_until - time.monotonic())}
+
+    def _admit(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.open_until:
+                self.state, self.probes_in_flight = HALF_OPEN, 0
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self.probes_in_flight < self.probes:
+                self.probes_in_flight += 1
+                return True
+            retry_after = max(1.0, self.open_until - now)
+        raise CircuitOpen(self.name, retry_after)
+
+    def _record(self, success, probe, latency=None):
+        with self.lock:
+            if probe:
+                self.probes_in_flight -= 1
+            self.outcomes.append(success)
+            if success:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+                if self.state == HALF_OPEN:
+                    self.state, self.trips = CLOSED, 0
+                    self.outcomes.clear()
+                return
+            self.consecutive_failures += 1
+            rate_tripped = (len(self.outcomes) == self.outcomes.maxlen
+                            and self.outcomes.count(False) / len(self.outcomes) >= self.failure_rate)
+            if self.state == OPEN:
+                return  # a call admitted before the trip
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold or rate_tripped:
+                self.trips += 1
+                duration = min(self.max_open_seconds, self.open_seconds * 2 ** (self.trips - 1))
+                self.state, self.open_until = OPEN, time.monotonic() + duration
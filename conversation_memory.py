@@ -0,0 +1,216 @@
+"""Per-session conversation memory under a hard prompt-token budget.
+
+Turns are stored in SQLite next to the sessions. When a prompt is built the
+newest turns are replayed verbatim until the ``recent_tokens`` window is
+full; once a turn falls out of that window a single background thread folds
+the older turns into a rolling summary (and deletes them), so both storage
+and prompt size stay flat however long a conversation runs.
+Token counts come from a local estimator; no tokenizer download is needed.
+"""
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import shared_db
+
+log = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    user_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (user_id, seq)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    through_seq INTEGER NOT NULL,
+    tokens INTEGER NOT NULL
+);
+"""
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between an engineer and an Abaqus assistant. "
+    "Merge the new turns into the existing summary. Keep model details (geometry, materials, units, "
+    "element types, steps, loads, boundary conditions) and open questions; drop pleasantries. "
+    "Answer with the updated summary only."
+)
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Rough BPE token count: the larger of a characters/4 and a words-and-symbols estimate."""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(_WORDS.findall(text)) * 0.75))
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def truncate_to_tokens(text, tokens):
+    """Cut ``text`` down to roughly ``tokens`` tokens, keeping its head and tail."""
+    if estimate_tokens(text) <= tokens:
+        return text
+    keep = max(0, tokens * 4 - 5)
+    return text[: keep // 2] + " ... " + text[len(text) - keep // 2:] if keep else ""
+
+
+def make_summarizer(complete, max_tokens=300, on_usage=None):
+    """Summariser callable backed by ``complete(messages, max_tokens=..., temperature=...)``.
+
+    ``complete`` returns a chat-completions response and is where the caller applies its
+    circuit breaker and admission limits; ``on_usage`` receives each response's usage.
+    """
+
+    def summarize(previous_summary, turns):
+        transcript = "\n".join(f"{turn['role'].upper()}: {turn['content']}" for turn in turns)
+        response = complete(
+            [
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"},
+            ],
+            max_tokens=max_tokens,
+            temperature=0,
+        )
+        if on_usage is not None:
+            on_usage(response.usage)
+        return response.choices[0].message.content.strip()
+
+    return summarize
+
+
+class ConversationMemory:
+    """Stores turns per user and assembles budgeted prompts from them."""
+
+    def __init__(self, path, summarize, budget=3000, recent_tokens=1200, summary_tokens=400):
+        self.path = path
+        self.summarize = summarize
+        self.budget = budget
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.lock = threading.Lock()
+        self.folding = set()
+        self.executor = None
+        shared_db.connect(path).executescript(_SCHEMA)
+
+    def add_turn(self, user_id, role, content):
+        db = shared_db.connect(self.path)
+        # Number past the summary too: a fold may have deleted every turn up to through_seq.
+        db.execute(
+            "INSERT INTO turns (user_id, seq, role, content, tokens, created_at) "
+            "SELECT ?, MAX(COALESCE((SELECT MAX(seq) FROM turns WHERE user_id = ?), 0), "
+            "COALESCE((SELECT through_seq FROM summaries WHERE user_id = ?), 0)) + 1, ?, ?, ?, ?",
+            (user_id, user_id, user_id, role, content, estimate_tokens(content), time.time()),
+        )
+
+    def history(self, user_id):
+        """(summary, unsummarised turns oldest first)."""
+        db = shared_db.connect(self.path)
+        row = db.execute("SELECT summary, through_seq FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+        summary, through = row if row else ("", 0)
+        turns = db.execute(
+            "SELECT seq, role, content, tokens FROM turns WHERE user_id = ? AND seq > ? ORDER BY seq",
+            (user_id, through),
+        ).fetchall()
+        return summary, [{"seq": t[0], "role": t[1], "content": t[2], "tokens": t[3]} for t in turns]
+
+    def build_messages(self, user_id, system_messages, user_input):
+        """Prompt messages: system, summary, recent turns, question — within ``budget`` tokens.
+
+        Returns (messages, context) where ``context`` holds only the remembered
+        part (summary and replayed turns), e.g. for cache keys.
+        """
+        limit = self.budget
+        question = {"role": "user", "content": user_input}
+        used = sum(message_tokens(message) for message in system_messages)
+        question["content"] = truncate_to_tokens(user_input, max(16, limit - used - MESSAGE_OVERHEAD))
+        used += message_tokens(question)
+
+        summary, turns = self.history(user_id)
+        recent = []
+        window = min(self.recent_tokens, max(0, limit - used))
+        for turn in reversed(turns):
+            cost = turn["tokens"] + MESSAGE_OVERHEAD
+            if cost > window:
+                break
+            recent.insert(0, {"role": turn["role"], "content": turn["content"]})
+            window -= cost
+        used += sum(message_tokens(message) for message in recent)
+
+        context = []
+        if summary:
+            room = min(self.summary_tokens, limit - used - MESSAGE_OVERHEAD)
+            if room > 16:
+                context.append({"role": "system", "content": "Conversation so far: " + truncate_to_tokens(summary, room)})
+        context.extend(recent)
+
+        if len(recent) < len(turns):
+            self._schedule_fold(user_id)
+        return list(system_messages) + context + [question], context
+
+    def context_digest(self, context):
+        return hashlib.sha1(json.dumps(context, sort_keys=True).encode()).hexdigest()[:16]
+
+    def forget(self, user_id):
+        db = shared_db.connect(self.path)
+        db.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+        db.execute("DELETE FROM summaries WHERE user_id = ?", (user_id,))
+
+    # ✅ Background folding of old turns into the rolling summary
+    def _schedule_fold(self, user_id):
+        with self.lock:
+            if user_id in self.folding:
+                return
+            self.folding.add(user_id)
+            if self.executor is None:  # created lazily so it never crosses a fork
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self.executor.submit(self._fold, user_id)
+
+    def _fold(self, user_id):
+        try:
+            summary, turns = self.history(user_id)
+            # Fold down to half the verbatim window so the next fold is several turns away.
+            window, keep = self.recent_tokens // 2, 0
+            for turn in reversed(turns):
+                window -= turn["tokens"] + MESSAGE_OVERHEAD
+                if window < 0:
+                    break
+                keep += 1
+            older = turns[: len(turns) - keep]
+            if not older:
+                return
+            new_summary = truncate_to_tokens(self.summarize(summary, older), self.summary_tokens)
+            through = older[-1]["seq"]
+            db = shared_db.connect(self.path)
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO summaries (user_id, summary, through_seq, tokens) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, through_seq = excluded.through_seq, "
+                    "tokens = excluded.tokens WHERE excluded.through_seq > summaries.through_seq",
+                    (user_id, new_summary, through, estimate_tokens(new_summary)),
+                )
+                db.execute("DELETE FROM turns WHERE user_id = ? AND seq <= ?", (user_id, through))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        except Exception:
+            log.exception("⚠️ Could not fold the conversation of %s; its turns stay until a later fold", user_id)
+        finally:
+            with self.lock:
+                self.folding.discard(user_id)
@@ -0,0 +1,72 @@
+"""Display-oriented downsampling of time histories and field snapshots.
+
+All functions return *indices* into the input so callers can slice several
+aligned columns (time, value, ids) consistently, and always keep the first
+and last samples.
+"""
+import numpy as np
+
+
+def lttb(x, y, points):
+    """Largest-Triangle-Three-Buckets: indices of ``points`` samples preserving visual shape."""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_start = stop
+        # Average of the following bucket is the third vertex of the triangle.
+        avg_x = x[next_start:next_stop].mean() if next_stop > next_start else x[-1]
+        avg_y = y[next_start:next_stop].mean() if next_stop > next_start else y[-1]
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area)) if stop > start else start
+        selected[bucket + 1] = previous
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax(y, points):
+    """Min/max bucketing: the lowest and highest sample of each of ``points // 2`` buckets."""
+    n = len(y)
+    if points >= n or points < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = (points - 2) // 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    starts, stops = edges[:-1], edges[1:]
+    keep = starts < stops
+    starts, stops = starts[keep], stops[keep]
+    lows = np.minimum.reduceat(y[1:n - 1], starts - 1)
+    highs = np.maximum.reduceat(y[1:n - 1], starts - 1)
+    indices = [0, n - 1]
+    for start, stop, low, high in zip(starts, stops, lows, highs):
+        window = y[start:stop]
+        indices.append(start + int(np.argmax(window == low)))
+        indices.append(start + int(np.argmax(window == high)))
+    return np.unique(indices)
+
+
+def decimate(values, points):
+    """Uniform stride over a field snapshot that still keeps its extreme values."""
+    n = len(values)
+    if points >= n:
+        return np.arange(n)
+    values = np.asarray(values)
+    indices = np.linspace(0, n - 1, max(2, points - 2)).astype(np.int64)
+    return np.unique(np.concatenate([indices, [int(np.argmin(values)), int(np.argmax(values))]]))
+
+
+METHODS = {
+    "lttb": lambda x, y, points: lttb(x, y, points),
+    "minmax": lambda x, y, points: minmax(y, points),
+}
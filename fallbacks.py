@@ -0,0 +1,173 @@
+"""Degraded answers for when the upstream LLM is unavailable.
+
+:class:`AnswerIndex` keeps recent LLM answers in SQLite and returns the one
+whose question is most similar (cosine over word and word-pair counts) to a
+new question for the same model type, if it clears ``threshold``.
+:func:`template_script` writes a parametric Abaqus script for beam, shell or
+solid models without any model call.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+import shared_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_model_type ON answers (model_type, id);
+"""
+
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_STOP = frozenset(
+    "a an and are as at be but by can do does for from how i in is it me my of on or please should so that "
+    "the this to what when where which why with you your".split()
+)
+
+
+def terms(text):
+    words = [word for word in _WORD.findall(text.lower()) if word not in _STOP]
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def cosine(a, b):
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+class AnswerIndex:
+    """Recent question/answer pairs per model type, searchable by similarity."""
+
+    def __init__(self, path, max_entries=5000, threshold=0.6, candidates=2000):
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.candidates = candidates
+        self.writes = 0
+        self.lock = threading.Lock()
+        shared_db.connect(path).executescript(_SCHEMA)
+
+    def add(self, model_type, question, answer):
+        db = shared_db.connect(self.path)
+        db.execute("INSERT INTO answers (model_type, question, answer, created_at) VALUES (?, ?, ?, ?)",
+                   (model_type or "", question, answer, time.time()))
+        with self.lock:
+            self.writes += 1
+            trim = self.writes % 100 == 0
+        if trim:
+            db.execute("DELETE FROM answers WHERE id <= (SELECT MAX(id) FROM answers) - ?", (self.max_entries,))
+
+    def lookup(self, model_type, question):
+        """(answer, similarity) of the closest earlier question, or None below the threshold."""
+        wanted = terms(question)
+        rows = shared_db.connect(self.path).execute(
+            "SELECT question, answer FROM answers WHERE model_type = ? ORDER BY id DESC LIMIT ?",
+            (model_type or "", self.candidates),
+        ).fetchall()
+        best = max(((cosine(wanted, terms(q)), answer) for q, answer in rows), default=(0.0, None),
+                   key=lambda pair: pair[0])
+        return (best[1], best[0]) if best[0] >= self.threshold else None
+
+
+# ✅ Template scripts (no model call): a loaded cantilever in the requested model type
+_TEMPLATE_HEADER = '''# Abaqus script generated from a template because the AI service was unavailable.
+# Request: {request}
+from abaqus import *
+from abaqusConstants import *
+import mesh
+
+model = mdb.Model(name='Model-1')
+material = model.Material(name='Steel')
+material.Elastic(table=((210000.0, 0.3),))  # N, mm, MPa
+material.Density(table=((7.85e-9,),))
+'''
+
+_TEMPLATE_BODIES = {
+    "beam": '''
+sketch = model.ConstrainedSketch(name='line', sheetSize=2000.0)
+sketch.Line(point1=(0.0, 0.0), point2=({length}, 0.0))
+part = model.Part(name='Beam', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseWire(sketch=sketch)
+model.RectangularProfile(name='Rect', a=20.0, b=40.0)
+model.BeamSection(name='BeamSec', integration=DURING_ANALYSIS, profile='Rect', material='Steel')
+part.Set(name='All', edges=part.edges)
+part.SectionAssignment(region=part.sets['All'], sectionName='BeamSec')
+part.assignBeamSectionOrientation(region=part.sets['All'], method=N1_COSINES, n1=(0.0, 0.0, -1.0))
+part.Set(name='Fixed', vertices=part.vertices.findAt(((0.0, 0.0, 0.0),)))
+part.Set(name='Tip', vertices=part.vertices.findAt((({length}, 0.0, 0.0),)))
+part.seedPart(size={length} / 20.0)
+part.setElementType(regions=(part.edges,), elemTypes=(mesh.ElemType(elemCode=B31, elemLibrary=STANDARD),))
+''',
+    "shell": '''
+sketch = model.ConstrainedSketch(name='plate', sheetSize=2000.0)
+sketch.rectangle(point1=(0.0, 0.0), point2=({length}, {width}))
+part = model.Part(name='Plate', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseShell(sketch=sketch)
+model.HomogeneousShellSection(name='ShellSec', material='Steel', thickness=5.0)
+part.Set(name='All', faces=part.faces)
+part.SectionAssignment(region=part.sets['All'], sectionName='ShellSec')
+part.Set(name='Fixed', edges=part.edges.findAt(((0.0, {width} / 2.0, 0.0),)))
+part.Set(name='Tip', edges=part.edges.findAt((({length}, {width} / 2.0, 0.0),)))
+part.seedPart(size={width} / 10.0)
+part.setElementType(regions=(part.faces,), elemTypes=(mesh.ElemType(elemCode=S4R, elemLibrary=STANDARD),))
+''',
+    "solid": '''
+sketch = model.ConstrainedSketch(name='section', sheetSize=2000.0)
+sketch.rectangle(point1=(0.0, 0.0), point2=({width}, {width}))
+part = model.Part(name='Block', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseSolidExtrude(sketch=sketch, depth={length})
+model.HomogeneousSolidSection(name='SolidSec', material='Steel', thickness=None)
+part.Set(name='All', cells=part.cells)
+part.SectionAssignment(region=part.sets['All'], sectionName='SolidSec')
+part.Set(name='Fixed', faces=part.faces.findAt((({width} / 2.0, {width} / 2.0, 0.0),)))
+part.Set(name='Tip', faces=part.faces.findAt((({width} / 2.0, {width} / 2.0, {length}),)))
+part.seedPart(size={width} / 5.0)
+part.setElementType(regions=(part.cells,), elemTypes=(mesh.ElemType(elemCode=C3D8R, elemLibrary=STANDARD),))
+''',
+}
+
+_TEMPLATE_FOOTER = '''
+assembly = model.rootAssembly
+assembly.DatumCsysByDefault(CARTESIAN)
+instance = assembly.Instance(name='Part-1', part=part, dependent=ON)
+model.StaticStep(name='Load', previous='Initial')
+model.EncastreBC(name='Fixed', createStepName='Initial', region=instance.sets['Fixed'])
+model.DisplacementBC(name='Tip', createStepName='Load', region=instance.sets['Tip'], u2=-1.0)
+part.generateMesh()
+job = mdb.Job(name='Template-Job', model='Model-1')
+job.submit()
+job.waitForCompletion()
+'''
+
+_NUMBER_WITH_MM = re.compile(r"(\d+(?:\.\d+)?)\s*mm\b", re.IGNORECASE)
+
+
+def template_kind(text):
+    lowered = (text or "").lower()
+    if any(word in lowered for word in ("beam", "frame", "truss", "wire")):
+        return "beam"
+    if any(word in lowered for word in ("shell", "plate", "sheet", "panel")):
+        return "shell"
+    return "solid"
+
+
+def template_script(request, model_type=None):
+    """Abaqus script for a fixed-free cantilever of the requested (or guessed) model type."""
+    kind = (model_type or "").lower()
+    kind = kind if kind in _TEMPLATE_BODIES else template_kind(request)
+    sizes = [float(value) for value in _NUMBER_WITH_MM.findall(request or "")]
+    length = sizes[0] if sizes else 1000.0
+    width = sizes[1] if len(sizes) > 1 else length / 10.0
+    safe_request = " ".join((request or "").split())[:200]
+    return (_TEMPLATE_HEADER.format(request=safe_request)
+            + _TEMPLATE_BODIES[kind].format(length=length, width=width)
+            + _TEMPLATE_FOOTER)
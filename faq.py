@@ -0,0 +1,162 @@
+"""Local answers to recurring conceptual questions, without an upstream call.
+
+The knowledge file is a JSON list of curated entries, each with a few
+phrasings of a question and one answer (optionally limited to some model
+types). :class:`FaqIndex` builds an inverted index over the phrasings and
+ranks entries with BM25. A match is accepted only when it is confident:
+the best entry must contain terms carrying at least ``min_coverage`` of the
+question's IDF weight (unknown words weigh the most, so a specific question
+never matches a generic entry) and score ``margin`` times better than the
+runner-up. Anything else returns None and goes to the LLM. A lookup takes
+tens of microseconds. Every worker checks the file's modification time at
+most every ``check_interval`` seconds and rebuilds its index when the file
+changes, so edits go live without a restart; a file that fails to load
+leaves the previous index in place.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+log = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_STOP = frozenset(
+    "a an and are as at be but by can could do does for from have how i if in is it me my of on or please "
+    "should so that the there this to use using want what when where which why will with would you your".split()
+)
+
+
+def stem(word):
+    """Fold plurals (and -ing/-ed forms of longer words) so 'units', 'meshing' and 'meshes' meet their roots."""
+    for suffix, minimum in (("ing", 6), ("ed", 5)):
+        if word.endswith(suffix) and len(word) >= minimum:
+            return word[: -len(suffix)]
+    if word.endswith("es") and word[:-2].endswith(("sh", "ch", "x", "ss")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def tokens(text):
+    return [stem(word) for word in _WORD.findall(text.lower()) if word not in _STOP]
+
+
+class Match:
+    __slots__ = ("id", "answer", "score", "coverage")
+
+    def __init__(self, entry_id, answer, score, coverage):
+        self.id = entry_id
+        self.answer = answer
+        self.score = score
+        self.coverage = coverage
+
+
+class _Index:
+    """Immutable BM25 index over the entries of one version of the knowledge file."""
+
+    def __init__(self, entries, k1=1.2, b=0.75):
+        self.entries = entries
+        self.k1, self.b = k1, b
+        self.postings = defaultdict(list)  # term -> [(entry index, term frequency)]
+        self.lengths = []
+        for number, entry in enumerate(entries):
+            counts = Counter(tokens(" ".join(entry["questions"] + entry.get("keywords", []))))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings[term].append((number, count))
+        self.average = sum(self.lengths) / len(self.lengths) if self.lengths else 1.0
+        total = len(entries)
+        self.idf = {term: math.log(1.0 + (total - len(posts) + 0.5) / (len(posts) + 0.5))
+                    for term, posts in self.postings.items()}
+        self.unknown_idf = math.log(1.0 + (total + 0.5) / 0.5)
+
+    def search(self, question, model_type):
+        terms = set(tokens(question))
+        weight = sum(self.idf.get(term, self.unknown_idf) for term in terms)
+        if not weight:
+            return None, None
+        scores, matched = defaultdict(float), defaultdict(float)
+        for term in terms:
+            idf = self.idf.get(term)
+            for number, count in self.postings.get(term, ()):
+                norm = count + self.k1 * (1 - self.b + self.b * self.lengths[number] / self.average)
+                scores[number] += idf * count * (self.k1 + 1) / norm
+                matched[number] += idf
+        allowed = [number for number in scores if self._allows(self.entries[number], model_type)]
+        ranked = sorted(allowed, key=lambda number: -scores[number])[:2]
+        if not ranked:
+            return None, None
+        best = ranked[0]
+        runner_up = scores[ranked[1]] if len(ranked) > 1 else 0.0
+        entry = self.entries[best]
+        return Match(entry["id"], entry["answer"], scores[best], matched[best] / weight), runner_up
+
+    @staticmethod
+    def _allows(entry, model_type):
+        types = entry.get("model_types")
+        return not types or (model_type or "").lower() in {t.lower() for t in types}
+
+
+class FaqIndex:
+    def __init__(self, path, min_coverage=0.75, margin=1.3, check_interval=2.0, registry=None):
+        self.path = path
+        self.min_coverage = min_coverage
+        self.margin = margin
+        self.check_interval = check_interval
+        self.registry = registry
+        self.lock = threading.Lock()
+        self.index = _Index([])
+        self.version = None  # (mtime_ns, size) of the loaded file
+        self.checked = 0.0
+        if registry is not None:
+            registry.counter("faq_reloads_total", "Knowledge-file reloads by result (loaded, failed).")
+        self.reload()
+
+    def lookup(self, question, model_type=None):
+        """The confident :class:`Match` for ``question``, or None to ask the LLM."""
+        if time.monotonic() - self.checked >= self.check_interval:
+            self.reload()
+        match, runner_up = self.index.search(question, model_type)
+        if match is None or match.coverage < self.min_coverage or match.score < self.margin * runner_up:
+            return None
+        return match
+
+    # ✅ Hot reload: rebuild when the knowledge file's mtime or size changes
+    def reload(self):
+        with self.lock:
+            self.checked = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return False
+            version = (stat.st_mtime_ns, stat.st_size)
+            if version == self.version:
+                return False
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    entries = json.load(file)
+                for entry in entries:
+                    if not (entry.get("id") and entry.get("questions") and entry.get("answer")):
+                        raise ValueError(f"entry {entry.get('id')!r} needs an id, questions and an answer")
+                index = _Index(entries)
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                log.warning("⚠️ Keeping the previous FAQ index; %s failed to load: %s", self.path, e)
+                self._count("failed")
+                self.version = version  # do not retry until the file changes again
+                return False
+            self.index, self.version = index, version
+            self._count("loaded")
+            return True
+
+    def _count(self, result):
+        if self.registry is not None:
+            self.registry.inc("faq_reloads_total", result=result)
+
+    def __len__(self):
+        return len(self.index.entries)
@@ -0,0 +1,213 @@
+"""Component fragments of model specs, reused across script requests.
+
+Many requests share a material, a section type, a step sequence or a mesh.
+:class:`FragmentStore` keeps the materials and step sequences of validated
+specs in SQLite (shared by all workers), keyed by their normalised
+parameters (material constants; step kinds and nlgeom). For a new request,
+``resolve`` finds the components its description already pins down, either
+from the store (a material it names, the step sequence its analysis words
+imply unless it gives its own mode count or duration) or directly from the
+text (an element type with a seed size; the section a beam, plate or solid
+needs). Only the remaining components are
+asked of the model, so its answer shrinks by the tokens those components
+would have cost, and the script is assembled from both (model_spec.render
+memoises each component's fragment). Hits, local resolutions, misses and
+tokens saved are counted per component.
+"""
+import json
+import re
+import time
+
+import shared_db
+from conversation_memory import estimate_tokens
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fragments (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    body TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS fragments_selector ON fragments (kind, selector, updated_at);
+CREATE TABLE IF NOT EXISTS fragment_stats (
+    component TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    tokens_saved INTEGER NOT NULL,
+    PRIMARY KEY (component, outcome)
+);
+"""
+
+COMPONENTS = ("material", "section", "steps", "mesh")
+NAMES_TTL = 30.0
+
+_STEP_WORDS = (
+    ("frequency", re.compile(r"\b(?:frequenc\w*|modal|eigen\w*|mode shapes?)\b", re.IGNORECASE)),
+    ("dynamic_explicit", re.compile(r"\b(?:explicit|impact|drop test|crash\w*)\b", re.IGNORECASE)),
+    ("static", re.compile(r"\b(?:static|quasi-static)\b", re.IGNORECASE)),
+)
+_NLGEOM = re.compile(r"\b(?:nlgeom|large (?:deformation|displacement|rotation)s?|geometric(?:ally)? non-?linear\w*|"
+                     r"non-?linear geometry)\b", re.IGNORECASE)
+_ELEMENT = re.compile(r"\b(B31|B32|S4R|S4|S8R|S3|C3D8R|C3D8|C3D20R|C3D10|C3D4)\b", re.IGNORECASE)
+_SEED = re.compile(r"\b(?:mesh|seed|element)\s+size\s*(?:of\s*|=\s*)?(\d+(?:\.\d+)?)\s*mm\b|"
+                   r"\b(\d+(?:\.\d+)?)\s*mm\s+(?:mesh|seed|elements)\b", re.IGNORECASE)
+_KINDS = (
+    ("beam", re.compile(r"\b(?:beam|frame|truss|rod)s?\b", re.IGNORECASE)),
+    ("shell", re.compile(r"\b(?:shell|plate|sheet|panel)s?\b", re.IGNORECASE)),
+    ("solid", re.compile(r"\b(?:solid|block|brick)s?\b", re.IGNORECASE)),
+)
+_ROUND = re.compile(r"\b(?:circular|round|rod|cylind\w*)\b", re.IGNORECASE)
+_THICKNESS = re.compile(r"\b(\d+(?:\.\d+)?)\s*mm\s+thick\b|\bthickness\s*(?:of\s*|=\s*)?(\d+(?:\.\d+)?)\s*mm\b",
+                        re.IGNORECASE)
+# Step numbers in the description (mode counts, durations) must come from this request, not a stored sequence.
+_STEP_NUMBERS = re.compile(r"\b\d+\s*(?:modes?|eigen\w*|natural frequenc\w*)\b|"
+                           r"\b(?:modes?|eigen\w*|num_eigen)\s*(?:=|:|of)?\s*\d+|"
+                           r"\b\d+(?:\.\d+)?\s*(?:s|secs?|seconds?|ms|milliseconds?)\b|"
+                           r"\b(?:time period|step time|total time|duration)\b", re.IGNORECASE)
+# Explicit constants override whatever a named material was last defined as.
+_CONSTANTS = re.compile(r"\b(?:young'?s modulus|modulus|poisson|density|yield)\b|\b(?:E|nu)\s*=", re.IGNORECASE)
+
+
+def _norm(value):
+    return None if value is None else float(f"{value:.4g}")
+
+
+def material_key(material):
+    """Normalised constants: materials that differ only in name or float noise share a fragment."""
+    return json.dumps([_norm(material[name]) for name in ("youngs_modulus", "poisson_ratio", "density", "yield_stress")])
+
+
+def steps_key(kinds, nlgeom):
+    return json.dumps({"kinds": list(kinds), "nlgeom": bool(nlgeom)})
+
+
+def requested_steps(description):
+    """steps_key of the analyses a description names, in order of mention, or None."""
+    found = sorted((match.start(), kind) for kind, pattern in _STEP_WORDS
+                   for match in [pattern.search(description)] if match)
+    if not found:
+        return None
+    return steps_key([kind for _, kind in found], _NLGEOM.search(description) is not None)
+
+
+def local_components(description):
+    """Components fully determined by the description's own words: {component: value}."""
+    components = {}
+    element, seed = _ELEMENT.search(description), _SEED.search(description)
+    if element and seed:
+        components["mesh"] = {"element_type": element.group(1).upper(), "seed_size": float(seed.group(1) or seed.group(2))}
+    kinds = [kind for kind, pattern in _KINDS if pattern.search(description)]
+    if len(kinds) == 1:
+        thickness = _THICKNESS.search(description)
+        if kinds[0] == "beam":
+            profile = "circular_profile" if _ROUND.search(description) else "rectangular_profile"
+            components["section"] = {"kind": profile, "thickness": None}
+        elif kinds[0] == "solid":
+            components["section"] = {"kind": "homogeneous_solid", "thickness": None}
+        elif thickness:
+            components["section"] = {"kind": "homogeneous_shell",
+                                     "thickness": float(thickness.group(1) or thickness.group(2))}
+    return components
+
+
+class FragmentStore:
+    def __init__(self, path, registry=None):
+        self.path = path
+        self.registry = registry
+        self.names = None  # material names in the store, reloaded after writes and every NAMES_TTL seconds
+        self.names_loaded = 0.0
+        shared_db.connect(path).executescript(_SCHEMA)
+        if registry is not None:
+            registry.counter("fragment_requests_total", "Spec components by outcome (hit, local, miss).")
+            registry.counter("fragment_tokens_saved_total", "Estimated completion tokens not generated thanks to fragments.")
+
+    # ✅ Lookup: which components a description pins down
+    def resolve(self, description):
+        """({component: value} known before asking the model, {component: outcome})."""
+        known = local_components(description)
+        outcomes = {component: "local" for component in known}
+        db = shared_db.connect(self.path)
+
+        material = None if _CONSTANTS.search(description) else self._named_material(description)
+        if material is not None:
+            known["material"], outcomes["material"] = material, "hit"
+
+        signature = None if _STEP_NUMBERS.search(description) else requested_steps(description)
+        row = db.execute("SELECT body FROM fragments WHERE kind = 'steps' AND key = ?",
+                         (signature,)).fetchone() if signature else None
+        if row is not None:
+            known["steps"], outcomes["steps"] = json.loads(row[0]), "hit"
+
+        for component in COMPONENTS:
+            outcomes.setdefault(component, "miss")
+        return known, outcomes
+
+    def _named_material(self, description):
+        if self.names is None or time.monotonic() - self.names_loaded > NAMES_TTL:
+            self.names = [row[0] for row in shared_db.connect(self.path).execute(
+                "SELECT DISTINCT selector FROM fragments WHERE kind = 'material'")]
+            self.names_loaded = time.monotonic()
+        lowered = description.lower()
+        named = [name for name in self.names if re.search(rf"\b{re.escape(name)}\b", lowered)]
+        if not named:
+            return None
+        row = shared_db.connect(self.path).execute(
+            "SELECT body FROM fragments WHERE kind = 'material' AND selector = ? ORDER BY updated_at DESC LIMIT 1",
+            (max(named, key=len),),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ✅ Learning: keep the reusable components of every validated spec
+    def remember(self, spec):
+        """Store the material and step sequence of ``spec`` (a ModelSpec as a dict)."""
+        now = time.time()
+        steps = spec["steps"]
+        rows = [
+            ("material", material_key(spec["material"]), spec["material"]["name"].lower(), spec["material"]),
+            ("steps", steps_key([step["kind"] for step in steps], any(step["nlgeom"] for step in steps)), "", steps),
+        ]
+        db = shared_db.connect(self.path)
+        for kind, key, selector, body in rows:
+            db.execute(
+                "INSERT INTO fragments (kind, key, selector, body, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(kind, key) DO UPDATE SET selector = excluded.selector, body = excluded.body, "
+                "updated_at = excluded.updated_at",
+                (kind, key, selector, json.dumps(body, sort_keys=True), now),
+            )
+        self.names = None
+
+    def record(self, known, outcomes):
+        """Count a request's outcomes; returns the completion tokens the known components saved."""
+        db = shared_db.connect(self.path)
+        saved_total = 0
+        for component, outcome in outcomes.items():
+            saved = estimate_tokens(json.dumps(known[component])) if component in known else 0
+            saved_total += saved
+            db.execute(
+                "INSERT INTO fragment_stats (component, outcome, requests, tokens_saved) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(component, outcome) DO UPDATE SET requests = requests + 1, "
+                "tokens_saved = tokens_saved + excluded.tokens_saved",
+                (component, outcome, saved),
+            )
+            if self.registry is not None:
+                self.registry.inc("fragment_requests_total", component=component, outcome=outcome)
+        if self.registry is not None and saved_total:
+            self.registry.inc("fragment_tokens_saved_total", saved_total)
+        return saved_total
+
+    def report(self):
+        components = {component: {"hit": 0, "local": 0, "miss": 0, "tokens_saved": 0} for component in COMPONENTS}
+        for component, outcome, requests, saved in shared_db.connect(self.path).execute(
+                "SELECT component, outcome, requests, tokens_saved FROM fragment_stats"):
+            entry = components.setdefault(component, {"hit": 0, "local": 0, "miss": 0, "tokens_saved": 0})
+            entry[outcome] = requests
+            entry["tokens_saved"] += saved
+        for entry in components.values():
+            total = entry["hit"] + entry["local"] + entry["miss"]
+            entry["hit_rate"] = round((entry["hit"] + entry["local"]) / total, 3) if total else None
+        requests = sum(entry["hit"] + entry["local"] + entry["miss"] for entry in components.values())
+        reused = sum(entry["hit"] + entry["local"] for entry in components.values())
+        return {"components": components, "hit_rate": round(reused / requests, 3) if requests else None,
+                "tokens_saved": sum(entry["tokens_saved"] for entry in components.values())}
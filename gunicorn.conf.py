@@ -0,0 +1,66 @@
+"""Gunicorn profile for the I/O-bound OpenAI workload.
+
+    gunicorn -c gunicorn.conf.py                 # serves app:app on $PORT
+
+Requests spend most of their time waiting on the upstream model, so the
+default is the threaded ``gthread`` worker: one process per CPU, each
+serving many concurrent requests with threads that release the GIL while
+they wait. app.py holds its job queue in memory and is always served by
+a single process. ``preload_app`` imports the app (numpy, openai, prompts) once in
+the master before forking, so workers start fast and share those pages;
+everything that must not cross a fork (SQLite connections, flusher and job
+threads, executors) is created lazily per process. Async workers
+(``GUNICORN_WORKER_CLASS=gevent``) need gevent installed and turn preloading
+off, because monkey-patching has to happen before the app is imported.
+``gunicorn_sweep.py`` measures which combination is fastest on a machine.
+"""
+import multiprocessing
+import os
+import sys
+
+import metrics
+
+cpus = multiprocessing.cpu_count()
+
+wsgi_app = os.getenv("GUNICORN_APP", "app:app")
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', 10000)}")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+# app.py keeps Abaqus job state and solver threads in-process (job_queue.JobQueue): with several
+# workers /jobs/<id> would 404 on the wrong one and solver concurrency would multiply. It stays
+# single-process (scaling with threads) until jobs live in shared storage; the chat app scales out.
+SINGLE_PROCESS_APPS = ("app:app",)
+default_workers = 1 if wsgi_app in SINGLE_PROCESS_APPS else max(2, cpus)
+workers = int(os.getenv("GUNICORN_WORKERS", os.getenv("WEB_CONCURRENCY", default_workers)))
+if wsgi_app in SINGLE_PROCESS_APPS and workers > 1:
+    print(f"⚠️ {wsgi_app} keeps job state per process; running 1 worker instead of {workers}.", file=sys.stderr)
+    workers = 1
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+# Open connections (including idle keep-alives) per worker, for gthread and async workers alike.
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+preload_app = os.getenv("GUNICORN_PRELOAD", "0" if worker_class in ("gevent", "eventlet") else "1") == "1"
+
+# Long upstream calls are bounded by the circuit breaker (LLM_TIMEOUT_MAX), not by killing workers.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+# Recycle workers now and then so slow leaks (fragmented heaps, caches) stay bounded.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(os.getenv("DATA_DIR", "instance"), "metrics"))
+
+
+def on_starting(server):
+    # Samples from the previous run's workers would otherwise be summed into /metrics.
+    metrics.clear_directory(METRICS_DIR)
+
+
+def post_worker_init(worker):
+    import llm
+
+    llm.transport.start()  # open upstream connections before the first request arrives
@@ -0,0 +1,189 @@
+"""Sweep gunicorn worker classes, worker counts and thread counts against the mock upstream.
+
+For every combination a server is started from ``gunicorn.conf.py`` (via its
+``GUNICORN_*`` variables) with ``OPENAI_BASE_URL`` pointing at a local
+``mock_openai.py``, warmed up, and driven by ``--concurrency`` closed-loop
+clients for ``--duration`` seconds. Every request carries a distinct
+description so nothing is answered from a cache. Rate limits are switched
+off and admission caps raised so the server itself is what is measured.
+The report lists throughput and latency percentiles per configuration and
+picks the highest-throughput one whose error rate stays under
+``--max-error-rate`` (ties broken by p95).
+
+    python gunicorn_sweep.py --classes gthread,sync --workers 2,4 --threads 8,16,32 --latency lognormal:0.6,0.5
+"""
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from replay import EndpointStats
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ASYNC_CLASSES = {"gevent": "gevent", "eventlet": "eventlet"}
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def combinations(classes, workers, threads):
+    """(worker_class, workers, threads); threads only vary for gthread."""
+    seen = []
+    for worker_class, count, thread_count in itertools.product(classes, workers, threads):
+        combo = (worker_class, count, thread_count if worker_class == "gthread" else 1)
+        if combo not in seen:
+            seen.append(combo)
+    return seen
+
+
+async def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return True
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    return False
+
+
+async def drive(base_url, path, concurrency, warmup, duration, timeout):
+    stats = EndpointStats()
+    counter = itertools.count()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+
+    async def client(session, number):
+        while time.monotonic() < stop_at:
+            body = {"description": f"cantilever beam {next(counter)} mm long, steel", "user_id": f"sweep-{number}",
+                    "message": f"how do I mesh part {next(counter)}?"}
+            started = time.monotonic()
+            try:
+                async with session.post(base_url + path, json=body) as response:
+                    await response.read()
+                    failed = response.status >= 400
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                failed = True
+            if started >= measure_from:
+                stats.requests += 1
+                stats.errors += failed
+                stats.latency.record((time.monotonic() - started) * 1000.0)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        await asyncio.gather(*(client(session, number) for number in range(concurrency)))
+    return stats.report(duration)
+
+
+def run_config(args, combo, port, mock_url, data_dir):
+    worker_class, workers, threads = combo
+    env = dict(os.environ, GUNICORN_APP=args.app, GUNICORN_BIND=f"127.0.0.1:{port}",
+               GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads),
+               DATA_DIR=data_dir, OPENAI_BASE_URL=mock_url,
+               RATE_LIMIT_REQUESTS="off", RATE_LIMIT_TOKENS="off", ADMISSION_LIMITS=args.admission_limits,
+               PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])))
+    env.pop("OPENAI_API_KEY", None)
+    # Run from a scratch directory: the app writes cwd-relative files such as static/generated_script.py.
+    os.makedirs(os.path.join(data_dir, "static"), exist_ok=True)
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", os.path.join(HERE, "gunicorn.conf.py")],
+                              cwd=data_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        if not asyncio.run(wait_ready(base_url + "/metrics", 30)):
+            return {"error": "server did not start"}
+        return asyncio.run(drive(base_url, args.path, args.concurrency, args.warmup, args.duration, args.timeout))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=35)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def best(results, max_error_rate):
+    usable = [result for result in results if "error" not in result["report"]
+              and result["report"]["error_rate"] <= max_error_rate]
+    return max(usable, key=lambda result: (result["report"]["throughput_rps"], -result["report"]["p95_ms"]),
+               default=None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the fastest gunicorn worker configuration.")
+    parser.add_argument("--app", default="app:app", help="WSGI app to serve (module:variable)")
+    parser.add_argument("--path", default="/generate_script", help="POST endpoint to load")
+    parser.add_argument("--classes", default="gthread,sync", help="worker classes (gevent/eventlet if installed)")
+    parser.add_argument("--workers", type=int_list, default=[1, os.cpu_count() or 1, 2 * (os.cpu_count() or 1)])
+    parser.add_argument("--threads", type=int_list, default=[4, 16, 32])
+    parser.add_argument("--concurrency", type=int, default=64, help="closed-loop clients")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--latency", default="lognormal:0.6,0.5", help="mock upstream latency (see mock_openai.py)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--admission-limits", default="/generate_script=100000,/chat=100000,llm=100000")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--port", type=int, default=18000, help="server port (the mock uses port + 1)")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args(argv)
+    if args.app == "app:app" and args.workers != [1]:
+        print("⚠️ app:app keeps job state per process and always runs 1 worker; sweeping threads only.")
+        args.workers = [1]
+
+    classes = []
+    for worker_class in args.classes.split(","):
+        module = ASYNC_CLASSES.get(worker_class)
+        if module and importlib.util.find_spec(module) is None:
+            print(f"⚠️ Skipping {worker_class}: {module} is not installed.")
+        else:
+            classes.append(worker_class)
+
+    mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_openai.py"), "--port", str(args.port + 1),
+                             "--latency", args.latency, "--tokens-per-second", str(args.tokens_per_second)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        mock_url = f"http://127.0.0.1:{args.port + 1}/v1"
+        if not asyncio.run(wait_ready(mock_url + "/models", 15)):
+            print("❌ The mock upstream did not start.")
+            return 1
+        with tempfile.TemporaryDirectory() as data_dir:
+            for combo in combinations(classes, args.workers, args.threads):
+                report = run_config(args, combo, args.port, mock_url, os.path.join(data_dir, "-".join(map(str, combo))))
+                results.append({"worker_class": combo[0], "workers": combo[1], "threads": combo[2], "report": report})
+                if "error" in report:
+                    print(f"{combo[0]:>8} w={combo[1]:<3} t={combo[2]:<3} ❌ {report['error']}")
+                else:
+                    print(f"{combo[0]:>8} w={combo[1]:<3} t={combo[2]:<3} {report['throughput_rps']:>9.1f} req/s  "
+                          f"p50 {report['p50_ms']:>8.1f}  p95 {report['p95_ms']:>8.1f}  p99 {report['p99_ms']:>8.1f} ms  "
+                          f"errors {report['error_rate']:.2%}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    winner = best(results, args.max_error_rate)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"results": results, "best": winner}, file, indent=2)
+    if winner is None:
+        print("⚠️ No configuration stayed under the error-rate limit.")
+        return 1
+    print(f"✅ Best: GUNICORN_WORKER_CLASS={winner['worker_class']} GUNICORN_WORKERS={winner['workers']} "
+          f"GUNICORN_THREADS={winner['threads']} ({winner['report']['throughput_rps']} req/s, "
+          f"p95 {winner['report']['p95_ms']} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
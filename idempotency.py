@@ -0,0 +1,156 @@
+"""``Idempotency-Key`` support for expensive POST endpoints, shared by all workers.
+
+The first request carrying a key claims it (an atomic insert into SQLite)
+and runs; its response is stored for ``ttl`` seconds. Duplicates arriving
+meanwhile, in any worker, poll until that response is stored (up to
+``wait_timeout`` seconds, then 409 with Retry-After), and later duplicates
+get the stored response replayed with ``Idempotent-Replayed: true``. The
+same key with a different request body is refused with 422. Responses that
+invite a retry (429 and 5xx) are not stored: the key is released so the
+retry runs. A claim older than ``lease`` seconds is treated as abandoned by
+a crashed worker and may be taken over. The table is bounded by ``ttl`` and
+``max_keys``.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, jsonify, request
+
+import shared_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    owner TEXT,
+    status INTEGER,
+    headers TEXT,
+    body BLOB,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_expiry ON idempotency_keys (expires_at);
+"""
+
+HEADER = "Idempotency-Key"
+_KEPT_HEADERS = ("Content-Type", "Location", "X-Cache")
+
+
+class IdempotencyStore:
+    def __init__(self, path, ttl=86400, max_keys=10000, wait_timeout=30.0, lease=300.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait_timeout = wait_timeout
+        self.lease = lease
+        self.endpoints = set()
+        self.writes = 0
+        self.lock = threading.Lock()
+        shared_db.connect(path).executescript(_SCHEMA)
+
+    def claim(self, key, fingerprint, owner):
+        """None if ``owner`` now holds ``key``, else the existing row (fingerprint, owner, status, headers, body)."""
+        now = time.time()
+        db = shared_db.connect(self.path)
+        claimed = db.execute(
+            "INSERT INTO idempotency_keys (key, fingerprint, owner, created_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET fingerprint = excluded.fingerprint, owner = excluded.owner, "
+            "status = NULL, headers = NULL, body = NULL, created_at = excluded.created_at, "
+            "expires_at = excluded.expires_at WHERE expires_at < ? RETURNING key",
+            (key, fingerprint, owner, now, now + self.lease, now),
+        ).fetchone()
+        if claimed is not None:
+            self._trim(db, now)
+            return None
+        return db.execute("SELECT fingerprint, owner, status, headers, body FROM idempotency_keys WHERE key = ?",
+                          (key,)).fetchone()
+
+    def wait(self, key, fingerprint, owner):
+        """Claim ``key`` or return the stored row, waiting while another request holds it.
+
+        Returns None when claimed, the row when a response is stored (or the fingerprint differs),
+        or "busy" when the holder is still running after ``wait_timeout`` seconds.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        delay = 0.01
+        while True:
+            row = self.claim(key, fingerprint, owner)
+            if row is None or row[2] is not None or row[0] != fingerprint:
+                return row
+            if time.monotonic() >= deadline:
+                return "busy"
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+    def store(self, key, owner, status, headers, body):
+        shared_db.connect(self.path).execute(
+            "UPDATE idempotency_keys SET status = ?, headers = ?, body = ?, expires_at = ? "
+            "WHERE key = ? AND owner = ?",
+            (status, json.dumps(headers), body, time.time() + self.ttl, key, owner),
+        )
+
+    def release(self, key, owner):
+        shared_db.connect(self.path).execute("DELETE FROM idempotency_keys WHERE key = ? AND owner = ? "
+                                             "AND status IS NULL", (key, owner))
+
+    def _trim(self, db, now):
+        with self.lock:
+            self.writes += 1
+            trim = self.writes % 100 == 0
+        if trim:
+            db.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (now,))
+            db.execute("DELETE FROM idempotency_keys WHERE key IN (SELECT key FROM idempotency_keys "
+                       "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_keys,))
+
+    # ✅ Flask integration for the given endpoints (url rules)
+    def init_app(self, app, endpoints):
+        self.endpoints = set(endpoints)
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def _before(self):
+        endpoint = request.url_rule.rule if request.url_rule else None
+        supplied = request.headers.get(HEADER)
+        if endpoint not in self.endpoints or supplied is None:
+            return None
+        if not 0 < len(supplied) <= 255:
+            return jsonify({"error": f"⚠️ {HEADER} must be 1 to 255 characters."}), 400
+        key = f"{endpoint}|{supplied}"
+        fingerprint = hashlib.sha256(request.method.encode() + b" " + request.get_data()).hexdigest()
+        owner = f"{os.getpid()}:{threading.get_ident()}:{time.time()}"
+        row = self.wait(key, fingerprint, owner)
+        if row is None:
+            g.idempotency = (key, owner)
+            return None
+        if row == "busy":
+            response = jsonify({"error": "⚠️ A request with this Idempotency-Key is still in progress."})
+            response.status_code = 409
+            response.headers["Retry-After"] = "1"
+            return response
+        if row[0] != fingerprint:
+            return jsonify({"error": f"⚠️ This {HEADER} was already used for a different request."}), 422
+        _, _, status, headers, body = row
+        replay = Response(body, status=status, headers=json.loads(headers))
+        replay.headers["Idempotent-Replayed"] = "true"
+        return replay
+
+    def _after(self, response):
+        claim = g.pop("idempotency", None)
+        if claim is None:
+            return response
+        key, owner = claim
+        if response.status_code == 429 or response.status_code >= 500 or response.direct_passthrough:
+            self.release(key, owner)  # worth retrying (or not replayable): let the retry run
+        else:
+            headers = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+            self.store(key, owner, response.status_code, headers, response.get_data())
+        return response
+
+    def _teardown(self, error=None):
+        claim = g.pop("idempotency", None)  # still set only if the view raised before a response
+        if claim is not None:
+            self.release(*claim)
@@ -0,0 +1,111 @@
+"""Check the app's cold-start import time against a budget.
+
+Each run imports the target in a fresh interpreter with ``-X importtime``
+(and no API key, as on a sleeping instance that is just waking up). Startup
+is the wall time of that import minus a bare interpreter's start, taking
+the median over ``--runs``. The script fails (exit status 1) when the median
+exceeds ``--budget-ms`` or when any ``--forbid`` module, which must only be
+imported lazily, shows up at startup. The slowest imports are listed to show
+where the time goes.
+
+    python import_budget.py --target app --budget-ms 500
+    python import_budget.py --target app.pyt --forbid openai,pydantic
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_code(target):
+    """Python source importing ``target``: a module name, or a file run without its ``__main__`` block."""
+    if target.endswith((".py", ".pyt")):
+        return f"import runpy; runpy.run_path({os.path.join(HERE, target)!r}, run_name='startup_check')"
+    return f"import {target}"
+
+
+def timed_run(code, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE, env=env,
+                            capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000.0
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = max(modules.get(name.strip(), 0), int(cumulative))
+    return modules
+
+
+def direct_imports(stderr, depth):
+    """(module, cumulative ms) for imports at nesting ``depth`` (the target's own imports), slowest first."""
+    rows = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if (len(name) - len(name.lstrip()) - 1) // 2 == depth:
+                rows.append((name.strip(), int(cumulative) / 1000.0))
+    return sorted(rows, key=lambda row: -row[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when app startup exceeds an import-time budget.")
+    parser.add_argument("--target", default="app", help="module name, or a .py/.pyt file in this directory")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 500)))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--forbid", default="openai,pydantic,tqdm",
+                        help="modules that must not be imported at startup (comma-separated)")
+    parser.add_argument("--top", type=int, default=12, help="slowest imports to list")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, DATA_DIR=data_dir, PYTHONDONTWRITEBYTECODE="")
+        env.pop("OPENAI_API_KEY", None)
+        env.pop("OPENAI_BASE_URL", None)
+        subprocess.run([sys.executable, "-c", import_code(args.target)], cwd=HERE, env=env,
+                       capture_output=True)  # warm the bytecode and page caches
+        baseline = statistics.median(timed_run("pass", env)[0] for _ in range(args.runs))
+        try:
+            runs = [timed_run(import_code(args.target), env) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"❌ Importing {args.target} failed: {e}")
+            return 1
+
+    startup = statistics.median(elapsed for elapsed, _ in runs) - baseline
+    stderr = runs[-1][1]
+    print(f"{args.target}: {startup:.1f} ms startup (median of {args.runs}, interpreter {baseline:.1f} ms excluded), "
+          f"budget {args.budget_ms:.0f} ms")
+    # A module target is itself the top-level import; a file run with runpy imports at the top level.
+    depth = 0 if args.target.endswith((".py", ".pyt")) else 1
+    for name, milliseconds in direct_imports(stderr, depth)[:args.top]:
+        print(f"  {milliseconds:8.1f} ms  {name}")
+
+    failed = False
+    imported = parse_importtime(stderr)
+    for module in filter(None, args.forbid.split(",")):
+        if module in imported:
+            print(f"❌ {module} is imported at startup ({imported[module] / 1000.0:.1f} ms); it should load lazily.")
+            failed = True
+    if startup > args.budget_ms:
+        print(f"❌ Startup exceeds the budget by {startup - args.budget_ms:.1f} ms.")
+        failed = True
+    if not failed:
+        print("✅ Within budget.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
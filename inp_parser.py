@@ -0,0 +1,515 @@
+"""Streaming reader for Abaqus .inp input decks.
+
+Decks are read line by line and numeric data blocks are parsed in bounded
+chunks with NumPy, so a deck of several hundred MB never has to sit in memory
+as text. Parsed decks are cached next to each other as .npy files and loaded
+back memory-mapped, which makes repeat loads close to free.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+
+CACHE_VERSION = 1
+CHUNK_LINES = 65536
+
+# Element types whose node count can't be read off the name.
+_ELEMENT_NODE_COUNTS = {
+    "B21": 2, "B22": 3, "B23": 2, "B31": 2, "B32": 3, "B33": 2,
+    "PIPE21": 2, "PIPE22": 3, "PIPE31": 2, "PIPE32": 3,
+    "STRI3": 3, "STRI65": 6, "MASS": 1, "ROTARYI": 1,
+    "SPRINGA": 2, "DASHPOTA": 2, "CONN2D2": 2, "CONN3D2": 2,
+}
+_DIM_NODES = re.compile(r"\dD(\d+)")
+_LEADING_NODES = re.compile(r"^[A-Z]+(\d+)")
+
+
+def element_node_count(element_type):
+    """Number of nodes per element for an Abaqus element type, or None if unknown."""
+    etype = element_type.upper()
+    for name, count in _ELEMENT_NODE_COUNTS.items():
+        if etype == name or (etype.startswith(name) and not etype[len(name)].isdigit()):
+            return count
+    match = _DIM_NODES.search(etype) or _LEADING_NODES.match(etype)
+    return int(match.group(1)) if match else None
+
+
+def parse_keyword(line):
+    """Split a keyword line into its upper-case name and a dict of parameters."""
+    fields = [field.strip() for field in line.lstrip("*").split(",")]
+    params = {}
+    for field in fields[1:]:
+        if not field:
+            continue
+        name, sep, value = field.partition("=")
+        params[name.strip().upper()] = value.strip().strip('"') if sep else True
+    return " ".join(fields[0].upper().split()), params
+
+
+class ElementBlock:
+    """Connectivity of all elements of one element type."""
+
+    def __init__(self, element_type, ids, connectivity, parts):
+        self.element_type = element_type
+        self.ids = ids
+        self.connectivity = connectivity
+        self.parts = parts
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class InpDeck:
+    """Nodes, elements, sets and step summaries read from an input deck."""
+
+    def __init__(self, path, node_ids, coords, node_parts, elements, nsets, elsets,
+                 parts, steps, keywords, sources):
+        self.path = path
+        self.node_ids = node_ids
+        self.coords = coords
+        self.node_parts = node_parts
+        self.elements = elements
+        self.nsets = nsets
+        self.elsets = elsets
+        self.parts = parts
+        self.steps = steps
+        self.keywords = keywords
+        self.sources = sources
+
+    @property
+    def element_count(self):
+        return sum(len(block) for block in self.elements.values())
+
+    def stats(self):
+        return mesh_stats(self)
+
+
+class _Chunked:
+    """Grows a NumPy array from bounded chunks of comma-separated text lines."""
+
+    def __init__(self, dtype, width):
+        self.dtype = dtype
+        self.width = width
+        self.lines = []
+        self.arrays = []
+
+    def add(self, line):
+        self.lines.append(line.rstrip().rstrip(","))
+        if len(self.lines) >= CHUNK_LINES:
+            self.flush()
+
+    def add_array(self, values):
+        self.flush()
+        self.arrays.append(np.asarray(values, dtype=self.dtype).reshape(-1, self.width))
+
+    def flush(self):
+        if not self.lines:
+            return
+        lines, self.lines = self.lines, []
+        # Every field must parse: a bad token (1.0d0, a word, an empty field) is an error, never a silent cut.
+        try:
+            values = np.array(",".join(lines).split(","), dtype=self.dtype)
+        except ValueError as e:
+            raise ValueError(f"Bad value in a data block of {len(lines)} line(s) starting {lines[0][:60]!r}: {e}")
+        if values.size % self.width:
+            raise ValueError(f"Data block does not split into rows of {self.width} values")
+        self.arrays.append(values.reshape(-1, self.width))
+
+    def result(self):
+        self.flush()
+        if not self.arrays:
+            return np.empty((0, self.width), dtype=self.dtype)
+        return np.concatenate(self.arrays)
+
+
+class _Parser:
+    """Keyword-driven state machine that fills chunked buffers as lines stream past."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.sources = []
+        self.keywords = {}
+        self.parts = [""]
+        self.part = 0
+        self.nodes = {}
+        self.elements = {}
+        self.element_parts = {}
+        self.nsets = {}
+        self.elsets = {}
+        self.steps = []
+        self.handler = None
+        self.block = None
+
+    # Abaqus set names are case-insensitive; parts scope their sets.
+    def set_name(self, name):
+        prefix = self.parts[self.part]
+        name = name.upper()
+        return f"{prefix}.{name}" if prefix else name
+
+    def run(self):
+        self.read_file(self.path)
+        self.end_block()
+        return self.build()
+
+    def read_file(self, path):
+        stat = os.stat(path)
+        self.sources.append({"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        keyword_line = None
+        with open(path, "r", errors="replace") as handle:
+            for line in handle:
+                if line.startswith("**"):
+                    continue
+                stripped = line.strip()
+                if not stripped:
+                    continue
+                if keyword_line is not None:
+                    keyword_line += stripped
+                    if not stripped.endswith(","):
+                        self.keyword(keyword_line, path)
+                        keyword_line = None
+                elif stripped.startswith("*"):
+                    if stripped.endswith(","):
+                        keyword_line = stripped
+                    else:
+                        self.keyword(stripped, path)
+                elif self.handler is not None:
+                    self.handler(stripped)
+        if keyword_line is not None:
+            self.keyword(keyword_line, path)
+
+    # Like job_queue._copy_includes, only files under the main deck's directory are followed.
+    def include_path(self, path, include):
+        root = os.path.realpath(os.path.dirname(self.path))
+        target = os.path.normpath(os.path.join(os.path.dirname(path), include))
+        real = os.path.realpath(target)
+        if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+            raise ValueError(f"*INCLUDE must name a file under the deck's directory, got {include!r}")
+        return target
+
+    def keyword(self, line, path):
+        self.end_block()
+        name, params = parse_keyword(line)
+        self.keywords[name] = self.keywords.get(name, 0) + 1
+
+        if name == "INCLUDE":
+            include = params.get("INPUT")
+            if isinstance(include, str):
+                self.read_file(self.include_path(path, include))
+        elif name == "PART":
+            self.parts.append(str(params.get("NAME", f"PART-{len(self.parts)}")).upper())
+            self.part = len(self.parts) - 1
+        elif name in ("END PART", "END INSTANCE"):
+            self.part = 0
+        elif name == "NODE":
+            self.start_node_block(params)
+        elif name == "ELEMENT":
+            self.start_element_block(params)
+        elif name in ("NSET", "ELSET"):
+            self.start_set_block(name, params)
+        elif name == "STEP":
+            self.steps.append({
+                "name": params.get("NAME", f"Step-{len(self.steps) + 1}"),
+                "nlgeom": str(params.get("NLGEOM", "NO")).upper() in ("YES", "TRUE"),
+                "max_increments": int(params["INC"]) if str(params.get("INC", "")).isdigit() else None,
+                "procedure": None,
+                "increment": None,
+            })
+        elif self.steps and self.steps[-1]["procedure"] is None and name not in ("END STEP",):
+            step = self.steps[-1]
+            step["procedure"] = ", ".join([name] + [flag for flag, value in params.items() if value is True])
+            self.handler = lambda data: self.step_increment(step, data)
+
+    def start_node_block(self, params):
+        self.block = {"kind": "node", "nset": params.get("NSET"), "chunks": {}}
+        self.handler = self.node_line
+
+    def node_line(self, line):
+        width = line.count(",") + 1 - line.endswith(",")
+        chunks = self.block["chunks"]
+        if width not in chunks:
+            chunks[width] = _Chunked(np.float64, width)
+        chunks[width].add(line)
+
+    def start_element_block(self, params):
+        etype = str(params.get("TYPE", "UNKNOWN")).upper()
+        count = element_node_count(etype)
+        self.block = {
+            "kind": "element",
+            "type": etype,
+            "elset": params.get("ELSET"),
+            "chunk": _Chunked(np.int64, count + 1) if count else None,
+            "rows": [],
+            "row": [],
+        }
+        self.handler = self.element_line
+
+    def element_line(self, line):
+        block = self.block
+        if block["chunk"] is not None:
+            block["chunk"].add(line)
+            return
+        # Unknown type: a trailing comma continues the element on the next line.
+        block["row"].extend(int(value) for value in line.rstrip(",").split(",") if value.strip())
+        if not line.endswith(","):
+            block["rows"].append(block["row"])
+            block["row"] = []
+
+    def start_set_block(self, keyword, params):
+        name = params.get(keyword)
+        if not isinstance(name, str):
+            self.handler = None
+            return
+        self.block = {
+            "kind": keyword,
+            "name": self.set_name(name),
+            "generate": "GENERATE" in params,
+            "chunk": _Chunked(np.int64, 1),
+        }
+        self.handler = self.set_line
+
+    def set_line(self, line):
+        block = self.block
+        values = [value.strip() for value in line.rstrip(",").split(",") if value.strip()]
+        if block["generate"]:
+            if not 2 <= len(values) <= 3 or not all(value.lstrip("-").isdigit() for value in values):
+                raise ValueError(f"*{block['kind']}, GENERATE needs start, end[, step], got {line!r}")
+            start, end = int(values[0]), int(values[1])
+            step = int(values[2]) if len(values) > 2 else 1
+            if step < 1:
+                raise ValueError(f"*{block['kind']}, GENERATE step must be positive, got {line!r}")
+            block["chunk"].add_array(np.arange(start, end + 1, step))
+        elif all(value.lstrip("-").isdigit() for value in values):
+            block["chunk"].add(line)
+        else:
+            sets = self.nsets if block["kind"] == "NSET" else self.elsets
+            for value in values:
+                if value.lstrip("-").isdigit():
+                    block["chunk"].add_array([int(value)])
+                else:
+                    members = sets.get(self.set_name(value), sets.get(value.upper()))
+                    if members is not None:
+                        block["chunk"].add_array(np.concatenate(members))
+
+    def step_increment(self, step, line):
+        # First data line of the procedure: initial increment, period, min, max.
+        values = [value.strip() for value in line.split(",")]
+        try:
+            step["increment"] = [float(value) if value else None for value in values[:4]]
+        except ValueError:
+            pass
+        self.handler = None
+
+    def end_block(self):
+        block, self.block, self.handler = self.block, None, None
+        if block is None:
+            return
+        if block["kind"] == "node":
+            for chunk in block["chunks"].values():
+                rows = chunk.result()
+                if not len(rows):
+                    continue
+                xyz = np.zeros((len(rows), 3))
+                xyz[:, : min(3, rows.shape[1] - 1)] = rows[:, 1:4]
+                ids = rows[:, 0].astype(np.int64)
+                self.nodes.setdefault(self.part, []).append((ids, xyz))
+                if block["nset"]:
+                    self.nsets.setdefault(self.set_name(block["nset"]), []).append(ids)
+        elif block["kind"] == "element":
+            if block["chunk"] is not None:
+                rows = block["chunk"].result()
+            elif block["rows"]:
+                width = max(len(row) for row in block["rows"])
+                rows = np.zeros((len(block["rows"]), width), dtype=np.int64)
+                for index, row in enumerate(block["rows"]):
+                    rows[index, : len(row)] = row
+            else:
+                return
+            etype = block["type"]
+            self.elements.setdefault(etype, []).append(rows)
+            self.element_parts.setdefault(etype, []).append(np.full(len(rows), self.part, dtype=np.int32))
+            if block["elset"]:
+                self.elsets.setdefault(self.set_name(block["elset"]), []).append(rows[:, 0])
+        else:
+            sets = self.nsets if block["kind"] == "NSET" else self.elsets
+            sets.setdefault(block["name"], []).append(block["chunk"].result().ravel())
+
+    def build(self):
+        ids, coords, parts = [], [], []
+        for part, blocks in self.nodes.items():
+            for block_ids, block_xyz in blocks:
+                ids.append(block_ids)
+                coords.append(block_xyz)
+                parts.append(np.full(len(block_ids), part, dtype=np.int32))
+        elements = {}
+        for etype, blocks in self.elements.items():
+            widths = {block.shape[1] for block in blocks}
+            if len(widths) > 1:
+                width = max(widths)
+                blocks = [np.pad(block, ((0, 0), (0, width - block.shape[1]))) for block in blocks]
+            rows = np.concatenate(blocks)
+            elements[etype] = ElementBlock(
+                etype, rows[:, 0].copy(), rows[:, 1:].copy(), np.concatenate(self.element_parts[etype])
+            )
+        return InpDeck(
+            path=self.path,
+            node_ids=np.concatenate(ids) if ids else np.empty(0, dtype=np.int64),
+            coords=np.concatenate(coords) if coords else np.empty((0, 3)),
+            node_parts=np.concatenate(parts) if parts else np.empty(0, dtype=np.int32),
+            elements=elements,
+            nsets={name: np.unique(np.concatenate(members)) for name, members in self.nsets.items()},
+            elsets={name: np.unique(np.concatenate(members)) for name, members in self.elsets.items()},
+            parts=self.parts,
+            steps=self.steps,
+            keywords=self.keywords,
+            sources=self.sources,
+        )
+
+
+def parse_inp(path):
+    """Parse an input deck (following *INCLUDE files) without touching the cache."""
+    return _Parser(path).run()
+
+
+# ✅ .npy cache: one directory per deck, validated against source sizes and mtimes
+def _cache_path(path, cache_dir):
+    digest = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()[:20]
+    return os.path.join(cache_dir, digest)
+
+
+def _sources_unchanged(sources):
+    for source in sources:
+        try:
+            stat = os.stat(source["path"])
+        except OSError:
+            return False
+        if stat.st_size != source["size"] or stat.st_mtime_ns != source["mtime_ns"]:
+            return False
+    return True
+
+
+def _save_sets(directory, prefix, sets):
+    names = sorted(sets)
+    members = [sets[name] for name in names]
+    offsets = np.cumsum([0] + [len(values) for values in members], dtype=np.int64)
+    np.save(os.path.join(directory, f"{prefix}_members.npy"),
+            np.concatenate(members) if members else np.empty(0, dtype=np.int64))
+    np.save(os.path.join(directory, f"{prefix}_offsets.npy"), offsets)
+    return names
+
+
+def _load_sets(directory, prefix, names):
+    members = np.load(os.path.join(directory, f"{prefix}_members.npy"), mmap_mode="r")
+    offsets = np.load(os.path.join(directory, f"{prefix}_offsets.npy"))
+    return {name: members[offsets[i]:offsets[i + 1]] for i, name in enumerate(names)}
+
+
+def save_cache(deck, cache_dir):
+    """Write a parsed deck to the .npy cache."""
+    target = _cache_path(deck.path, cache_dir)
+    tmp = f"{target}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "node_ids.npy"), deck.node_ids)
+    np.save(os.path.join(tmp, "coords.npy"), deck.coords)
+    np.save(os.path.join(tmp, "node_parts.npy"), deck.node_parts)
+    element_types = []
+    for index, (etype, block) in enumerate(sorted(deck.elements.items())):
+        element_types.append(etype)
+        np.save(os.path.join(tmp, f"elem{index}_ids.npy"), block.ids)
+        np.save(os.path.join(tmp, f"elem{index}_conn.npy"), block.connectivity)
+        np.save(os.path.join(tmp, f"elem{index}_parts.npy"), block.parts)
+    manifest = {
+        "version": CACHE_VERSION,
+        "path": deck.path,
+        "sources": deck.sources,
+        "element_types": element_types,
+        "nsets": _save_sets(tmp, "nset", deck.nsets),
+        "elsets": _save_sets(tmp, "elset", deck.elsets),
+        "parts": deck.parts,
+        "steps": deck.steps,
+        "keywords": deck.keywords,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as file:
+        json.dump(manifest, file)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return target
+
+
+def load_cache(path, cache_dir):
+    """Load a deck from the cache with memory-mapped arrays, or None if stale or missing."""
+    directory = _cache_path(path, cache_dir)
+    try:
+        with open(os.path.join(directory, "manifest.json")) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != CACHE_VERSION or not _sources_unchanged(manifest["sources"]):
+        return None
+
+    def load(name):
+        return np.load(os.path.join(directory, name), mmap_mode="r")
+
+    elements = {
+        etype: ElementBlock(etype, load(f"elem{i}_ids.npy"), load(f"elem{i}_conn.npy"), load(f"elem{i}_parts.npy"))
+        for i, etype in enumerate(manifest["element_types"])
+    }
+    return InpDeck(
+        path=manifest["path"],
+        node_ids=load("node_ids.npy"),
+        coords=load("coords.npy"),
+        node_parts=load("node_parts.npy"),
+        elements=elements,
+        nsets=_load_sets(directory, "nset", manifest["nsets"]),
+        elsets=_load_sets(directory, "elset", manifest["elsets"]),
+        parts=manifest["parts"],
+        steps=manifest["steps"],
+        keywords=manifest["keywords"],
+        sources=manifest["sources"],
+    )
+
+
+def load_inp(path, cache_dir=None):
+    """Load a deck, going through the .npy cache when a cache directory is given."""
+    if cache_dir is None:
+        return parse_inp(path)
+    deck = load_cache(path, cache_dir)
+    if deck is None:
+        os.makedirs(cache_dir, exist_ok=True)
+        save_cache(parse_inp(path), cache_dir)
+        deck = load_cache(path, cache_dir)
+    return deck
+
+
+def mesh_stats(deck):
+    """Summary statistics for a parsed deck, as plain JSON-serialisable values."""
+    coords = np.asarray(deck.coords)
+    has_nodes = len(coords) > 0
+    return {
+        "path": deck.path,
+        "file_size": sum(source["size"] for source in deck.sources),
+        "includes": [source["path"] for source in deck.sources[1:]],
+        "nodes": int(len(deck.node_ids)),
+        "elements": int(deck.element_count),
+        "element_types": {etype: int(len(block)) for etype, block in deck.elements.items()},
+        "parts": [part for part in deck.parts if part],
+        "nsets": {name: int(len(members)) for name, members in deck.nsets.items()},
+        "elsets": {name: int(len(members)) for name, members in deck.elsets.items()},
+        "bounding_box": {
+            "min": coords.min(axis=0).tolist() if has_nodes else None,
+            "max": coords.max(axis=0).tolist() if has_nodes else None,
+        },
+        "steps": deck.steps,
+        "keywords": deck.keywords,
+    }
+
+
+def timed_load(path, cache_dir=None):
+    """Load a deck and return it with the wall time the load took, in seconds."""
+    started = time.perf_counter()
+    deck = load_inp(path, cache_dir)
+    return deck, time.perf_counter() - started
@@ -0,0 +1,211 @@
+"""Runtime and memory estimates for Abaqus jobs, calibrated from finished runs.
+
+Runtime is modelled as log(seconds) = w . features and refined with recursive
+least squares every time a job completes, starting from hand-set prior
+weights so the first predictions are already in the right ballpark. Memory
+uses a DOF-based heuristic scaled by a running correction factor.
+"""
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+import inp_parser
+
+FEATURE_NAMES = (
+    "bias", "log_elements", "nonlinear", "explicit", "log_increments",
+    "contact", "steps", "quadratic",
+)
+PRIOR_WEIGHTS = (0.5, 0.35, 1.0, 1.2, 0.5, 0.7, 0.2, 0.6)
+
+DEFAULT_ELEMENTS = 5000
+DEFAULT_INCREMENTS = 1
+
+_NONLINEAR_PROCEDURES = ("STATIC, RIKS", "DYNAMIC", "VISCO", "COUPLED TEMPERATURE-DISPLACEMENT")
+_STEP_CALLS = re.compile(r"\b(StaticStep|StaticRiksStep|ImplicitDynamicsStep|ExplicitDynamicsStep|"
+                         r"FrequencyStep|BuckleStep|HeatTransferStep|ViscoStep|CoupledTempDisplacementStep)\(")
+_ELEM_CODE = re.compile(r"elemCode\s*=\s*([A-Z0-9]+)")
+_SEED_SIZE = re.compile(r"seed(?:Part|Edge\w*)\([^)]*size\s*=\s*([0-9.eE+-]+)")
+_POINTS = re.compile(r"point[12]\s*=\s*\(\s*([0-9.eE+-]+)\s*,\s*([0-9.eE+-]+)")
+_DEPTH = re.compile(r"depth\s*=\s*([0-9.eE+-]+)")
+_NUMBER_KW = {
+    "max_increments": re.compile(r"maxNumInc\s*=\s*([0-9]+)"),
+    "initial_increment": re.compile(r"initialInc\s*=\s*([0-9.eE+-]+)"),
+    "time_period": re.compile(r"timePeriod\s*=\s*([0-9.eE+-]+)"),
+}
+
+
+def _is_quadratic(element_type):
+    etype = element_type.upper()
+    count = inp_parser.element_node_count(etype) or 0
+    if etype.startswith(("B", "PIPE", "T")):
+        return count == 3
+    if "3D" in etype and etype.startswith(("C", "DC")):
+        return count > 8
+    return count > 4
+
+
+def _expected_increments(max_increments, initial_increment, time_period):
+    if initial_increment and time_period and initial_increment > 0:
+        return max(1.0, time_period / initial_increment)
+    return float(max_increments or DEFAULT_INCREMENTS)
+
+
+def features_from_script(text):
+    """Feature dict for a generated Abaqus Python (CAE) script."""
+    steps = _STEP_CALLS.findall(text)
+    element_types = _ELEM_CODE.findall(text)
+
+    elements = DEFAULT_ELEMENTS
+    seed = _SEED_SIZE.search(text)
+    points = _POINTS.findall(text)
+    if seed and len(points) >= 2:
+        size = float(seed.group(1))
+        (x1, y1), (x2, y2) = [(float(a), float(b)) for a, b in points[:2]]
+        depth = _DEPTH.search(text)
+        extent_z = float(depth.group(1)) if depth else size
+        if size > 0:
+            elements = max(1, int(abs(x2 - x1) / size) * int(abs(y2 - y1) / size) * max(1, int(extent_z / size)))
+
+    numbers = {name: pattern.search(text) for name, pattern in _NUMBER_KW.items()}
+    numbers = {name: float(match.group(1)) if match else None for name, match in numbers.items()}
+    nonlinear = bool(re.search(r"nlgeom\s*=\s*ON|\.Plastic\(|Hyperelastic\(", text)) or any(
+        step in ("StaticRiksStep", "ImplicitDynamicsStep", "ViscoStep") for step in steps
+    )
+    return {
+        "elements": elements,
+        "element_types": sorted(set(element_types)),
+        "steps": len(steps) or 1,
+        "step_types": steps,
+        "nonlinear": nonlinear,
+        "explicit": "ExplicitDynamicsStep" in steps,
+        "contact": bool(re.search(r"ContactProperty\(|SurfaceToSurfaceContact|ContactExp|ContactStd", text)),
+        "increments": _expected_increments(numbers["max_increments"], numbers["initial_increment"], numbers["time_period"]),
+    }
+
+
+def features_from_deck(deck):
+    """Feature dict for a parsed input deck (see inp_parser)."""
+    steps = deck.steps or [{"procedure": "STATIC", "nlgeom": False, "increment": None, "max_increments": None}]
+    increments = 0.0
+    for step in steps:
+        increment = step.get("increment") or [None, None]
+        increments += _expected_increments(step.get("max_increments"), increment[0],
+                                           increment[1] if len(increment) > 1 else None)
+    keywords = deck.keywords
+    return {
+        "elements": deck.element_count or DEFAULT_ELEMENTS,
+        "element_types": sorted(deck.elements),
+        "steps": len(steps),
+        "step_types": [step.get("procedure") for step in steps],
+        "nonlinear": any(step.get("nlgeom") for step in steps)
+        or any(step.get("procedure") in _NONLINEAR_PROCEDURES for step in steps)
+        or "PLASTIC" in keywords or "HYPERELASTIC" in keywords,
+        "explicit": any(step.get("procedure") == "DYNAMIC, EXPLICIT" for step in steps),
+        "contact": "CONTACT PAIR" in keywords or "CONTACT" in keywords,
+        "increments": increments,
+    }
+
+
+def feature_vector(features):
+    return np.array([
+        1.0,
+        math.log1p(features["elements"]),
+        float(features["nonlinear"]),
+        float(features["explicit"]),
+        math.log1p(features["increments"]) if features["nonlinear"] or features["explicit"] else 0.0,
+        float(features["contact"]),
+        float(features["steps"]),
+        float(any(_is_quadratic(etype) for etype in features["element_types"])),
+    ])
+
+
+def _memory_heuristic_mb(features):
+    dof = features["elements"] * 3.6
+    if features["explicit"]:
+        return 256.0 + 0.002 * features["elements"]
+    return 256.0 + 0.0002 * dof ** 1.25
+
+
+class JobEstimator:
+    """Online-calibrated runtime/memory model; safe to share between threads."""
+
+    def __init__(self, state_path=None, forgetting=0.98):
+        self.state_path = state_path
+        self.forgetting = forgetting
+        self.lock = threading.Lock()
+        self.weights = np.array(PRIOR_WEIGHTS, dtype=float)
+        self.covariance = np.eye(len(FEATURE_NAMES))
+        self.memory_log_ratio = 0.0
+        self.observations = 0
+        self._load()
+
+    def predict(self, features):
+        """(seconds, memory_mb) expected for a job with these features."""
+        x = feature_vector(features)
+        with self.lock:
+            seconds = math.exp(float(self.weights @ x))
+            memory = _memory_heuristic_mb(features) * math.exp(self.memory_log_ratio)
+        return seconds, memory
+
+    def observe(self, features, wall_seconds, peak_memory_mb=None):
+        """Fold one completed job into the model (recursive least squares in log space)."""
+        x = feature_vector(features)
+        y = math.log(max(wall_seconds, 0.1))
+        with self.lock:
+            px = self.covariance @ x
+            gain = px / (self.forgetting + x @ px)
+            self.weights = self.weights + gain * (y - self.weights @ x)
+            self.covariance = (self.covariance - np.outer(gain, px)) / self.forgetting
+            if peak_memory_mb:
+                error = math.log(peak_memory_mb / _memory_heuristic_mb(features)) - self.memory_log_ratio
+                self.memory_log_ratio += 0.2 * error
+            self.observations += 1
+        self._save()
+
+    def state(self):
+        with self.lock:
+            return {
+                "weights": dict(zip(FEATURE_NAMES, self.weights.round(4).tolist())),
+                "memory_scale": round(math.exp(self.memory_log_ratio), 4),
+                "observations": self.observations,
+            }
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as file:
+                state = json.load(file)
+            self.weights = np.array(state["weights"], dtype=float)
+            self.covariance = np.array(state["covariance"], dtype=float)
+            self.memory_log_ratio = state["memory_log_ratio"]
+            self.observations = state["observations"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        if not self.state_path:
+            return
+        with self.lock:
+            state = {
+                "weights": self.weights.tolist(),
+                "covariance": self.covariance.tolist(),
+                "memory_log_ratio": self.memory_log_ratio,
+                "observations": self.observations,
+            }
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        # A unique temp file per call: several solver threads may finish jobs at once.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.state_path) or ".",
+                                   prefix=os.path.basename(self.state_path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(state, file)
+            os.replace(tmp, self.state_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
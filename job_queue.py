@@ -0,0 +1,225 @@
+"""In-process Abaqus job queue with shortest-expected-job-first scheduling.
+
+Each job gets its own working directory under ``jobs_dir`` so solver outputs
+(.sta/.msg/.dat/.odb) of concurrent runs never collide. Queued jobs are
+ordered by predicted runtime minus an aging credit for the time they have
+already waited, so short checks overtake long runs without starving them.
+"""
+import heapq
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import inp_parser
+import job_estimator
+
+SCRIPT_COMMAND = "abaqus cae noGUI={script}"
+DECK_COMMAND = "abaqus job={job} input={script} interactive"
+
+log = logging.getLogger(__name__)
+
+
+class Job:
+    """One solver run and everything known or predicted about it."""
+
+    def __init__(self, job_id, script_path, work_dir, features, predicted_seconds, predicted_memory_mb):
+        self.id = job_id
+        self.script_path = script_path
+        self.work_dir = work_dir
+        self.features = features
+        self.predicted_seconds = predicted_seconds
+        self.predicted_memory_mb = predicted_memory_mb
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.returncode = None
+        self.peak_memory_mb = None
+        self.error = None
+
+    def to_dict(self, plan=None):
+        predicted_start, predicted_finish = (plan or {}).get(self.id, (None, None))
+        return {
+            "id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "predicted_seconds": round(self.predicted_seconds, 1),
+            "predicted_memory_mb": round(self.predicted_memory_mb),
+            "predicted_start": predicted_start,
+            "predicted_finish": predicted_finish,
+            "returncode": self.returncode,
+            "peak_memory_mb": self.peak_memory_mb,
+            "error": self.error,
+            "features": self.features,
+        }
+
+
+class JobQueue:
+    """Runs submitted scripts/decks on a fixed number of worker threads."""
+
+    def __init__(self, estimator, jobs_dir, workers=1, aging_rate=1.0,
+                 script_command=SCRIPT_COMMAND, deck_command=DECK_COMMAND, history=500):
+        self.estimator = estimator
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.aging_rate = aging_rate
+        self.script_command = script_command
+        self.deck_command = deck_command
+        self.history = history
+        self.jobs = OrderedDict()
+        self.queued = []
+        self.running = {}
+        self.condition = threading.Condition()
+        self.threads = []
+        self.on_complete = []
+
+    def submit(self, source_path):
+        """Copy a script or .inp deck into a fresh job directory and queue it."""
+        job_id = uuid.uuid4().hex[:12]
+        work_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(work_dir)
+        is_deck = source_path.lower().endswith(".inp")
+        script_path = os.path.join(work_dir, f"job_{job_id}.inp" if is_deck else "script.py")
+        shutil.copyfile(source_path, script_path)
+
+        if is_deck:
+            deck = inp_parser.parse_inp(source_path)
+            _copy_includes(deck, work_dir)
+            features = job_estimator.features_from_deck(deck)
+        else:
+            with open(script_path, errors="replace") as file:
+                features = job_estimator.features_from_script(file.read())
+        seconds, memory = self.estimator.predict(features)
+        job = Job(job_id, script_path, work_dir, features, seconds, memory)
+
+        with self.condition:
+            self.jobs[job_id] = job
+            self.queued.append(job)
+            self._trim_history()
+            self._start_workers()
+            self.condition.notify()
+        return job
+
+    def get(self, job_id):
+        with self.condition:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.condition:
+            return list(self.jobs.values())
+
+    def priority(self, job, now):
+        return job.predicted_seconds - self.aging_rate * (now - job.submitted_at)
+
+    def schedule(self):
+        """Predicted (start, finish) epoch times for every queued and running job."""
+        now = time.time()
+        with self.condition:
+            plan = {}
+            free_at = []
+            for job in self.running.values():
+                finish = max(now, job.started_at + job.predicted_seconds)
+                plan[job.id] = (job.started_at, finish)
+                free_at.append(finish)
+            free_at += [now] * (self.workers - len(free_at))
+            heapq.heapify(free_at)
+            for job in sorted(self.queued, key=lambda queued: self.priority(queued, now)):
+                start = heapq.heappop(free_at)
+                plan[job.id] = (start, start + job.predicted_seconds)
+                heapq.heappush(free_at, start + job.predicted_seconds)
+            return plan
+
+    # Worker threads start on first submit, i.e. after gunicorn has forked.
+    def _start_workers(self):
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"abaqus-worker-{len(self.threads)}", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("succeeded", "failed")]
+        for job_id in finished[: max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    def _next_job(self):
+        with self.condition:
+            while not self.queued:
+                self.condition.wait()
+            now = time.time()
+            job = min(self.queued, key=lambda queued: self.priority(queued, now))
+            self.queued.remove(job)
+            job.status = "running"
+            job.started_at = now
+            self.running[job.id] = job
+            return job
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._run(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"Server error: {str(e)}"
+            finally:
+                job.finished_at = time.time()
+                with self.condition:
+                    self.running.pop(job.id, None)
+            # Learning and completion hooks must never take the worker thread down with them.
+            if job.status == "succeeded":
+                try:
+                    self.estimator.observe(job.features, job.finished_at - job.started_at, job.peak_memory_mb)
+                except Exception:
+                    log.exception("⚠️ Runtime estimator failed to learn from job %s", job.id)
+            for callback in self.on_complete:
+                try:
+                    callback(job)
+                except Exception:
+                    log.exception("⚠️ Completion callback %r failed for job %s", callback, job.id)
+
+    def _run(self, job):
+        template = self.deck_command if job.script_path.endswith(".inp") else self.script_command
+        command = template.format(script=shlex.quote(os.path.basename(job.script_path)), job=f"job_{job.id}")
+        with open(os.path.join(job.work_dir, "stdout.log"), "wb") as out, \
+                open(os.path.join(job.work_dir, "stderr.log"), "wb") as err:
+            process = subprocess.Popen(command, shell=True, cwd=job.work_dir, stdout=out, stderr=err)
+            job.returncode, job.peak_memory_mb = _wait_with_usage(process)
+
+        if job.returncode == 0:
+            job.status = "succeeded"
+        else:
+            job.status = "failed"
+            with open(os.path.join(job.work_dir, "stderr.log"), errors="replace") as file:
+                job.error = f"Abaqus execution failed: {file.read()[-2000:]}"
+
+
+def _copy_includes(deck, work_dir):
+    """Copy a deck's *INCLUDE files next to the job copy, keeping relative paths."""
+    root = os.path.dirname(deck.path)
+    for source in deck.sources[1:]:
+        relative = os.path.relpath(source["path"], root)
+        if relative.startswith(".."):
+            continue
+        target = os.path.join(work_dir, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(source["path"], target)
+
+
+def _wait_with_usage(process):
+    """Wait for a child and return (exit code, peak RSS in MB or None)."""
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return process.returncode, round(usage.ru_maxrss / scale, 1)
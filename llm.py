@@ -0,0 +1,63 @@
+"""The OpenAI client, built on first use over the shared upstream transport.
+
+Importing ``openai`` (and the pydantic models it pulls in) takes about half a
+second, most of a cold start, so nothing imports it until the first upstream
+call: health checks, cached answers and result views never pay for it.
+``llm.OpenAIError`` resolves lazily for ``except`` clauses. A missing key is
+reported when the client is first needed (and by ``/healthz``) instead of
+failing the import. Requests go through ``transport`` (upstream.py), whose
+pooled connections are kept warm between requests.
+"""
+import os
+import threading
+
+import upstream
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # e.g. a local mock_openai.py server
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def configured():
+    return bool(OPENAI_API_KEY or OPENAI_BASE_URL)
+
+
+transport = upstream.UpstreamTransport(
+    OPENAI_BASE_URL or "https://api.openai.com/v1",
+    api_key=OPENAI_API_KEY,
+    max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 64)),
+    keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 90)),
+    min_warm=int(os.getenv("UPSTREAM_MIN_WARM", 2)) if configured() else 0,
+    warm_interval=float(os.getenv("UPSTREAM_WARM_INTERVAL", 30)),
+    http2={"1": True, "0": False}.get(os.getenv("UPSTREAM_HTTP2", "")),  # default: when h2 is installed
+)
+
+
+def client_ready():
+    return _client_pid == os.getpid()
+
+
+def get_client():
+    global _client, _client_pid
+    if _client_pid != os.getpid():  # never share pooled sockets across a fork
+        with _lock:
+            if _client_pid != os.getpid():
+                if not configured():
+                    raise ValueError("❌ OpenAI API Key is missing. Set OPENAI_API_KEY in environment variables.")
+                import openai
+
+                _client = openai.OpenAI(api_key=OPENAI_API_KEY or "mock", base_url=OPENAI_BASE_URL,
+                                        http_client=transport.client())
+                _client_pid = os.getpid()
+    return _client
+
+
+def __getattr__(name):
+    if name == "OpenAIError":
+        import openai
+
+        return openai.OpenAIError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
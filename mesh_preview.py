@@ -0,0 +1,198 @@
+"""Surface extraction, decimation and binary packing of meshes for the browser preview.
+
+The outer surface of solid elements is the set of faces owned by exactly one
+element; shell/membrane/planar elements contribute their own face. Surfaces
+over the triangle budget are simplified by vertex clustering on a uniform
+grid whose resolution is bisected until the budget is met, which stays fully
+vectorised and takes seconds even for million-element meshes.
+
+Buffer layout (little-endian): b"MPV1", uint32 vertex count, uint32 triangle
+count, uint32 reserved, float32 xyz * vertices, uint32 abc * triangles.
+"""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+import inp_parser
+
+MAGIC = b"MPV1"
+DEFAULT_TRIANGLES = 200000
+
+# Corner-node faces in Abaqus ordering; triangles repeat their last node.
+_HEX_FACES = ((0, 1, 2, 3), (4, 7, 6, 5), (0, 4, 5, 1), (1, 5, 6, 2), (2, 6, 7, 3), (3, 7, 4, 0))
+_TET_FACES = ((0, 1, 2, 2), (0, 3, 1, 1), (1, 3, 2, 2), (2, 3, 0, 0))
+_WEDGE_FACES = ((0, 1, 2, 2), (3, 5, 4, 4), (0, 3, 4, 1), (1, 4, 5, 2), (2, 5, 3, 0))
+_QUAD_FACE = ((0, 1, 2, 3),)
+_TRI_FACE = ((0, 1, 2, 2),)
+_LINE_PREFIXES = ("B", "T2D", "T3D", "PIPE", "CONN", "SPRING", "DASHPOT", "MASS", "ROTARYI", "FRAME", "ELBOW")
+
+
+def element_faces(element_type):
+    """Face table for an element type, whether its faces are shared between elements, or None."""
+    etype = element_type.upper()
+    if etype.startswith(_LINE_PREFIXES):
+        return None
+    count = inp_parser.element_node_count(etype)
+    solid = etype.startswith(("C3D", "DC3D", "COH3D", "SC", "AC3D", "DCC3D"))
+    if solid:
+        if count in (8, 20, 27):
+            return _HEX_FACES, True
+        if count in (4, 10):
+            return _TET_FACES, True
+        if count in (6, 15):
+            return _WEDGE_FACES, True
+        return None
+    if count in (3, 6):
+        return _TRI_FACE, False
+    if count in (4, 8, 9):
+        return _QUAD_FACE, False
+    return None
+
+
+def _node_keys(parts, labels):
+    return (np.asarray(parts, dtype=np.int64) << 32) | np.asarray(labels, dtype=np.int64)
+
+
+def extract_surface(node_ids, coords, node_parts, blocks):
+    """Outer surface as (vertices float32 (V, 3), triangles uint32 (T, 3))."""
+    keys = _node_keys(node_parts, node_ids)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    solid_faces, open_faces = [], []
+    for block in blocks:
+        faces = element_faces(block.element_type)
+        if faces is None or not len(block.ids):
+            continue
+        table, shared = faces
+        connectivity = np.asarray(block.connectivity)
+        element_keys = (np.asarray(block.parts, dtype=np.int64)[:, None] << 32) | connectivity
+        position = np.searchsorted(sorted_keys, element_keys).clip(0, len(sorted_keys) - 1)
+        found = sorted_keys[position] == element_keys
+        index = np.where(found, order[position], -1)
+        for face in table:
+            rows = index[:, face]
+            rows = rows[(rows >= 0).all(axis=1)]
+            (solid_faces if shared else open_faces).append(rows)
+
+    faces = []
+    if solid_faces:
+        solid = np.concatenate(solid_faces)
+        faces.append(solid[_unshared(solid, len(keys))])
+    faces.extend(open_faces)
+    if not faces:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint32)
+    faces = np.concatenate(faces)
+
+    quads = faces[:, 2] != faces[:, 3]
+    triangles = np.concatenate([faces[:, [0, 1, 2]], faces[quads][:, [0, 2, 3]]])
+    used, triangles = np.unique(triangles, return_inverse=True)
+    vertices = np.asarray(coords, dtype=np.float32)[used]
+    return vertices, triangles.reshape(-1, 3).astype(np.uint32)
+
+
+def _unshared(faces, node_count):
+    """Mask of faces that occur exactly once (i.e. lie on the boundary)."""
+    ordered = np.sort(faces, axis=1).astype(np.uint64)
+    width = np.uint64(max(node_count, 1))
+    high = ordered[:, 0] * width + ordered[:, 1]
+    low = ordered[:, 2] * width + ordered[:, 3]
+    order = np.lexsort((low, high))
+    high, low = high[order], low[order]
+    same_as_next = np.zeros(len(faces), dtype=bool)
+    same_as_next[:-1] = (high[1:] == high[:-1]) & (low[1:] == low[:-1])
+    duplicated = same_as_next.copy()
+    duplicated[1:] |= same_as_next[:-1]
+    mask = np.empty(len(faces), dtype=bool)
+    mask[order] = ~duplicated
+    return mask
+
+
+def _cluster(vertices, triangles, resolution, origin, size):
+    cells = np.floor((vertices - origin) / size * resolution).astype(np.int64).clip(0, resolution)
+    cell_keys = (cells[:, 0] * (resolution + 1) + cells[:, 1]) * (resolution + 1) + cells[:, 2]
+    unique_cells, cluster = np.unique(cell_keys, return_inverse=True)
+    counts = np.bincount(cluster, minlength=len(unique_cells)).astype(np.float64)
+    merged = np.column_stack([
+        np.bincount(cluster, weights=vertices[:, axis], minlength=len(unique_cells)) / counts for axis in range(3)
+    ]).astype(np.float32)
+    remapped = cluster[triangles]
+    keep = (remapped[:, 0] != remapped[:, 1]) & (remapped[:, 1] != remapped[:, 2]) & (remapped[:, 0] != remapped[:, 2])
+    remapped = remapped[keep]
+    _, first = np.unique(np.sort(remapped, axis=1), axis=0, return_index=True)
+    return merged, remapped[np.sort(first)].astype(np.uint32)
+
+
+def decimate(vertices, triangles, budget):
+    """Vertex-clustering decimation to at most ``budget`` triangles."""
+    if len(triangles) <= budget:
+        return vertices, triangles
+    origin = vertices.min(axis=0)
+    size = float((vertices.max(axis=0) - origin).max()) or 1.0
+    low, high = 1, max(2, int(np.sqrt(len(triangles))) * 2)
+    best = _cluster(vertices, triangles, low, origin, size)
+    while high - low > 1:
+        middle = (low + high) // 2
+        candidate = _cluster(vertices, triangles, middle, origin, size)
+        if len(candidate[1]) <= budget:
+            low, best = middle, candidate
+        else:
+            high = middle
+    return best
+
+
+def pack(vertices, triangles):
+    header = MAGIC + struct.pack("<III", len(vertices), len(triangles), 0)
+    return header + vertices.astype("<f4").tobytes() + triangles.astype("<u4").tobytes()
+
+
+def preview_deck(deck, budget=DEFAULT_TRIANGLES):
+    vertices, triangles = extract_surface(deck.node_ids, deck.coords, deck.node_parts, deck.elements.values())
+    return pack(*decimate(vertices, triangles, budget))
+
+
+def preview_arrays(nodes, elements, budget=DEFAULT_TRIANGLES):
+    """Preview from exported arrays: nodes [[id, x, y, z], ...], elements {type: [[id, n1, ...], ...]}."""
+    nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 4)
+    blocks = []
+    for etype, rows in elements.items():
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.ndim == 2 and len(rows):
+            count = inp_parser.element_node_count(etype)
+            if count is not None and rows.shape[1] != count + 1:
+                raise ValueError(f"{etype} rows need an id and {count} nodes, got {rows.shape[1]} values")
+            blocks.append(inp_parser.ElementBlock(etype.upper(), rows[:, 0], rows[:, 1:], np.zeros(len(rows), dtype=np.int32)))
+    node_ids = nodes[:, 0].astype(np.int64)
+    vertices, triangles = extract_surface(node_ids, nodes[:, 1:], np.zeros(len(nodes), dtype=np.int32), blocks)
+    return pack(*decimate(vertices, triangles, budget))
+
+
+# ✅ Content-hash keyed cache of packed previews
+def deck_hash(deck):
+    digest = hashlib.sha256()
+    for source in deck.sources:
+        with open(source["path"], "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def payload_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def cached_preview(cache_dir, content_hash, budget, build):
+    path = os.path.join(cache_dir, f"{content_hash[:32]}-{budget}.bin")
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            return file.read()
+    data = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as file:
+        file.write(data)
+    os.replace(tmp, path)
+    return data
@@ -0,0 +1,252 @@
+"""Counters, gauges and histograms in Prometheus text format, summed across workers.
+
+Every process keeps its samples in memory (one dict update under a lock per
+observation) and a background thread writes them, at most once per
+``flush_interval``, to ``<directory>/<pid>.json``. ``render()`` merges the files of all processes:
+counters and histograms add up, including those of workers that have
+exited, while gauges only count processes that are still alive. Clear the
+directory when the server (re)starts, e.g. from gunicorn's ``on_starting``.
+Without a directory only the current process is reported.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0, 14400.0, 43200.0, 86400.0)
+
+
+class Registry:
+    """Metric definitions plus this process's samples."""
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.definitions = {}
+        self.samples = {}
+        self.dirty = False
+        self.flusher_pid = None
+        self.pid = os.getpid()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def define(self, name, kind, help_text, buckets=DEFAULT_BUCKETS):
+        self.definitions[name] = {"type": kind, "help": help_text, "buckets": list(buckets)}
+
+    def counter(self, name, help_text):
+        self.define(name, "counter", help_text)
+
+    def gauge(self, name, help_text):
+        self.define(name, "gauge", help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.define(name, "histogram", help_text, buckets)
+
+    # ✅ Recording (cheap: one dict update; files are written by a background thread)
+    def inc(self, name, value=1.0, **labels):
+        self._update(name, labels, lambda sample: sample + value, 0.0)
+
+    def set(self, name, value, **labels):
+        self._update(name, labels, lambda sample: value, 0.0)
+
+    def observe(self, name, value, **labels):
+        buckets = self.definitions[name]["buckets"]
+
+        def add(sample):
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    sample[0][index] += 1
+                    break
+            sample[1] += value
+            sample[2] += 1
+            return sample
+
+        self._update(name, labels, add, None)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _update(self, name, labels, update, initial):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            if os.getpid() != self.pid:  # forked: samples belong to the parent
+                self.pid, self.samples = os.getpid(), {}
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = initial if initial is not None else [[0] * len(self.definitions[name]["buckets"]), 0.0, 0]
+            self.samples[key] = update(sample)
+            self.dirty = True
+            if self.directory and self.flusher_pid != self.pid:  # threads don't survive fork
+                self.flusher_pid = self.pid
+                threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        while self.flusher_pid == os.getpid():
+            time.sleep(self.flush_interval)
+            if self.dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    pass  # retried on the next tick
+
+    def flush(self):
+        if not self.directory:
+            return
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.pid, self.samples = os.getpid(), {}
+            self.dirty = False
+            rows = [[name, list(labels), sample] for (name, labels), sample in self.samples.items()]
+            payload = json.dumps({"pid": self.pid, "samples": rows})
+        path = os.path.join(self.directory, f"{self.pid}.json")
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, "w") as file:
+            file.write(payload)
+        os.replace(tmp, path)
+
+    # ✅ Aggregation across processes and Prometheus text exposition
+    def collect(self):
+        """{(name, labels): merged sample} over every process's last flush."""
+        if not self.directory:
+            with self.lock:
+                return {key: _copy(sample) for key, sample in self.samples.items()}
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            alive = _alive(data["pid"])
+            for name, labels, sample in data["samples"]:
+                definition = self.definitions.get(name)
+                if definition is None or (definition["type"] == "gauge" and not alive):
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if key not in merged:
+                    merged[key] = _copy(sample)
+                elif definition["type"] == "histogram":
+                    current = merged[key]
+                    current[0] = [a + b for a, b in zip(current[0], sample[0])]
+                    current[1] += sample[1]
+                    current[2] += sample[2]
+                else:
+                    merged[key] += sample
+        return merged
+
+    def render(self):
+        by_name = {}
+        for (name, labels), sample in self.collect().items():
+            by_name.setdefault(name, []).append((labels, sample))
+        lines = []
+        for name in sorted(by_name):
+            definition = self.definitions[name]
+            lines.append(f"# HELP {name} {definition['help']}")
+            lines.append(f"# TYPE {name} {definition['type']}")
+            for labels, sample in sorted(by_name[name]):
+                if definition["type"] != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(sample)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(definition["buckets"], sample[0]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {sample[2]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(sample[1])}")
+                lines.append(f"{name}_count{_labels(labels)} {sample[2]}")
+        return "\n".join(lines) + "\n"
+
+    # ✅ Flask integration: request latency, in-flight gauge and the /metrics endpoint
+    def init_app(self, app, path="/metrics"):
+        self.counter("http_requests_total", "HTTP requests by endpoint, method and status.")
+        self.histogram("http_request_duration_seconds", "HTTP request latency by endpoint.")
+        self.gauge("http_requests_in_flight", "Requests currently being handled, by endpoint.")
+        self.histogram("stage_duration_seconds", "Time spent in one stage of handling a request.")
+        self.counter("llm_tokens_total", "LLM tokens by kind (prompt, cached, completion) and model.")
+        self.counter("cache_requests_total", "Cache lookups by cache and result (hit, miss).")
+
+        @app.before_request
+        def start_request():
+            g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            g.metrics_started = time.perf_counter()
+            self.inc("http_requests_in_flight", endpoint=g.metrics_endpoint)
+
+        @app.after_request
+        def finish_request(response):
+            endpoint = g.get("metrics_endpoint")
+            if endpoint is not None:
+                self.observe("http_request_duration_seconds", time.perf_counter() - g.metrics_started,
+                             endpoint=endpoint, method=request.method)
+                self.inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+            return response
+
+        @app.teardown_request
+        def end_request(error=None):
+            endpoint = g.pop("metrics_endpoint", None)
+            if endpoint is not None:
+                self.inc("http_requests_in_flight", -1, endpoint=endpoint)
+
+        def metrics_view():
+            return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+        app.add_url_rule(path, "metrics", metrics_view)
+
+    def count_tokens(self, usage, **labels):
+        """Add an LLM response's prompt/cached/completion token counts to ``llm_tokens_total``."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.inc("llm_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt", **labels)
+        self.inc("llm_tokens_total", (getattr(details, "cached_tokens", 0) if details else 0) or 0, kind="cached", **labels)
+        self.inc("llm_tokens_total", getattr(usage, "completion_tokens", 0) or 0, kind="completion", **labels)
+
+    def stage(self, stage):
+        """Timer for one stage of the current request (labelled with its endpoint)."""
+        return self.timer("stage_duration_seconds", endpoint=g.get("metrics_endpoint", "none"), stage=stage)
+
+
+def clear_directory(directory):
+    """Remove every process's samples (call once when the server starts)."""
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _copy(sample):
+    return [list(sample[0]), sample[1], sample[2]] if isinstance(sample, list) else sample
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
@@ -0,0 +1,339 @@
+"""Local stand-in for the OpenAI API, for offline tests and load benchmarks.
+
+Speaks the wire format of ``POST /v1/chat/completions`` (plain and
+``stream=true`` server-sent events), ``POST /v1/embeddings`` and
+``GET /v1/models``. Each completion waits a time-to-first-token drawn from
+a latency distribution and then emits its tokens at a configurable rate;
+a share of requests can be failed with 500s or rate-limited with 429s.
+``--handshake-delay`` adds a simulated TCP+TLS setup cost to the first
+request on every new connection, and ``/mock/stats`` counts connections, so
+keep-alive and connection warming can be measured against it.
+Replies are canned (a small Abaqus script, or rules loaded from a JSON file)
+or echo the last user message; requests with ``tools`` get a call to the
+forced (or first) function, with arguments built from its JSON schema's
+``examples``. Repeated leading system prompts are reported
+as ``prompt_tokens_details.cached_tokens`` like upstream prefix caching.
+
+    python mock_openai.py --port 8089 --latency lognormal:0.6,0.5 --tokens-per-second 60
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 gunicorn app:app
+
+Latency specs: ``fixed:S``, ``uniform:LOW,HIGH``, ``normal:MEAN,SD``,
+``lognormal:MEDIAN,SIGMA``, ``exponential:MEAN`` (all in seconds).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+import numpy as np
+from aiohttp import web
+
+from conversation_memory import estimate_tokens
+
+CANNED_REPLY = """Here is a minimal Abaqus script:
+
+```python
+from abaqus import *
+from abaqusConstants import *
+
+model = mdb.Model(name='Model-1')
+sketch = model.ConstrainedSketch(name='profile', sheetSize=200.0)
+sketch.rectangle(point1=(0.0, 0.0), point2=(100.0, 10.0))
+part = model.Part(name='Beam', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseSolidExtrude(sketch=sketch, depth=10.0)
+```
+"""
+CACHE_BLOCK = 128  # cached prefix tokens are reported in these increments
+CACHE_MINIMUM = 1024
+
+_PIECES = re.compile(r"\s*\S+|\s+")
+
+
+def latency_sampler(spec, rng):
+    """Callable returning one latency in seconds for a spec such as ``lognormal:0.6,0.5``."""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value.strip()]
+    samplers = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: rng.uniform(values[0], values[1]),
+        "normal": lambda: rng.gauss(values[0], values[1]),
+        "lognormal": lambda: values[0] * math.exp(rng.gauss(0.0, values[1])),
+        "exponential": lambda: rng.expovariate(1.0 / values[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    sampler = samplers[kind]
+    sampler()  # validates the argument count
+    return lambda: max(0.0, sampler())
+
+
+class MockSettings:
+    """Behaviour of the mock server (see the command-line options for meanings)."""
+
+    def __init__(self, latency="fixed:0.2", tokens_per_second=50.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, reply="canned", rules=None, max_tokens=300, embedding_dimensions=1536, seed=None,
+                 handshake_delay=0.0):
+        self.rng = random.Random(seed)
+        self.latency = latency_sampler(latency, self.rng)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.reply = reply
+        self.rules = rules or []  # [{"match": substring, "reply": text}], first match wins
+        self.max_tokens = max_tokens
+        self.embedding_dimensions = embedding_dimensions
+        self.handshake_delay = handshake_delay
+        self.prefixes = set()
+        self.connections = {}  # id(protocol) -> protocol, for connections still open
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0, "connections": 0, "http_requests": 0}
+
+
+def _error(status, message, kind, headers=None):
+    body = {"error": {"message": message, "type": kind, "param": None, "code": None}}
+    return web.json_response(body, status=status, headers=headers)
+
+
+def _injected_failure(settings):
+    settings.counts["requests"] += 1
+    roll = settings.rng.random()
+    if roll < settings.rate_limit_rate:
+        settings.counts["rate_limited"] += 1
+        return _error(429, "Rate limit reached (mock).", "requests", {
+            "Retry-After": str(settings.retry_after),
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": f"{settings.retry_after}s",
+        })
+    if roll < settings.rate_limit_rate + settings.error_rate:
+        settings.counts["errors"] += 1
+        return _error(500, "The server had an error while processing your request (mock).", "server_error")
+    return None
+
+
+def _reply_text(settings, messages):
+    question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if isinstance(question, list):  # content parts
+        question = " ".join(part.get("text", "") for part in question if isinstance(part, dict))
+    for rule in settings.rules:
+        if rule["match"].lower() in question.lower():
+            return rule["reply"]
+    return question if settings.reply == "echo" else CANNED_REPLY
+
+
+def schema_example(schema, defs=None):
+    """An instance of a JSON schema: its first example, enum or const value, else a placeholder by type."""
+    defs = schema.get("$defs", {}) if defs is None else defs
+    if "$ref" in schema:
+        return schema_example(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if schema.get("examples"):
+        return schema["examples"][0]
+    if "const" in schema:
+        return schema["const"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    options = schema.get("anyOf") or schema.get("oneOf")
+    if options:
+        typed = [option for option in options if option.get("type") != "null"] or options
+        return schema_example(typed[0], defs)
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {name: schema_example(prop, defs) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [schema_example(schema.get("items", {}), defs) for _ in range(max(1, schema.get("minItems", 1)))]
+    return {"string": "example", "number": 1.0, "integer": 1, "boolean": False, "null": None}.get(kind)
+
+
+def _forced_tool(body):
+    """(name, JSON schema) of the function a request with ``tools`` should call, else None."""
+    functions = [tool["function"] for tool in body.get("tools") or [] if tool.get("type") == "function"]
+    choice = body.get("tool_choice")
+    if not functions or choice == "none":
+        return None
+    if isinstance(choice, dict):
+        functions = [f for f in functions if f["name"] == choice.get("function", {}).get("name")] or functions
+    return functions[0]["name"], functions[0].get("parameters") or {}
+
+
+def _usage(settings, messages, completion_tokens):
+    prompt_tokens = sum(estimate_tokens(str(m.get("content") or "")) + 4 for m in messages)
+    cached = 0
+    if messages and messages[0].get("role") == "system":
+        prefix = str(messages[0].get("content") or "")
+        prefix_tokens = estimate_tokens(prefix)
+        digest = hashlib.sha256(prefix.encode()).digest()
+        if digest in settings.prefixes and prefix_tokens >= CACHE_MINIMUM:
+            cached = min(prefix_tokens, prompt_tokens) // CACHE_BLOCK * CACHE_BLOCK
+        settings.prefixes.add(digest)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+async def chat_completions(request):
+    settings = request.app["settings"]
+    try:
+        body = await request.json()
+        messages = body["messages"]
+    except (ValueError, KeyError):
+        return _error(400, "Expected a JSON body with 'messages'.", "invalid_request_error")
+    failure = _injected_failure(settings)
+    if failure is not None:
+        return failure
+
+    limit = body.get("max_completion_tokens") or body.get("max_tokens") or settings.max_tokens
+    tool = _forced_tool(body)
+    reply_text = json.dumps(schema_example(tool[1])) if tool else _reply_text(settings, messages)
+    reply = _PIECES.findall(reply_text)  # roughly one piece per token
+    pieces = reply[:limit]
+    text = "".join(pieces)
+    finish_reason = "length" if len(reply) > limit else "tool_calls" if tool else "stop"
+    call_id = f"call_{uuid.uuid4().hex[:24]}"
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    model = body.get("model", "mock")
+    usage = _usage(settings, messages, len(pieces))
+    per_token = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+
+    await asyncio.sleep(settings.latency())
+    if not body.get("stream"):
+        await asyncio.sleep(per_token * len(pieces))
+        message = {"role": "assistant", "content": text}
+        if tool:
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                {"id": call_id, "type": "function", "function": {"name": tool[0], "arguments": text}}]}
+        return web.json_response({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+
+    async def send(delta, finish=None, chunk_usage=None):
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else []}
+        if chunk_usage is not None:
+            chunk["usage"] = chunk_usage
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    if tool:
+        await send({"role": "assistant", "content": None, "tool_calls": [
+            {"index": 0, "id": call_id, "type": "function", "function": {"name": tool[0], "arguments": ""}}]})
+    else:
+        await send({"role": "assistant", "content": ""})
+    for piece in pieces:
+        await asyncio.sleep(per_token)
+        await send({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]} if tool else {"content": piece})
+    await send({}, finish_reason)
+    if (body.get("stream_options") or {}).get("include_usage"):
+        await send(None, chunk_usage=usage)
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+async def embeddings(request):
+    settings = request.app["settings"]
+    try:
+        body = await request.json()
+        inputs = body["input"]
+    except (ValueError, KeyError):
+        return _error(400, "Expected a JSON body with 'input'.", "invalid_request_error")
+    failure = _injected_failure(settings)
+    if failure is not None:
+        return failure
+
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    dimensions = int(body.get("dimensions") or settings.embedding_dimensions)
+    data = []
+    for index, text in enumerate(inputs):
+        # Deterministic unit vectors: equal inputs embed identically.
+        seed = int.from_bytes(hashlib.sha256(json.dumps(text).encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimensions)
+        vector /= np.linalg.norm(vector)
+        data.append({"object": "embedding", "index": index, "embedding": vector.astype(np.float32).tolist()})
+    await asyncio.sleep(settings.latency())
+    tokens = sum(estimate_tokens(json.dumps(text)) for text in inputs)
+    return web.json_response({
+        "object": "list", "data": data, "model": body.get("model", "mock-embedding"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    })
+
+
+async def models(request):
+    names = ("gpt-4", "gpt-4o", "gpt-4o-mini", "text-embedding-3-small")
+    return web.json_response({"object": "list", "data": [
+        {"id": name, "object": "model", "created": 0, "owned_by": "mock"} for name in names
+    ]})
+
+
+@web.middleware
+async def track_connections(request, handler):
+    settings = request.app["settings"]
+    settings.counts["http_requests"] += 1
+    protocol = request.protocol
+    if settings.connections.get(id(protocol)) is not protocol:
+        for key, known in list(settings.connections.items()):
+            if known.transport is None:  # closed
+                del settings.connections[key]
+        settings.connections[id(protocol)] = protocol
+        settings.counts["connections"] += 1
+        await asyncio.sleep(settings.handshake_delay)
+    return await handler(request)
+
+
+async def stats(request):
+    return web.json_response(request.app["settings"].counts)
+
+
+def create_app(settings=None):
+    app = web.Application(client_max_size=64 * 1024 * 1024, middlewares=[track_connections])
+    app["settings"] = settings or MockSettings()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/embeddings", embeddings)
+    app.router.add_get("/v1/models", models)
+    app.router.add_get("/mock/stats", stats)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenAI API server for offline testing and benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0.2", help="time-to-first-token distribution, e.g. lognormal:0.6,0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="completion token rate (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--reply", choices=["canned", "echo"], default="canned")
+    parser.add_argument("--rules", help='JSON file of [{"match": substring, "reply": text}] canned replies')
+    parser.add_argument("--max-tokens", type=int, default=300, help="completion cap when a request sets none")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--handshake-delay", type=float, default=0.0,
+                        help="seconds added to the first request on each new connection (simulated TCP+TLS setup)")
+    parser.add_argument("--keepalive-timeout", type=float, default=75.0, help="seconds before idle connections close")
+    args = parser.parse_args(argv)
+
+    rules = None
+    if args.rules:
+        with open(args.rules, encoding="utf-8") as file:
+            rules = json.load(file)
+    settings = MockSettings(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, reply=args.reply, rules=rules,
+        max_tokens=args.max_tokens, seed=args.seed, handshake_delay=args.handshake_delay,
+    )
+    web.run_app(create_app(settings), host=args.host, port=args.port, keepalive_timeout=args.keepalive_timeout)
+
+
+if __name__ == "__main__":
+    main()
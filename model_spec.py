@@ -0,0 +1,464 @@
+"""Structured model specifications, rendered locally into Abaqus Python.
+
+Instead of writing a whole script, the model fills in a compact
+:class:`ModelSpec` through a forced ``emit_model_spec`` function call:
+geometry, material, section, mesh, steps, loads, boundary conditions and
+job, in mm, N, MPa, tonne/mm^3 and s. The arguments are validated here
+with pydantic (names safe to embed, positive dimensions, element types that
+match the geometry, loads and BCs that refer to defined steps), and
+:func:`render` writes the script deterministically, so the model's output
+is a few hundred tokens of JSON rather than boilerplate code. Each
+component renders independently and is memoised by its parameters; equal
+specs always produce the same script.
+
+pydantic is slow to import, so the app imports this module on first use.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Annotated, List, Literal, Optional
+
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, ValidationError, model_validator
+
+TOOL_NAME = "emit_model_spec"
+MAX_TOKENS = 400
+TEMPERATURE = 0.0
+
+_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_-]{0,37}$")
+
+
+def _abaqus_name(value):
+    if not _NAME.match(value):
+        raise ValueError("must start with a letter and use at most 38 letters, digits, '_' or '-'")
+    return value
+
+
+def _positive(value):
+    if value <= 0:
+        raise ValueError("must be greater than zero")
+    return value
+
+
+# Constraints are checked by validators rather than schema keywords, which not every model accepts.
+Name = Annotated[str, AfterValidator(_abaqus_name)]
+Positive = Annotated[float, AfterValidator(_positive)]
+
+ELEMENT_TYPES = {
+    "beam": ("B31", "B32"),
+    "shell": ("S4R", "S4", "S8R", "S3"),
+    "solid": ("C3D8R", "C3D8", "C3D20R", "C3D10", "C3D4"),
+}
+SECTION_KINDS = {
+    "beam": ("rectangular_profile", "circular_profile"),
+    "shell": ("homogeneous_shell",),
+    "solid": ("homogeneous_solid",),
+}
+
+
+class _Component(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+
+class Geometry(_Component):
+    kind: Literal["beam", "shell", "solid"] = Field(examples=["beam"])
+    shape: Literal["rectangle", "circle"] = Field(
+        description="Cross-section (beam, solid) or outline (shell, rectangle only).", examples=["rectangle"])
+    length: Positive = Field(description="Along x (beam, shell) or z (solid), mm.", examples=[1000.0])
+    width: Positive = Field(description="Cross-section width or circle diameter (beam, solid); "
+                                        "plate width along y (shell), mm.", examples=[20.0])
+    height: Positive = Field(description="Cross-section height, mm (ignored for circles and shells).",
+                             examples=[40.0])
+
+
+class Material(_Component):
+    name: Name = Field(examples=["Steel"])
+    youngs_modulus: Positive = Field(description="MPa.", examples=[210000.0])
+    poisson_ratio: float = Field(examples=[0.3])
+    density: Optional[Positive] = Field(description="tonne/mm^3; required for gravity, dynamics and "
+                                                    "frequency steps.", examples=[7.85e-9])
+    yield_stress: Optional[Positive] = Field(description="MPa, for perfectly plastic behaviour; null if elastic.",
+                                             examples=[None])
+
+    @model_validator(mode="after")
+    def _check_poisson(self):
+        if not -1.0 < self.poisson_ratio < 0.5:
+            raise ValueError("poisson_ratio must lie between -1 and 0.5")
+        return self
+
+
+class Section(_Component):
+    kind: Literal["rectangular_profile", "circular_profile", "homogeneous_shell", "homogeneous_solid"] = Field(
+        examples=["rectangular_profile"])
+    thickness: Optional[Positive] = Field(description="Shell thickness, mm; null otherwise.", examples=[None])
+
+
+class Mesh(_Component):
+    element_type: Literal["B31", "B32", "S4R", "S4", "S8R", "S3", "C3D8R", "C3D8", "C3D20R", "C3D10", "C3D4"] = Field(
+        examples=["B31"])
+    seed_size: Positive = Field(description="Global seed size, mm.", examples=[50.0])
+
+
+class Step(_Component):
+    name: Name = Field(examples=["Load"])
+    kind: Literal["static", "frequency", "dynamic_explicit"] = Field(examples=["static"])
+    nlgeom: bool = Field(examples=[False])
+    time_period: Positive = Field(description="s (1.0 for static steps).", examples=[1.0])
+    num_eigen: Optional[int] = Field(description="Modes to extract (frequency steps only).", examples=[None])
+
+
+class Load(_Component):
+    name: Name = Field(examples=["TipLoad"])
+    step: Name = Field(examples=["Load"])
+    kind: Literal["concentrated_force", "pressure", "gravity"] = Field(examples=["concentrated_force"])
+    region: Literal["free_end", "top_surface", "all"] = Field(
+        description="Concentrated forces act on the free end, pressure on the top surface, gravity on all.",
+        examples=["free_end"])
+    direction: Literal["x", "y", "z"] = Field(description="Ignored for pressure.", examples=["y"])
+    magnitude: float = Field(description="N for forces (per node of the region), MPa for pressure, "
+                                         "mm/s^2 for gravity; the sign gives the sense.", examples=[-1000.0])
+
+
+class BoundaryCondition(_Component):
+    name: Name = Field(examples=["Fixed"])
+    step: Name = Field(description="'Initial' or a step name.", examples=["Initial"])
+    kind: Literal["encastre", "pinned", "displacement"] = Field(examples=["encastre"])
+    region: Literal["fixed_end", "free_end"] = Field(examples=["fixed_end"])
+    direction: Optional[Literal["x", "y", "z"]] = Field(description="Displacement BCs only.", examples=[None])
+    displacement: Optional[float] = Field(description="mm, displacement BCs only.", examples=[None])
+
+
+class JobSpec(_Component):
+    name: Name = Field(examples=["Cantilever"])
+    cpus: int = Field(examples=[1])
+
+
+class ModelSpec(_Component):
+    geometry: Geometry
+    material: Material
+    section: Section
+    mesh: Mesh
+    steps: List[Step]
+    loads: List[Load]
+    boundary_conditions: List[BoundaryCondition]
+    job: JobSpec
+
+    @model_validator(mode="after")
+    def _check_consistency(self):
+        kind = self.geometry.kind
+        problems = []
+        if self.section.kind not in SECTION_KINDS[kind]:
+            problems.append(f"section {self.section.kind} does not fit a {kind} model")
+        if kind == "shell" and (self.section.thickness is None or self.geometry.shape != "rectangle"):
+            problems.append("shells need a rectangular outline and a section thickness")
+        if self.mesh.element_type not in ELEMENT_TYPES[kind]:
+            problems.append(f"element type {self.mesh.element_type} does not fit a {kind} model")
+        if not self.steps:
+            problems.append("at least one step is required")
+        if len({step.name for step in self.steps}) != len(self.steps) or "Initial" in {s.name for s in self.steps}:
+            problems.append("step names must be unique and not 'Initial'")
+        if len({step.kind == "dynamic_explicit" for step in self.steps}) > 1:
+            problems.append("explicit steps cannot be mixed with Abaqus/Standard steps")
+        needs_density = any(step.kind != "static" for step in self.steps) or any(
+            load.kind == "gravity" for load in self.loads)
+        if needs_density and self.material.density is None:
+            problems.append("gravity, dynamic and frequency analyses need a material density")
+        if any(step.kind == "frequency" and not step.num_eigen for step in self.steps):
+            problems.append("frequency steps need num_eigen")
+        step_names = {step.name for step in self.steps}
+        for load in self.loads:
+            if load.step not in step_names:
+                problems.append(f"load {load.name} refers to unknown step {load.step}")
+            if load.kind == "pressure" and (kind == "beam" or load.region != "top_surface"):
+                problems.append(f"pressure load {load.name} needs a shell or solid and region top_surface")
+            if load.kind == "gravity" and load.region != "all":
+                problems.append(f"gravity load {load.name} must use region all")
+            if load.kind == "concentrated_force" and load.region != "free_end":
+                problems.append(f"concentrated force {load.name} must use region free_end")
+        for bc in self.boundary_conditions:
+            if bc.step not in step_names | {"Initial"}:
+                problems.append(f"boundary condition {bc.name} refers to unknown step {bc.step}")
+            if bc.kind == "displacement" and (bc.direction is None or bc.displacement is None):
+                problems.append(f"displacement BC {bc.name} needs a direction and a displacement")
+        if len({item.name for item in [*self.loads, *self.boundary_conditions]}) != \
+                len(self.loads) + len(self.boundary_conditions):
+            problems.append("load and boundary condition names must be unique")
+        if problems:
+            raise ValueError("; ".join(problems))
+        return self
+
+
+class SpecError(Exception):
+    """The model's answer was not a valid model specification."""
+
+
+# ✅ Request and response handling for the forced function call
+def tool_definition(omit=()):
+    """The ``emit_model_spec`` function, without the components in ``omit``."""
+    schema = ModelSpec.model_json_schema()
+    if omit:
+        schema["properties"] = {name: prop for name, prop in schema["properties"].items() if name not in omit}
+        schema["required"] = [name for name in schema["required"] if name not in omit]
+    return {
+        "type": "function",
+        "function": {
+            "name": TOOL_NAME,
+            "description": "Specify the Abaqus model to generate.",
+            "parameters": schema,
+        },
+    }
+
+
+def request_body(builder, description, model, known=None):
+    """Chat-completions request body asking for the spec of one model description.
+
+    Components already in ``known`` ({component: value}) are shown to the model and left out of the call.
+    """
+    prompt = f"Model to set up: {description}"
+    if known:
+        prompt += ("\nThese components are already specified; use them and do not repeat them: "
+                   + json.dumps(known, sort_keys=True))
+    return {
+        "model": model,
+        "messages": builder.messages(prompt),
+        "tools": [tool_definition(omit=tuple(known or ()))],
+        "tool_choice": {"type": "function", "function": {"name": TOOL_NAME}},
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+    }
+
+
+def parse_message(message, known=None):
+    """The validated :class:`ModelSpec` in an assistant message (completed by ``known``), or :class:`SpecError`."""
+    calls = [call for call in (message.tool_calls or []) if call.function.name == TOOL_NAME]
+    if not calls:
+        raise SpecError("the model did not call " + TOOL_NAME)
+    try:
+        arguments = json.loads(calls[0].function.arguments)
+    except ValueError:
+        raise SpecError("the function arguments are not JSON")
+    if not isinstance(arguments, dict):
+        raise SpecError("the function arguments are not an object")
+    try:
+        return ModelSpec.model_validate({**arguments, **(known or {})})
+    except ValidationError as e:
+        raise SpecError(f"invalid model spec: {e.error_count()} problem(s): "
+                        + "; ".join(error["msg"] for error in e.errors()[:3]))
+
+
+def spec_json(spec):
+    return spec.model_dump_json()
+
+
+def from_json(text):
+    return ModelSpec.model_validate_json(text)
+
+
+# ✅ Deterministic rendering, one memoised fragment per component
+def _num(value):
+    return repr(float(value))
+
+
+def _component_key(component):
+    return json.dumps(component.model_dump(), sort_keys=True)
+
+
+@lru_cache(maxsize=1024)
+def _geometry(key):
+    g = Geometry.model_validate_json(key)
+    length, width = _num(g.length), _num(g.width)
+    sheet = _num(2.0 * max(g.length, g.width, g.height))
+    if g.kind == "beam":
+        return f'''
+# Geometry: {g.length:g} mm beam along x
+sketch = model.ConstrainedSketch(name='Geometry', sheetSize={sheet})
+sketch.Line(point1=(0.0, 0.0), point2=({length}, 0.0))
+part = model.Part(name='Part-1', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseWire(sketch=sketch)
+part.Set(name='All', edges=part.edges)
+part.Set(name='FixedEnd', vertices=part.vertices.findAt(((0.0, 0.0, 0.0),)))
+part.Set(name='FreeEnd', vertices=part.vertices.findAt((({length}, 0.0, 0.0),)))
+'''
+    if g.kind == "shell":
+        return f'''
+# Geometry: {g.length:g} x {g.width:g} mm plate in the XY plane
+sketch = model.ConstrainedSketch(name='Geometry', sheetSize={sheet})
+sketch.rectangle(point1=(0.0, 0.0), point2=({length}, {width}))
+part = model.Part(name='Part-1', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseShell(sketch=sketch)
+part.Set(name='All', faces=part.faces)
+part.Set(name='FixedEnd', edges=part.edges.findAt(((0.0, {_num(g.width / 2)}, 0.0),)))
+part.Set(name='FreeEnd', edges=part.edges.findAt((({length}, {_num(g.width / 2)}, 0.0),)))
+part.Surface(name='TopSurface', side1Faces=part.faces)
+'''
+    # Solids: the cross-section is sketched centred on the origin and extruded along z.
+    if g.shape == "circle":
+        profile = f"sketch.CircleByCenterPerimeter(center=(0.0, 0.0), point1=({_num(g.width / 2)}, 0.0))"
+        top = _num(g.width / 2)
+    else:
+        profile = (f"sketch.rectangle(point1=({_num(-g.width / 2)}, {_num(-g.height / 2)}), "
+                   f"point2=({_num(g.width / 2)}, {_num(g.height / 2)}))")
+        top = _num(g.height / 2)
+    return f'''
+# Geometry: {g.length:g} mm {g.shape} solid along z
+sketch = model.ConstrainedSketch(name='Geometry', sheetSize={sheet})
+{profile}
+part = model.Part(name='Part-1', dimensionality=THREE_D, type=DEFORMABLE_BODY)
+part.BaseSolidExtrude(sketch=sketch, depth={length})
+part.Set(name='All', cells=part.cells)
+part.Set(name='FixedEnd', faces=part.faces.findAt(((0.0, 0.0, 0.0),)))
+part.Set(name='FreeEnd', faces=part.faces.findAt(((0.0, 0.0, {length}),)))
+part.Surface(name='TopSurface', side1Faces=part.faces.findAt(((0.0, {top}, {_num(g.length / 2)}),)))
+'''
+
+
+@lru_cache(maxsize=1024)
+def _material(key):
+    m = Material.model_validate_json(key)
+    lines = [f"\n# Material: {m.name}",
+             f"material = model.Material(name='{m.name}')",
+             f"material.Elastic(table=(({_num(m.youngs_modulus)}, {_num(m.poisson_ratio)}),))"]
+    if m.density is not None:
+        lines.append(f"material.Density(table=(({_num(m.density)},),))")
+    if m.yield_stress is not None:
+        lines.append(f"material.Plastic(table=(({_num(m.yield_stress)}, 0.0),))")
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=1024)
+def _section(key, geometry_key, material_name):
+    s, g = Section.model_validate_json(key), Geometry.model_validate_json(geometry_key)
+    if s.kind == "rectangular_profile":
+        definition = (f"model.RectangularProfile(name='Profile', a={_num(g.width)}, b={_num(g.height)})\n"
+                      f"model.BeamSection(name='Section', integration=DURING_ANALYSIS, profile='Profile', "
+                      f"material='{material_name}')")
+    elif s.kind == "circular_profile":
+        definition = (f"model.CircularProfile(name='Profile', r={_num(g.width / 2)})\n"
+                      f"model.BeamSection(name='Section', integration=DURING_ANALYSIS, profile='Profile', "
+                      f"material='{material_name}')")
+    elif s.kind == "homogeneous_shell":
+        definition = (f"model.HomogeneousShellSection(name='Section', material='{material_name}', "
+                      f"thickness={_num(s.thickness)})")
+    else:
+        definition = f"model.HomogeneousSolidSection(name='Section', material='{material_name}', thickness=None)"
+    orientation = ("\npart.assignBeamSectionOrientation(region=part.sets['All'], method=N1_COSINES, "
+                   "n1=(0.0, 0.0, -1.0))") if g.kind == "beam" else ""
+    return (f"\n# Section: {s.kind.replace('_', ' ')}\n{definition}\n"
+            f"part.SectionAssignment(region=part.sets['All'], sectionName='Section'){orientation}\n")
+
+
+_ASSEMBLY = '''
+# Assembly
+assembly = model.rootAssembly
+assembly.DatumCsysByDefault(CARTESIAN)
+instance = assembly.Instance(name='Part-1-1', part=part, dependent=ON)
+'''
+
+
+@lru_cache(maxsize=1024)
+def _step(key, previous):
+    s = Step.model_validate_json(key)
+    nlgeom = "ON" if s.nlgeom else "OFF"
+    if s.kind == "static":
+        call = (f"model.StaticStep(name='{s.name}', previous='{previous}', timePeriod={_num(s.time_period)}, "
+                f"nlgeom={nlgeom})")
+    elif s.kind == "frequency":
+        call = f"model.FrequencyStep(name='{s.name}', previous='{previous}', numEigen={int(s.num_eigen)})"
+    else:
+        call = (f"model.ExplicitDynamicsStep(name='{s.name}', previous='{previous}', "
+                f"timePeriod={_num(s.time_period)}, nlgeom={nlgeom})")
+    return f"\n# Step: {s.name} ({s.kind.replace('_', ' ')})\n{call}\n"
+
+
+_REGION_SETS = {"fixed_end": "FixedEnd", "free_end": "FreeEnd", "all": "All"}
+_COMPONENT = {"x": 1, "y": 2, "z": 3}
+
+
+@lru_cache(maxsize=1024)
+def _boundary_condition(key):
+    bc = BoundaryCondition.model_validate_json(key)
+    region = f"instance.sets['{_REGION_SETS[bc.region]}']"
+    if bc.kind == "encastre":
+        call = f"model.EncastreBC(name='{bc.name}', createStepName='{bc.step}', region={region})"
+    elif bc.kind == "pinned":
+        call = f"model.PinnedBC(name='{bc.name}', createStepName='{bc.step}', region={region})"
+    else:
+        call = (f"model.DisplacementBC(name='{bc.name}', createStepName='{bc.step}', region={region}, "
+                f"u{_COMPONENT[bc.direction]}={_num(bc.displacement)})")
+    return f"{call}\n"
+
+
+@lru_cache(maxsize=1024)
+def _load(key):
+    load = Load.model_validate_json(key)
+    if load.kind == "pressure":
+        return (f"model.Pressure(name='{load.name}', createStepName='{load.step}', "
+                f"region=instance.surfaces['TopSurface'], magnitude={_num(load.magnitude)})\n")
+    component = f"comp{_COMPONENT[load.direction]}"
+    if load.kind == "gravity":
+        return (f"model.Gravity(name='{load.name}', createStepName='{load.step}', "
+                f"region=instance.sets['All'], {component}={_num(load.magnitude)})\n")
+    return (f"model.ConcentratedForce(name='{load.name}', createStepName='{load.step}', "
+            f"region=instance.sets['{_REGION_SETS[load.region]}'], cf{_COMPONENT[load.direction]}="
+            f"{_num(load.magnitude)})\n")
+
+
+@lru_cache(maxsize=1024)
+def _mesh(key, geometry_kind, explicit):
+    m = Mesh.model_validate_json(key)
+    regions = {"beam": "part.edges", "shell": "part.faces", "solid": "part.cells"}[geometry_kind]
+    library = "EXPLICIT" if explicit else "STANDARD"
+    controls = (f"part.setMeshControls(regions={regions}, elemShape=TET, technique=FREE)\n"
+                if m.element_type in ("C3D10", "C3D4") else "")
+    return (f"\n# Mesh: {m.element_type}, seed {m.seed_size:g} mm\n"
+            f"part.seedPart(size={_num(m.seed_size)}, deviationFactor=0.1, minSizeFactor=0.1)\n{controls}"
+            f"part.setElementType(regions=({regions},), elemTypes=(mesh.ElemType(elemCode={m.element_type}, "
+            f"elemLibrary={library}),))\n"
+            f"part.generateMesh()\n")
+
+
+@lru_cache(maxsize=1024)
+def _job(key):
+    j = JobSpec.model_validate_json(key)
+    cpus = max(1, j.cpus)
+    return f'''
+# Job
+job = mdb.Job(name='{j.name}', model='Model-1', numCpus={cpus}, numDomains={cpus})
+job.submit()
+job.waitForCompletion()
+'''
+
+
+def render(spec, request=""):
+    """Abaqus Python for ``spec``; the same spec always renders the same script."""
+    safe_request = " ".join((request or "").split())[:200]
+    geometry_key = _component_key(spec.geometry)
+    explicit = any(step.kind == "dynamic_explicit" for step in spec.steps)
+    parts = [
+        "# Abaqus script rendered from a validated model specification.\n",
+        f"# Request: {safe_request}\n" if safe_request else "",
+        "from abaqus import *\nfrom abaqusConstants import *\nimport mesh\n\n",
+        "model = mdb.Model(name='Model-1')\n",
+        _geometry(geometry_key),
+        _material(_component_key(spec.material)),
+        _section(_component_key(spec.section), geometry_key, spec.material.name),
+        _ASSEMBLY,
+    ]
+    previous = "Initial"
+    for step in spec.steps:
+        parts.append(_step(_component_key(step), previous))
+        previous = step.name
+    parts.append("\n# Boundary conditions\n")
+    parts.extend(_boundary_condition(_component_key(bc)) for bc in spec.boundary_conditions)
+    if spec.loads:
+        parts.append("\n# Loads\n")
+        parts.extend(_load(_component_key(load)) for load in spec.loads)
+    parts.append(_mesh(_component_key(spec.mesh), spec.geometry.kind, explicit))
+    parts.append(_job(_component_key(spec.job)))
+    return "".join(parts)
+
+
+def render_cache_info():
+    """Memoised fragment lookups so far, summed over the component renderers."""
+    infos = [fn.cache_info() for fn in (_geometry, _material, _section, _step, _boundary_condition, _load, _mesh,
+                                        _job)]
+    return {"hits": sum(info.hits for info in infos), "misses": sum(info.misses for info in infos)}
@@ -0,0 +1,94 @@
+"""Prompt assembly with a byte-stable prefix, so upstream prompt caching can hit.
+
+Providers cache prompts by exact prefix, so every request is laid out in a
+fixed order of tiers: static instructions, then semi-static reference text,
+then per-user context (model type, conversation summary), then the question.
+The static and reference tiers are joined once into a single leading system
+message and never contain anything request-specific; editing any of them
+means bumping its segment version, which changes the prefix fingerprint that
+the cache statistics are grouped by.
+"""
+import hashlib
+import os
+import threading
+
+STATIC, REFERENCE, USER, QUESTION = range(4)
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+
+class Segment:
+    """A named, versioned block of prompt text in one tier."""
+
+    __slots__ = ("name", "tier", "version", "text")
+
+    def __init__(self, name, tier, version, text):
+        self.name = name
+        self.tier = tier
+        self.version = version
+        self.text = text.strip()
+
+
+def reference_segment(filename="abaqus_reference.md", name="abaqus-reference"):
+    """Semi-static segment from a file under prompts/, versioned by its content hash."""
+    with open(os.path.join(PROMPTS_DIR, filename), encoding="utf-8") as file:
+        text = file.read()
+    return Segment(name, REFERENCE, hashlib.sha256(text.encode()).hexdigest()[:8], text)
+
+
+class PromptBuilder:
+    """Lays out static/reference segments as a fixed prefix ahead of per-request content."""
+
+    def __init__(self, *segments):
+        fixed = [segment for segment in segments if segment.tier in (STATIC, REFERENCE)]
+        if len(fixed) != len(segments):
+            raise ValueError("Only static and reference segments can be part of the prefix.")
+        self.segments = sorted(fixed, key=lambda segment: segment.tier)  # stable within a tier
+        self.prefix = "\n\n".join(segment.text for segment in self.segments)
+        self.version = "+".join(f"{segment.name}@{segment.version}" for segment in self.segments)
+        self.fingerprint = hashlib.sha256(self.prefix.encode()).hexdigest()[:12]
+
+    def system_messages(self, user_context=None):
+        """Prefix message, then one message with the per-user context lines (if any)."""
+        messages = [{"role": "system", "content": self.prefix}]
+        lines = [f"{key}: {value}" for key, value in (user_context or {}).items() if value]
+        if lines:
+            messages.append({"role": "system", "content": "User context\n" + "\n".join(lines)})
+        return messages
+
+    def messages(self, question, user_context=None, history=()):
+        """Full message list: prefix, per-user context, history, question."""
+        return self.system_messages(user_context) + list(history) + [{"role": "user", "content": question}]
+
+
+class PrefixCacheStats:
+    """Per-prefix counts of prompt tokens and of those the provider served from its cache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.prefixes = {}
+
+    def record(self, builder, usage):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) if details is not None else 0) or 0
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        with self.lock:
+            entry = self.prefixes.setdefault(builder.fingerprint, {
+                "version": builder.version, "requests": 0, "hits": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            })
+            entry["requests"] += 1
+            entry["hits"] += cached > 0
+            entry["prompt_tokens"] += prompt
+            entry["cached_tokens"] += cached
+
+    def report(self):
+        with self.lock:
+            prefixes = {fingerprint: dict(entry) for fingerprint, entry in self.prefixes.items()}
+        for entry in prefixes.values():
+            entry["hit_rate"] = round(entry["hits"] / entry["requests"], 4) if entry["requests"] else 0.0
+            entry["cached_token_ratio"] = (
+                round(entry["cached_tokens"] / entry["prompt_tokens"], 4) if entry["prompt_tokens"] else 0.0
+            )
+        return prefixes
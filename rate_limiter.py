@@ -0,0 +1,168 @@
+"""Per-user and per-IP token-bucket rate limits shared by all workers.
+
+Buckets live in one SQLite table. Taking from a bucket is a single UPSERT
+that refills it for the time elapsed, subtracts the cost only if enough is
+left, and returns the new level (``RETURNING``); every bucket a request
+touches (requests and estimated LLM tokens, per user and per IP) is taken
+in one ``BEGIN IMMEDIATE`` transaction, so a request is either charged
+everywhere or nowhere. With WAL and ``synchronous=NORMAL`` that costs tens
+of microseconds. If the database is unavailable, requests are let through.
+"""
+import re
+import sqlite3
+import time
+
+from flask import g, jsonify, request
+
+import shared_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    key TEXT PRIMARY KEY,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+_TAKE = """
+INSERT INTO rate_buckets (key, level, updated) VALUES (:key, :capacity - :cost, :now)
+ON CONFLICT(key) DO UPDATE SET
+    level = MIN(:capacity, level + (:now - updated) * :rate) - :cost,
+    updated = :now
+WHERE MIN(:capacity, level + (:now - updated) * :rate) >= :cost
+RETURNING level
+"""
+
+_UNITS = {"s": 1, "sec": 1, "second": 1, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "day": 86400}
+_RATE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(\d*)\s*([a-z]+)\s*$")
+
+
+class Limit:
+    """Bucket of ``capacity`` units refilled at ``capacity`` per ``period`` seconds."""
+
+    __slots__ = ("capacity", "rate")
+
+    def __init__(self, capacity, period):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+
+    def scaled(self, factor):
+        """The same refill period with ``factor`` times the capacity."""
+        return Limit(self.capacity * factor, self.capacity / self.rate)
+
+    @classmethod
+    def parse(cls, text):
+        """Limit from e.g. ``"10/min"``, ``"50000/hour"`` or ``"5/30s"``; None for empty/"off"."""
+        if not text or text.strip().lower() in ("off", "none", "0"):
+            return None
+        match = _RATE.match(text.lower())
+        if match is None or match.group(3) not in _UNITS:
+            raise ValueError(f"Invalid rate limit '{text}' (use e.g. 10/min)")
+        return cls(float(match.group(1)), int(match.group(2) or 1) * _UNITS[match.group(3)])
+
+
+class Rule:
+    """Limits for one endpoint; ``cost(request)`` estimates the LLM tokens a request will use."""
+
+    def __init__(self, requests=None, tokens=None, cost=None, ip_multiplier=3.0):
+        self.requests = Limit.parse(requests) if isinstance(requests, str) else requests
+        self.tokens = Limit.parse(tokens) if isinstance(tokens, str) else tokens
+        self.cost = cost
+        self.ip_multiplier = ip_multiplier
+
+
+class RateLimited(Exception):
+    """Raised by ``RateLimiter.take`` when a bucket cannot cover the cost."""
+
+    def __init__(self, bucket, retry_after):
+        super().__init__(f"rate limit exceeded for {bucket}")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+    @property
+    def budget(self):
+        """``"requests/user"``, ``"tokens/ip"``, ... from a ``endpoint|kind|who:identity`` key."""
+        _, kind, who = self.bucket.split("|", 2)
+        return f"{kind}/{who.partition(':')[0]}"
+
+
+class RateLimiter:
+    def __init__(self, path, rules, trust_proxy=False, registry=None):
+        self.path = path
+        self.rules = rules
+        self.trust_proxy = trust_proxy
+        self.registry = registry
+        self.checks = 0
+        shared_db.connect(path).executescript(_SCHEMA)
+        if registry is not None:
+            registry.counter("rate_limited_total", "Requests refused with 429, by endpoint and budget.")
+
+    def take(self, charges, now=None):
+        """Charge every (key, Limit, cost) or none of them; raises RateLimited naming the first short bucket."""
+        now = time.time() if now is None else now
+        db = shared_db.connect(self.path)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for key, limit, cost in charges:
+                cost = min(cost, limit.capacity)
+                row = db.execute(_TAKE, {"key": key, "capacity": limit.capacity, "rate": limit.rate,
+                                         "cost": cost, "now": now}).fetchone()
+                if row is None:
+                    level, updated = db.execute("SELECT level, updated FROM rate_buckets WHERE key = ?",
+                                                (key,)).fetchone()
+                    available = min(limit.capacity, level + (now - updated) * limit.rate)
+                    db.execute("ROLLBACK")
+                    raise RateLimited(key, max(1, int((cost - available) / limit.rate + 0.999)))
+            db.execute("COMMIT")
+        except RateLimited:
+            raise
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        self.checks += 1
+        if self.checks % 10000 == 0:
+            # Buckets idle for a day are full again; dropping them changes nothing.
+            db.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - 86400,))
+
+    def charges(self, endpoint, rule, user_id, ip, tokens):
+        charges = []
+        for who, identity, scale in (("user", user_id, 1.0), ("ip", ip, rule.ip_multiplier)):
+            if identity is None:
+                continue
+            for kind, limit, cost in (("requests", rule.requests, 1), ("tokens", rule.tokens, tokens)):
+                if limit is not None and cost:
+                    charges.append((f"{endpoint}|{kind}|{who}:{identity}", limit.scaled(scale), cost))
+        return charges
+
+    # ✅ Flask integration
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.errorhandler(RateLimited)(self._limited)
+
+    def client_ip(self):
+        if self.trust_proxy and request.access_route:
+            return request.access_route[0]
+        return request.remote_addr or "unknown"
+
+    def _before(self):
+        endpoint = request.url_rule.rule if request.url_rule else None
+        rule = self.rules.get(endpoint)
+        if rule is None:
+            return
+        payload = request.get_json(silent=True)
+        user_id = payload.get("user_id") if isinstance(payload, dict) else None
+        tokens = rule.cost(request) if rule.cost is not None else 0
+        g.rate_limit_endpoint = endpoint
+        try:
+            self.take(self.charges(endpoint, rule, user_id, self.client_ip(), tokens))
+        except sqlite3.OperationalError:
+            pass  # fail open: a busy or broken limiter store must not take the API down
+
+    def _limited(self, error):
+        if self.registry is not None:
+            self.registry.inc("rate_limited_total", endpoint=g.get("rate_limit_endpoint", ""), budget=error.budget)
+        response = jsonify({"error": "⚠️ Too many requests. Please slow down.", "retry_after": error.retry_after})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(error.retry_after)
+        return response
@@ -0,0 +1,172 @@
+"""Replay recorded traffic (traffic_recorder.py) against a running server and report latency.
+
+Requests are sent with aiohttp at their recorded arrival offsets divided by
+``--speed`` (2 = twice the recorded rate); requests from one user stay in
+order so chat sessions walk the same steps. The report gives, per endpoint,
+HDR-style latency percentiles (1% relative precision), throughput, error
+rate and the share of ``X-Cache: HIT`` responses. With ``--baseline`` the
+run fails (exit status 1) when any endpoint's p95 exceeds the stored
+baseline by more than ``--tolerance``; ``--save-baseline`` writes one.
+
+    python replay.py instance/traffic/requests.jsonl --base-url http://127.0.0.1:10000 --speed 4
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+
+import aiohttp
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram: constant relative error at any magnitude, constant memory."""
+
+    def __init__(self, precision=0.01):
+        self.base = math.log1p(precision)
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, milliseconds):
+        value = max(milliseconds, 1e-3)
+        self.counts[math.floor(math.log(value) / self.base)] += 1
+        self.total += 1
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, percent):
+        if not self.total:
+            return 0.0
+        rank = math.ceil(self.total * percent / 100.0)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(math.exp((bucket + 1) * self.base), self.max)  # bucket upper bound
+        return self.max
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_known = 0
+
+    def report(self, duration):
+        report = {
+            "requests": self.requests,
+            "throughput_rps": round(self.requests / duration, 3) if duration > 0 else 0.0,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "cache_hit_ratio": round(self.cache_hits / self.cache_known, 4) if self.cache_known else None,
+            "max_ms": round(self.latency.max, 2),
+        }
+        for percent in PERCENTILES:
+            report[f"p{percent:g}_ms"] = round(self.latency.percentile(percent), 2)
+        return report
+
+
+def load_records(path, limit=None):
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                records.append(json.loads(line))
+                if limit and len(records) >= limit:
+                    break
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+async def replay(records, base_url, speed=1.0, timeout=120.0, concurrency=256):
+    stats = defaultdict(EndpointStats)
+    user_locks = defaultdict(asyncio.Lock)
+    limit = asyncio.Semaphore(concurrency)
+    first = records[0]["ts"] if records else 0.0
+    start = time.monotonic()
+
+    async def send(session, record):
+        await asyncio.sleep(max(0.0, start + (record["ts"] - first) / speed - time.monotonic()))
+        user = record["json"].get("user_id") if isinstance(record.get("json"), dict) else None
+        lock = user_locks[user] if user is not None else None
+        endpoint = stats[f"{record['method']} {record['path']}"]
+        if lock is not None:
+            await lock.acquire()
+        try:
+            async with limit:
+                began = time.monotonic()
+                try:
+                    async with session.request(record["method"], base_url.rstrip("/") + record["path"],
+                                               json=record.get("json")) as response:
+                        await response.read()
+                        failed = response.status >= 400
+                        cache = response.headers.get("X-Cache")
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    failed, cache = True, None
+                endpoint.latency.record((time.monotonic() - began) * 1000)
+            endpoint.requests += 1
+            endpoint.errors += failed
+            if cache is not None:
+                endpoint.cache_known += 1
+                endpoint.cache_hits += cache.upper() == "HIT"
+        finally:
+            if lock is not None:
+                lock.release()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        await asyncio.gather(*(send(session, record) for record in records))
+    duration = time.monotonic() - start
+    return {endpoint: value.report(duration) for endpoint, value in sorted(stats.items())}, duration
+
+
+def regressions(report, baseline, tolerance):
+    """[(endpoint, p95, allowed)] for endpoints whose p95 exceeds the baseline by more than ``tolerance``."""
+    failures = []
+    for endpoint, values in report.items():
+        stored = baseline.get(endpoint, {}).get("p95_ms")
+        if stored is not None and values["p95_ms"] > stored * (1 + tolerance):
+            failures.append((endpoint, values["p95_ms"], round(stored * (1 + tolerance), 2)))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded API traffic and report latency percentiles.")
+    parser.add_argument("records", help="JSONL written by the traffic recorder")
+    parser.add_argument("--base-url", default="http://127.0.0.1:10000")
+    parser.add_argument("--speed", type=float, default=1.0, help="arrival-rate multiplier (2 = twice as fast)")
+    parser.add_argument("--limit", type=int, help="replay only the first N records")
+    parser.add_argument("--concurrency", type=int, default=256, help="cap on requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--baseline", help="baseline JSON to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95 increase over the baseline")
+    parser.add_argument("--save-baseline", help="write this run's report as a baseline")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.records, args.limit)
+    if not records:
+        print("⚠️ No records to replay.")
+        return 1
+    report, duration = asyncio.run(replay(records, args.base_url, args.speed, args.timeout, args.concurrency))
+    print(json.dumps({"duration_s": round(duration, 3), "endpoints": report}, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            failures = regressions(report, json.load(file), args.tolerance)
+        for endpoint, p95, allowed in failures:
+            print(f"❌ {endpoint}: p95 {p95} ms exceeds baseline allowance {allowed} ms")
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+"""Incremental parsing of Abaqus text outputs into a memory-mappable columnar store.
+
+Every analysis (one .sta/.msg/.dat stem in a job directory) gets a store
+directory. Tables are folders of raw little-endian column files that are only
+ever appended to, so a running job can be re-ingested cheaply: each source
+file remembers the byte offset it was read up to and the parser state at that
+point, saved together with each table's row count so a crash mid-append is
+rolled back on the next ingest. Queries open columns with ``np.memmap`` and use binary search on the
+(sorted) frame column, so slicing one frame of a multi-GB table only touches
+the pages it needs.
+
+Tables:
+    increments            .sta rows of an implicit (Standard) analysis
+    explicit_increments   .sta rows of an explicit analysis
+    iterations            .msg equilibrium iterations with residual/correction
+    frames                .dat output frames (step, increment, times)
+    field/<VAR>           .dat tabulated node/element output, one table per variable
+"""
+import glob
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+FLUSH_ROWS = 200000
+
+TABLE_COLUMNS = {
+    "increments": {
+        "step": "<i4", "increment": "<i4", "attempts": "<i4", "cutback": "<i1", "severe": "<i4",
+        "equilibrium": "<i4", "total_iterations": "<i4", "total_time": "<f8", "step_time": "<f8",
+        "time_increment": "<f8",
+    },
+    "explicit_increments": {
+        "step": "<i4", "increment": "<i8", "step_time": "<f8", "total_time": "<f8", "cpu_seconds": "<f8",
+        "stable_increment": "<f8", "kinetic_energy": "<f8", "total_energy": "<f8",
+    },
+    "iterations": {
+        "step": "<i4", "increment": "<i4", "attempt": "<i4", "iteration": "<i4",
+        "residual_force": "<f8", "displacement_correction": "<f8",
+    },
+    "frames": {"frame": "<i4", "step": "<i4", "increment": "<i4", "step_time": "<f8", "total_time": "<f8"},
+}
+FIELD_COLUMNS = {"frame": "<i4", "id": "<i8", "point": "<i4", "value": "<f8"}
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[EeDd][-+]?\d+)?"
+_STA_IMPLICIT = re.compile(
+    rf"^\s*(\d+)\s+(\d+)\s+(\d+)(U?)\s+(\d+)\s+(\d+)\s+(\d+)\s+({_NUMBER})\s+({_NUMBER})\s+({_NUMBER})"
+)
+_STA_EXPLICIT = re.compile(
+    rf"^\s*(\d+)\s+({_NUMBER})\s+({_NUMBER})\s+(\d+):(\d+):(\d+)\s+({_NUMBER})\s+\S+\s+({_NUMBER})\s+({_NUMBER})"
+)
+_STA_EXPLICIT_STEP = re.compile(r"^\s*STEP\s+(\d+)\s+ORIGIN")
+_MSG_STEP = re.compile(r"S T E P\s+(\d+)")
+_MSG_INCREMENT = re.compile(r"INCREMENT\s+(\d+)\s+STARTS\.\s+ATTEMPT NUMBER\s+(\d+)")
+_MSG_ITERATION = re.compile(r"CONVERGENCE CHECKS FOR (?:SEVERE DISCONTINUITY |EQUILIBRIUM )?ITERATION\s+(\d+)")
+_MSG_RESIDUAL = re.compile(rf"LARGEST RESIDUAL FORCE\s+({_NUMBER})")
+_MSG_CORRECTION = re.compile(rf"LARGEST CORRECTION TO DISP\.\s+({_NUMBER})")
+_DAT_STEP = re.compile(r"S T E P\s+(\d+)")
+_DAT_INCREMENT = re.compile(r"INCREMENT\s+(\d+)\s+SUMMARY")
+_DAT_TIMES = re.compile(rf"STEP TIME COMPLETED\s+({_NUMBER})\s*,\s*TOTAL TIME COMPLETED\s+({_NUMBER})")
+_DAT_TABLE_END = ("MAXIMUM", "MINIMUM", "AT NODE", "AT ELEMENT", "ALL VALUES", "TOTAL", "THE ")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _float(text):
+    return float(text.replace("D", "E").replace("d", "e"))
+
+
+# ✅ Columnar tables: append-only raw column files + dtypes in a small JSON file
+class Table:
+    """One append-only table; columns are raw files readable with np.memmap."""
+
+    def __init__(self, directory, columns=None, rows=None):
+        self.directory = directory
+        self.rows = rows
+        meta_path = os.path.join(directory, "columns.json")
+        if columns is None:
+            with open(meta_path) as file:
+                columns = json.load(file)
+        elif not os.path.exists(meta_path):
+            os.makedirs(directory, exist_ok=True)
+            with open(meta_path, "w") as file:
+                json.dump(columns, file)
+        self.columns = columns
+
+    def append(self, rows):
+        """Append a dict of equally long column lists."""
+        for name, dtype in self.columns.items():
+            with open(os.path.join(self.directory, f"{name}.bin"), "ab") as file:
+                np.asarray(rows[name], dtype=dtype).tofile(file)
+
+    def truncate(self, rows):
+        """Cut every column back to ``rows`` rows, dropping appends a crash left uncommitted."""
+        for name, dtype in self.columns.items():
+            path = os.path.join(self.directory, f"{name}.bin")
+            if os.path.exists(path) and os.path.getsize(path) > rows * np.dtype(dtype).itemsize:
+                os.truncate(path, rows * np.dtype(dtype).itemsize)
+
+    def __len__(self):
+        counts = [] if self.rows is None else [self.rows]
+        for name, dtype in self.columns.items():
+            path = os.path.join(self.directory, f"{name}.bin")
+            counts.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+        return min(counts) if counts else 0
+
+    def column(self, name):
+        """A read-only memory map of one column (trimmed to complete rows)."""
+        rows = len(self)
+        if rows == 0:
+            return np.empty(0, dtype=self.columns[name])
+        return np.memmap(os.path.join(self.directory, f"{name}.bin"), dtype=self.columns[name], mode="r", shape=(rows,))
+
+    def read(self, columns=None, start=0, stop=None):
+        return {name: self.column(name)[start:stop] for name in (columns or self.columns)}
+
+
+# ✅ Line parsers: each keeps its position as JSON-serialisable state
+class _Collector:
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, table, columns, values):
+        buffer = self.rows.setdefault(table, {"columns": columns, "data": {name: [] for name in columns}})
+        for name, value in zip(columns, values):
+            buffer["data"][name].append(value)
+
+    def pending(self):
+        return sum(len(next(iter(buffer["data"].values()), [])) for buffer in self.rows.values())
+
+
+class StaParser:
+    def __init__(self, state=None):
+        self.state = state or {"step": 1}
+
+    def feed(self, line, out):
+        match = _STA_IMPLICIT.match(line)
+        if match:
+            g = match.groups()
+            out.add("increments", TABLE_COLUMNS["increments"], (
+                int(g[0]), int(g[1]), int(g[2]), int(g[3] == "U"), int(g[4]), int(g[5]), int(g[6]),
+                _float(g[7]), _float(g[8]), _float(g[9]),
+            ))
+            return
+        match = _STA_EXPLICIT_STEP.match(line)
+        if match:
+            self.state["step"] = int(match.group(1))
+            return
+        match = _STA_EXPLICIT.match(line)
+        if match:
+            g = match.groups()
+            out.add("explicit_increments", TABLE_COLUMNS["explicit_increments"], (
+                self.state["step"], int(g[0]), _float(g[1]), _float(g[2]),
+                int(g[3]) * 3600 + int(g[4]) * 60 + int(g[5]), _float(g[6]), _float(g[7]), _float(g[8]),
+            ))
+
+
+class MsgParser:
+    def __init__(self, state=None):
+        self.state = state or {"step": 0, "increment": 0, "attempt": 0, "iteration": None, "residual": None}
+
+    def feed(self, line, out):
+        state = self.state
+        match = _MSG_STEP.search(line)
+        if match:
+            state["step"] = int(match.group(1))
+            return
+        match = _MSG_INCREMENT.search(line)
+        if match:
+            state["increment"], state["attempt"] = int(match.group(1)), int(match.group(2))
+            return
+        match = _MSG_ITERATION.search(line)
+        if match:
+            state["iteration"], state["residual"] = int(match.group(1)), None
+            return
+        match = _MSG_RESIDUAL.search(line)
+        if match:
+            state["residual"] = _float(match.group(1))
+            return
+        match = _MSG_CORRECTION.search(line)
+        if match and state["iteration"] is not None:
+            out.add("iterations", TABLE_COLUMNS["iterations"], (
+                state["step"], state["increment"], state["attempt"], state["iteration"],
+                state["residual"] if state["residual"] is not None else np.nan, _float(match.group(1)),
+            ))
+            state["iteration"] = None
+
+
+class DatParser:
+    def __init__(self, state=None):
+        self.state = state or {
+            "step": 0, "increment": 0, "frame": -1, "frame_written": True,
+            "times": [np.nan, np.nan], "keys": None, "names": None, "rows_seen": False,
+        }
+
+    def _frame(self, out):
+        state = self.state
+        if not state["frame_written"]:
+            out.add("frames", TABLE_COLUMNS["frames"],
+                    (state["frame"], state["step"], state["increment"], *state["times"]))
+            state["frame_written"] = True
+        return state["frame"]
+
+    def feed(self, line, out):
+        state = self.state
+        stripped = line.strip()
+        if state["names"] is not None:
+            if self._table_row(stripped, out):
+                return
+            if stripped == "NOTE" or (not stripped and not state["rows_seen"]):
+                return
+            state["keys"] = state["names"] = None
+
+        match = _DAT_INCREMENT.search(line)
+        if match:
+            state["increment"] = int(match.group(1))
+            state["frame"] += 1
+            state["frame_written"] = False
+            state["times"] = [np.nan, np.nan]
+            return
+        match = _DAT_STEP.search(line)
+        if match:
+            state["step"] = int(match.group(1))
+            return
+        match = _DAT_TIMES.search(line)
+        if match:
+            state["times"] = [_float(match.group(1)), _float(match.group(2))]
+            return
+        tokens = stripped.split()
+        if tokens and tokens[0] in ("NODE", "ELEMENT") and "FOOT-" in tokens:
+            split = tokens.index("FOOT-")
+            state["keys"], state["names"] = tokens[:split], tokens[split + 1:]
+            state["rows_seen"] = False
+
+    def _table_row(self, stripped, out):
+        state = self.state
+        if not stripped or stripped.startswith(_DAT_TABLE_END):
+            return False
+        tokens = stripped.split()
+        keys = len(state["keys"])
+        if len(tokens) < keys + 1 or not all(token.isdigit() for token in tokens[:keys]):
+            return False
+        try:
+            values = [_float(token) for token in tokens[keys:]]
+        except ValueError:
+            return False
+        frame = self._frame(out)
+        entity = int(tokens[0])
+        point = int(tokens[1]) if keys > 1 else 0
+        for name, value in zip(state["names"], values):
+            out.add(f"field/{_safe_name(name)}", FIELD_COLUMNS, (frame, entity, point, value))
+        state["rows_seen"] = True
+        return True
+
+
+PARSERS = {".sta": StaParser, ".msg": MsgParser, ".dat": DatParser}
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+# ✅ Store: one per analysis, ingesting whatever the solver has appended since last time
+class ResultStore:
+    """Columnar results of one analysis (one output file stem)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+
+    def _manifest(self):
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {"sources": {}, "tables": {}, "rows": {}}
+
+    def _save_manifest(self, manifest):
+        tmp = f"{self.manifest_path}.tmp{os.getpid()}"
+        with open(tmp, "w") as file:
+            json.dump(manifest, file)
+        os.replace(tmp, self.manifest_path)
+
+    def ingest(self, paths):
+        """Parse the new bytes of each output file; returns the number of rows added."""
+        os.makedirs(self.directory, exist_ok=True)
+        with _store_lock(self.directory):
+            manifest = self._manifest()
+            added = 0
+            for path in paths:
+                added += self._ingest_file(manifest, path)
+            return added
+
+    def _ingest_file(self, manifest, path):
+        extension = os.path.splitext(path)[1].lower()
+        source = manifest["sources"].get(extension, {"offset": 0, "state": None})
+        if not os.path.exists(path) or os.path.getsize(path) <= source["offset"]:
+            return 0
+
+        parser = PARSERS[extension](source["state"])
+        out = _Collector()
+        added = 0
+        offset = source["offset"]
+        with open(path, "rb") as file:
+            file.seek(offset)
+            for raw in file:
+                if not raw.endswith(b"\n"):
+                    break  # partial line still being written by the solver
+                offset += len(raw)
+                parser.feed(raw.decode("latin-1").rstrip("\r\n"), out)
+                if out.pending() >= FLUSH_ROWS:
+                    added += self._flush(manifest, out)
+                    manifest["sources"][extension] = {"offset": offset, "state": parser.state}
+                    self._save_manifest(manifest)
+                    out = _Collector()
+        added += self._flush(manifest, out)
+        manifest["sources"][extension] = {"offset": offset, "state": parser.state}
+        self._save_manifest(manifest)
+        return added
+
+    # Row counts are committed with the source offsets in one manifest write; anything a crash
+    # appended past them is cut off before the next append so rows are never duplicated.
+    def _flush(self, manifest, out):
+        added = 0
+        counts = manifest.setdefault("rows", {})
+        for name, buffer in out.rows.items():
+            table = Table(os.path.join(self.directory, name), buffer["columns"])
+            if name not in counts:
+                counts[name] = len(table) if name in manifest["tables"] else 0
+            table.truncate(counts[name])
+            table.append(buffer["data"])
+            rows = len(next(iter(buffer["data"].values())))
+            manifest["tables"][name] = buffer["columns"]
+            counts[name] += rows
+            added += rows
+        return added
+
+    def tables(self):
+        return sorted(self._manifest()["tables"])
+
+    def table(self, name):
+        manifest = self._manifest()
+        columns = manifest["tables"].get(name)
+        if columns is None:
+            raise KeyError(name)
+        return Table(os.path.join(self.directory, name), columns, manifest.get("rows", {}).get(name))
+
+    def fields(self):
+        return [name.split("/", 1)[1] for name in self.tables() if name.startswith("field/")]
+
+    def frames(self, step=None):
+        """Frame table, optionally restricted to one step."""
+        try:
+            frames = self.table("frames").read()
+        except KeyError:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in TABLE_COLUMNS["frames"].items()}
+        if step is not None:
+            mask = np.asarray(frames["step"]) == step
+            frames = {name: np.asarray(values)[mask] for name, values in frames.items()}
+        return frames
+
+    def frame_rows(self, table, first_frame, last_frame):
+        """Row range [start, stop) of ``table`` covering frames first..last (binary search)."""
+        frame = table.column("frame")
+        start = int(np.searchsorted(frame, first_frame, side="left"))
+        stop = int(np.searchsorted(frame, last_frame, side="right"))
+        return start, stop
+
+    def field(self, name, step=None, frame=None, ids=None):
+        """Rows of one field variable, sliced to a frame or step without scanning the table."""
+        table = self.table(f"field/{_safe_name(name)}")
+        start, stop = 0, len(table)
+        if frame is not None:
+            start, stop = self.frame_rows(table, frame, frame)
+        elif step is not None:
+            frames = self.frames(step)["frame"]
+            if not len(frames):
+                return {column: np.empty(0, dtype=dtype) for column, dtype in FIELD_COLUMNS.items()}
+            start, stop = self.frame_rows(table, int(frames.min()), int(frames.max()))
+        rows = table.read(start=start, stop=stop)
+        if ids is not None:
+            mask = np.isin(rows["id"], ids)
+            rows = {column: values[mask] for column, values in rows.items()}
+        return rows
+
+    def history(self, name, entity, point=None):
+        """One node/element value across all frames, gathered frame by frame via binary search."""
+        table = self.table(f"field/{_safe_name(name)}")
+        frame_column, ids, points, values = (table.column(column) for column in FIELD_COLUMNS)
+        frames = self.frames()
+        starts = np.searchsorted(frame_column, frames["frame"], side="left")
+        stops = np.searchsorted(frame_column, frames["frame"], side="right")
+
+        def matches(rows):
+            hit = np.asarray(ids[rows]) == entity
+            return hit if point is None else hit & (np.asarray(points[rows]) == point)
+
+        # Frames usually list entities in the same order: guess one offset, verify, then search misses.
+        rows = np.full(len(starts), -1, dtype=np.int64)
+        nonempty = np.flatnonzero(stops > starts)
+        if len(nonempty):
+            first = nonempty[0]
+            offsets = np.flatnonzero(matches(np.arange(starts[first], stops[first])))
+            if len(offsets):
+                guess = starts + offsets[0]
+                valid = guess < stops
+                hit = np.zeros(len(guess), dtype=bool)
+                hit[valid] = matches(guess[valid])
+                rows[hit] = guess[hit]
+            for index in np.flatnonzero((rows < 0) & (stops > starts)):
+                found = np.flatnonzero(matches(np.arange(starts[index], stops[index])))
+                if len(found):
+                    rows[index] = starts[index] + found[0]
+        keep = rows >= 0
+        history = {column: np.asarray(frames[column])[keep] for column in frames}
+        history["value"] = np.asarray(values[rows[keep]])
+        return history
+
+    def summary(self):
+        tables = {}
+        for name in self.tables():
+            tables[name] = len(self.table(name))
+        return {"tables": tables, "fields": self.fields(), "frames": tables.get("frames", 0)}
+
+
+class _store_lock:
+    """Serialises ingests of one store across threads and, where possible, processes."""
+
+    def __init__(self, directory):
+        with _locks_guard:
+            self.lock = _locks.setdefault(directory, threading.Lock())
+        self.path = os.path.join(directory, ".lock")
+        self.file = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            self.file = open(self.path, "a")
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+        self.lock.release()
+
+
+# ✅ Job-level helpers: one store per output stem found in a job directory
+def analyses(work_dir):
+    """Stems of the solver output files present in a job directory."""
+    stems = set()
+    for extension in PARSERS:
+        for path in glob.glob(os.path.join(work_dir, f"*{extension}")):
+            stems.add(os.path.splitext(os.path.basename(path))[0])
+    return sorted(stems)
+
+
+def open_store(work_dir, analysis):
+    return ResultStore(os.path.join(work_dir, "results", _safe_name(analysis)))
+
+
+def ingest_job(work_dir):
+    """Bring the stores of every analysis in a job directory up to date."""
+    added = {}
+    for analysis in analyses(work_dir):
+        paths = [os.path.join(work_dir, analysis + extension) for extension in PARSERS]
+        added[analysis] = open_store(work_dir, analysis).ingest(paths)
+    return added
@@ -0,0 +1,279 @@
+"""Abaqus script generation: request bodies, code extraction/validation and bulk runs.
+
+Single scripts go through :func:`request_body` and :func:`extract_code` like
+the ``/generate_script`` endpoint. :class:`BulkRun` generates many at once,
+preferably through the OpenAI Batch API (one JSONL upload, results collected
+when the batch ends) or otherwise through a bounded thread pool. Every
+finished item is appended to ``manifest.jsonl`` in the output directory and
+an in-flight batch id is kept in ``batch.json``, so an interrupted run picks
+up where it stopped: completed items are skipped and a submitted batch is
+polled again rather than resubmitted. Scripts are stored content-addressed
+under ``scripts/<sha256[:2]>/<sha256>.py``.
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+log = logging.getLogger(__name__)
+
+MAX_TOKENS = 500
+TEMPERATURE = 0.3
+BATCH_LIMIT = 50000  # requests per batch accepted by the API
+BATCH_DONE = ("completed", "failed", "expired", "cancelled")
+
+_FENCE = re.compile(r"```[ \t]*(?:python|py)?[ \t]*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+_ABAQUS_MARKERS = ("from abaqus", "import abaqus", "from abaqusConstants", "mdb.", "from odbAccess", "from caeModules")
+
+
+def user_prompt(description):
+    return f"Generate a complete Abaqus Python script for: {description}"
+
+
+def request_body(builder, description, model):
+    """Chat-completions request body for one script description."""
+    return {
+        "model": model,
+        "messages": builder.messages(user_prompt(description)),
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+    }
+
+
+def extract_code(text):
+    """The script inside a model answer: the longest fenced block, or the whole text."""
+    blocks = _FENCE.findall(text or "")
+    code = max(blocks, key=len) if blocks else (text or "")
+    return code.strip() + "\n"
+
+
+def validate(code):
+    """Problems that make ``code`` unusable as an Abaqus script (empty list if none)."""
+    problems = []
+    try:
+        compile(code, "<generated script>", "exec")
+    except SyntaxError as e:
+        problems.append(f"syntax error on line {e.lineno}: {e.msg}")
+    if not any(marker in code for marker in _ABAQUS_MARKERS):
+        problems.append("does not use the Abaqus scripting interface")
+    return problems
+
+
+def read_descriptions(path, column="description"):
+    """[(id or None, description)] from a JSONL (objects or strings) or CSV file."""
+    items = []
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(file)
+            if column not in (reader.fieldnames or []):
+                raise ValueError(f"{path}:1: expected a '{column}' field")
+            blank = []
+            for row in reader:
+                if (row.get(column) or "").strip():
+                    items.append((row.get("id") or None, row[column].strip()))
+                else:
+                    blank.append(reader.line_num)
+            if blank:
+                lines = ", ".join(map(str, blank[:20])) + (", ..." if len(blank) > 20 else "")
+                log.warning("⚠️ %s: skipped %d row(s) with an empty '%s' field (lines %s)", path, len(blank), column, lines)
+        else:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record = {column: record}
+                if not isinstance(record, dict) or not str(record.get(column) or "").strip():
+                    raise ValueError(f"{path}:{number}: expected a '{column}' field")
+                items.append((record.get("id"), str(record[column]).strip()))
+    return items
+
+
+class BulkRun:
+    """Resumable bulk generation into ``out_dir``."""
+
+    def __init__(self, client, builder, model, out_dir):
+        self.client = client
+        self.builder = builder
+        self.model = model
+        self.out_dir = out_dir
+        self.manifest_path = os.path.join(out_dir, "manifest.jsonl")
+        self.batch_path = os.path.join(out_dir, "batch.json")
+        self.lock = threading.Lock()
+        self.done = {}
+        self.finished = set()
+        os.makedirs(os.path.join(out_dir, "scripts"), exist_ok=True)
+
+    def key(self, description):
+        """Item identity: same description, model and prompt prefix means the same output."""
+        return hashlib.sha256(f"{self.model}\0{self.builder.fingerprint}\0{description}".encode()).hexdigest()[:20]
+
+    def completed(self):
+        done = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interruption
+                    done[entry["key"]] = entry
+        return done
+
+    def run(self, items, mode="auto", concurrency=8, poll_interval=30.0):
+        """Generate every item not already in the manifest; returns {"ok", "invalid", "failed", "skipped"}."""
+        import openai  # bulk runs only; kept off the web app's import path
+        from tqdm import tqdm
+
+        self.done = self.completed()
+        self.finished = set()
+        pending = {}
+        for item_id, description in items:
+            key = self.key(description)
+            if key not in self.done:
+                pending.setdefault(key, (item_id, description))
+        counts = {"ok": 0, "invalid": 0, "failed": 0, "skipped": len(items) - len(pending)}
+
+        with tqdm(total=len(pending), unit="script", desc="Generating") as progress:
+            if pending and mode in ("auto", "batch"):
+                try:
+                    self._run_batches(pending, counts, progress, poll_interval)
+                except (openai.NotFoundError, openai.PermissionDeniedError, openai.BadRequestError):
+                    if mode == "batch":
+                        raise
+                    progress.write("⚠️ Batch API unavailable, falling back to concurrent requests.")
+            remaining = {key: item for key, item in pending.items() if key not in self.finished}
+            if remaining:
+                self._run_pool(remaining, counts, progress, concurrency)
+        return counts
+
+    # ✅ Batch API: upload once, poll, then collect the output file
+    def _run_batches(self, pending, counts, progress, poll_interval):
+        state = self._load_batch()
+        while True:
+            if state is None:
+                keys = [key for key in pending if key not in self.finished][:BATCH_LIMIT]
+                if not keys:
+                    return
+                state = self._submit_batch(keys, pending)
+            batch = self._poll(state["batch_id"], progress, poll_interval)
+            for key, text, error in self._batch_results(batch):
+                if key in pending:
+                    self._finish(key, pending[key], text, error, counts, progress)
+            for key in state["keys"]:
+                if key in pending and key not in self.finished:
+                    self._finish(key, pending[key], None, f"batch {batch.status}", counts, progress)
+            os.remove(self.batch_path)
+            state = None
+
+    def _submit_batch(self, keys, pending):
+        lines = [
+            json.dumps({"custom_id": key, "method": "POST", "url": "/v1/chat/completions",
+                        "body": request_body(self.builder, pending[key][1], self.model)})
+            for key in keys
+        ]
+        upload = self.client.files.create(file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch")
+        batch = self.client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions",
+                                           completion_window="24h")
+        state = {"batch_id": batch.id, "input_file_id": upload.id, "keys": keys, "submitted_at": time.time()}
+        self._write_json(self.batch_path, state)
+        return state
+
+    def _load_batch(self):
+        if not os.path.exists(self.batch_path):
+            return None
+        with open(self.batch_path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _poll(self, batch_id, progress, poll_interval):
+        start = progress.n
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            if counts is not None:
+                progress.n = start + counts.completed + counts.failed
+                progress.set_postfix_str(batch.status)
+                progress.refresh()
+            if batch.status in BATCH_DONE:
+                progress.n = start
+                return batch
+            time.sleep(poll_interval)
+
+    def _batch_results(self, batch):
+        """(key, answer text or None, error or None) for every line of the output and error files."""
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or (response.get("body") or {}).get("error") or "request failed"
+                    yield record["custom_id"], None, json.dumps(error) if not isinstance(error, str) else error
+                else:
+                    yield record["custom_id"], response["body"]["choices"][0]["message"]["content"], None
+
+    # ✅ Fallback: bounded number of concurrent chat-completion requests
+    def _run_pool(self, pending, counts, progress, concurrency):
+        import openai
+
+        def generate(key):
+            body = request_body(self.builder, pending[key][1], self.model)
+            try:
+                response = self.client.chat.completions.create(**body)
+                return key, response.choices[0].message.content, None
+            except openai.OpenAIError as e:
+                return key, None, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for future in as_completed([pool.submit(generate, key) for key in pending]):
+                key, text, error = future.result()
+                self._finish(key, pending[key], text, error, counts, progress)
+
+    # ✅ Content-addressed artifacts and the append-only manifest
+    def _finish(self, key, item, text, error, counts, progress):
+        if key in self.finished or key in self.done:
+            return
+        self.finished.add(key)
+        item_id, description = item
+        entry = {"key": key, "id": item_id, "description": description, "model": self.model,
+                 "prompt": self.builder.version, "finished_at": time.time()}
+        if error is not None:
+            entry.update(status="failed", error=error)
+        else:
+            code = extract_code(text)
+            problems = validate(code)
+            entry.update(status="invalid" if problems else "ok", problems=problems,
+                         script=self.store(code))
+        counts[entry["status"]] += 1
+        if entry["status"] != "failed":  # failures are retried on the next run
+            with self.lock:
+                with open(self.manifest_path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(entry) + "\n")
+                self.done[key] = entry
+        progress.update(1)
+
+    def store(self, code):
+        digest = hashlib.sha256(code.encode()).hexdigest()
+        relative = os.path.join("scripts", digest[:2], f"{digest}.py")
+        path = os.path.join(self.out_dir, relative)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_text(path, code)
+        return relative
+
+    def _write_json(self, path, data):
+        self._write_text(path, json.dumps(data))
+
+    def _write_text(self, path, text):
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp, path)
@@ -0,0 +1,204 @@
+"""Bounded chat session store shared by all workers.
+
+Sessions live in a SQLite table (WAL mode) so every gunicorn worker sees the
+same step machine state, and rows idle for longer than ``ttl`` or beyond
+``max_sessions`` are evicted. Each process keeps a small lock-striped LRU in
+front of it. Every write also appends the user id to a ``session_changes``
+log in the same transaction. When SQLite's ``data_version`` shows another
+connection committed (which includes writes to other tables in the file),
+a process reads only the new log rows and invalidates just those users, so
+a cached record stays valid until its own user's session changes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import shared_db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT PRIMARY KEY,
+    step TEXT NOT NULL,
+    model_type TEXT,
+    data TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+CREATE TABLE IF NOT EXISTS session_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL
+);
+"""
+
+ALL_USERS = "*"  # change-log entry invalidating every cached session (bulk eviction)
+CHANGE_LOG_ROWS = 10000  # rows kept; a process further behind than this drops its whole cache
+CHANGED_USERS_MAX = 50000
+
+
+class SessionRecord:
+    """One user's step machine state."""
+
+    __slots__ = ("user_id", "step", "model_type", "data", "updated_at")
+
+    def __init__(self, user_id, step="start", model_type=None, data=None, updated_at=0.0):
+        self.user_id = user_id
+        self.step = step
+        self.model_type = model_type
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    def copy(self):
+        return SessionRecord(self.user_id, self.step, self.model_type, dict(self.data), self.updated_at)
+
+
+class _Stripe:
+    __slots__ = ("lock", "entries")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()
+
+
+class SessionStore:
+    """SQLite-backed sessions with idle-TTL/max-size eviction and a striped local cache."""
+
+    def __init__(self, path, ttl=86400, max_sessions=100000, stripes=16, local_size=4096, evict_every=500):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        self.stripe_size = max(1, local_size // stripes)
+        self.evict_every = evict_every
+        self.writes = 0
+        self.watch_lock = threading.Lock()
+        self.watch = None
+        self.watch_version = None
+        self.changed = {}  # user_id -> latest change-log seq seen for them
+        self.floor = 0  # entries loaded before this seq are stale
+        self._init_schema()
+        self.position = self._log_end()  # change-log seq applied to this process's cache
+
+    def _init_schema(self):
+        shared_db.connect(self.path).executescript(_SCHEMA)
+
+    def _log_end(self):
+        return shared_db.connect(self.path).execute("SELECT COALESCE(MAX(seq), 0) FROM session_changes").fetchone()[0]
+
+    def _stripe(self, user_id):
+        return self.stripes[zlib.crc32(user_id.encode()) % len(self.stripes)]
+
+    def _sync(self):
+        """Apply change-log rows committed by other connections; returns the seq applied so far."""
+        with self.watch_lock:
+            # A dedicated connection: data_version only moves for commits made by *other* connections.
+            if self.watch is None or self.watch[0] != os.getpid():
+                self.watch = (os.getpid(), sqlite3.connect(self.path, check_same_thread=False, isolation_level=None))
+            version = self.watch[1].execute("PRAGMA data_version").fetchone()[0]
+            if version != self.watch_version:
+                self.watch_version = version
+                rows = self.watch[1].execute(
+                    "SELECT seq, user_id FROM session_changes WHERE seq > ? ORDER BY seq", (self.position,)
+                ).fetchall()
+                if rows and rows[0][0] > self.position + 1 and self.position:
+                    self.floor = rows[-1][0]  # the log was trimmed past us: anything could have changed
+                for seq, user_id in rows:
+                    if user_id == ALL_USERS:
+                        self.floor = seq
+                    else:
+                        self.changed[user_id] = seq
+                if rows:
+                    self.position = rows[-1][0]
+                if len(self.changed) > CHANGED_USERS_MAX:
+                    self.floor, self.changed = self.position, {}
+            return self.position
+
+    def _fresh(self, user_id, loaded_at):
+        return loaded_at >= self.floor and self.changed.get(user_id, 0) <= loaded_at
+
+    def _write(self, user_id, sql, params):
+        """Run one write and log the change in the same transaction; returns the change's seq."""
+        db = shared_db.connect(self.path)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(sql, params)
+            seq = db.execute("INSERT INTO session_changes (user_id) VALUES (?)", (user_id,)).lastrowid
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return seq
+
+    def lock(self, user_id):
+        """Lock serialising read-modify-write of one user's session within this process."""
+        return self._stripe(user_id).lock
+
+    def get(self, user_id):
+        """The user's session (a copy), or a fresh one if missing or idle past the TTL."""
+        stripe = self._stripe(user_id)
+        now = time.time()
+        with stripe.lock:
+            position = self._sync()
+            entry = stripe.entries.get(user_id)
+            if entry is not None and self._fresh(user_id, entry[0]):
+                stripe.entries.move_to_end(user_id)
+                record = entry[1]
+            else:
+                row = shared_db.connect(self.path).execute(
+                    "SELECT step, model_type, data, updated_at FROM sessions WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                record = SessionRecord(user_id, row[0], row[1], json.loads(row[2] or "{}"), row[3]) if row else None
+                self._remember(stripe, user_id, position, record)
+        if record is None or now - record.updated_at > self.ttl:
+            return SessionRecord(user_id)
+        return record.copy()
+
+    def save(self, record):
+        """Persist a session (stamping its activity time) and refresh the local cache."""
+        record.updated_at = time.time()
+        stripe = self._stripe(record.user_id)
+        with stripe.lock:
+            seq = self._write(
+                record.user_id,
+                "INSERT INTO sessions (user_id, step, model_type, data, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET step = excluded.step, model_type = excluded.model_type, "
+                "data = excluded.data, updated_at = excluded.updated_at",
+                (record.user_id, record.step, record.model_type, json.dumps(record.data), record.updated_at),
+            )
+            # Tagged with our own change, so it stays valid until someone else changes this user.
+            self._remember(stripe, record.user_id, seq, record.copy())
+        self.writes += 1
+        if self.writes % self.evict_every == 0:
+            self.evict()
+
+    def delete(self, user_id):
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            self._write(user_id, "DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            stripe.entries.pop(user_id, None)
+
+    def evict(self):
+        """Drop sessions idle past the TTL, then the oldest ones beyond ``max_sessions``."""
+        db = shared_db.connect(self.path)
+        db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+        excess = db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+        if excess > 0:
+            self._write(
+                ALL_USERS,
+                "DELETE FROM sessions WHERE user_id IN (SELECT user_id FROM sessions ORDER BY updated_at LIMIT ?)",
+                (excess,),
+            )
+        db.execute("DELETE FROM session_changes WHERE seq <= (SELECT MAX(seq) FROM session_changes) - ?",
+                   (CHANGE_LOG_ROWS,))
+
+    def _remember(self, stripe, user_id, loaded_at, record):
+        stripe.entries[user_id] = (loaded_at, record)
+        stripe.entries.move_to_end(user_id)
+        while len(stripe.entries) > self.stripe_size:
+            stripe.entries.popitem(last=False)
+
+    def __len__(self):
+        return shared_db.connect(self.path).execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
@@ -0,0 +1,28 @@
+"""SQLite connections for state shared between gunicorn workers.
+
+Connections are per thread and per process (a connection inherited across
+fork is never reused), run in WAL mode so readers don't block the writer,
+and use autocommit so callers open ``BEGIN IMMEDIATE`` only where they need
+a read-modify-write transaction.
+"""
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(path):
+    """This thread's connection to the database at ``path``, created on first use."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    pid = os.getpid()
+    entry = connections.get(path)
+    if entry is None or entry[0] != pid:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = sqlite3.connect(path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        entry = connections[path] = (pid, connection)
+    return entry[1]
@@ -0,0 +1,225 @@
+"""Speculative answers, generated while the user is still in the chat's step machine.
+
+Once a session reaches ``ready`` the model type is known, and the first
+question is usually one of a few: a base script for that model type, or a
+question other users with the same model type asked first. :class:`Speculator`
+learns those first questions per model type (``observe``), counting a
+question only once ``min_askers`` distinct users asked it, and, when a
+session becomes ready, queues the ``fanout`` most likely ones on a small
+low-priority thread pool. Only the seed questions are returned as
+suggestions, so no user's own words are shown to anyone else. The app's ``generate`` callable answers each one
+into the shared response cache unless it is already cached, so the real
+request becomes a cache hit. Speculative fills are recorded in SQLite,
+shared by all workers, together with their token cost and whether a real
+request used them. Speculation stays within ``budget_tokens`` per hour, is
+skipped while real LLM traffic is busy, and backs off in proportion when
+the hit rate over recent settled fills drops below ``min_hit_rate``.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import shared_db
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS speculations (
+    cache_key TEXT PRIMARY KEY,
+    model_type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS speculations_created ON speculations (created_at);
+CREATE TABLE IF NOT EXISTS first_question_askers (
+    model_type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    asker TEXT NOT NULL,
+    asked_at REAL NOT NULL,
+    PRIMARY KEY (model_type, question, asker)
+);
+"""
+
+# Asked by nobody yet, but the usual first requests for any model type.
+SEED_QUESTIONS = (
+    "Write a basic Abaqus Python script for a {model_type} model.",
+    "Which element type should I use for a {model_type} model?",
+    "How do I apply boundary conditions and loads to a {model_type} model?",
+)
+
+
+def normalize(question):
+    return " ".join(question.split())
+
+
+class Speculator:
+    def __init__(self, path, generate, fanout=3, budget_tokens=200000, ttl=600, min_hit_rate=0.2,
+                 min_samples=20, window=200, workers=1, queue=32, busy=None, registry=None, seeds=SEED_QUESTIONS,
+                 min_askers=3):
+        """``generate(model_type, question, context)`` returns (cache_key, tokens spent, or None if already cached)."""
+        self.path = path
+        self.generate = generate
+        self.fanout = fanout
+        self.budget_tokens = budget_tokens
+        self.ttl = ttl
+        self.min_hit_rate = min_hit_rate
+        self.min_samples = min_samples
+        self.window = window
+        self.workers = workers
+        self.queue = queue
+        self.busy = busy or (lambda: False)
+        self.registry = registry
+        self.seeds = seeds
+        self.min_askers = min_askers
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.executor = None
+        self.executor_pid = None
+        self.writes = 0
+        shared_db.connect(path).executescript(_SCHEMA)
+        if registry is not None:
+            registry.counter("speculation_total", "Speculative answers by outcome (generated, cached, skipped, failed).")
+            registry.counter("speculation_hits_total", "Real requests served by a speculative answer.")
+
+    # ✅ What to speculate: first questions many users asked for a model type, then the seeds
+    def observe(self, model_type, question, user_id):
+        """Record ``question`` as the first one ``user_id`` asked after their session became ready."""
+        asker = hashlib.sha256(str(user_id).encode()).hexdigest()[:16]
+        shared_db.connect(self.path).execute(
+            "INSERT INTO first_question_askers (model_type, question, asker, asked_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(model_type, question, asker) DO UPDATE SET asked_at = excluded.asked_at",
+            (model_type or "", normalize(question), asker, time.time()),
+        )
+
+    def candidates(self, model_type, count):
+        """Questions asked first by at least ``min_askers`` distinct users, then the seeds."""
+        learned = [row[0] for row in shared_db.connect(self.path).execute(
+            "SELECT question FROM first_question_askers WHERE model_type = ? GROUP BY question "
+            "HAVING COUNT(*) >= ? ORDER BY COUNT(*) DESC, MAX(asked_at) DESC LIMIT ?",
+            (model_type or "", self.min_askers, count),
+        )]
+        seeds = [seed.format(model_type=model_type) for seed in self.seeds]
+        learned_lower = {question.lower() for question in learned}
+        return (learned + [seed for seed in seeds if seed.lower() not in learned_lower])[:count]
+
+    # ✅ Throttling: token budget per hour and a sampling rate that follows the hit rate
+    def spent(self, window=3600):
+        return shared_db.connect(self.path).execute(
+            "SELECT COALESCE(SUM(tokens), 0) FROM speculations WHERE created_at > ?", (time.time() - window,)
+        ).fetchone()[0]
+
+    def hit_rate(self):
+        """(hit rate, samples) over the latest fills that were used or have expired unused."""
+        hits, samples = shared_db.connect(self.path).execute(
+            "SELECT COALESCE(SUM(hits > 0), 0), COUNT(*) FROM (SELECT hits FROM speculations "
+            "WHERE hits > 0 OR expires_at < ? ORDER BY created_at DESC LIMIT ?)",
+            (time.time(), self.window),
+        ).fetchone()
+        return (hits / samples if samples else None), samples
+
+    def sample_rate(self):
+        rate, samples = self.hit_rate()
+        if rate is None or samples < self.min_samples or rate >= self.min_hit_rate:
+            return 1.0
+        return max(0.05, rate / self.min_hit_rate)  # keep probing so a recovering hit rate is noticed
+
+    def schedule(self, model_type, context=None):
+        """Queue speculative answers for a session that just became ready.
+
+        ``context`` (the session's other details) is passed through to ``generate``. Returns the
+        queued seed questions, safe to show as suggestions; learned questions are other users'
+        own words and are answered into the cache but never echoed back."""
+        rate = self.sample_rate()
+        if rate < 1.0 and random.random() >= rate:
+            self._count("throttled")
+            return []
+        if self.spent() >= self.budget_tokens:
+            self._count("over_budget")
+            return []
+        questions = self.candidates(model_type, self.fanout if rate >= 1.0 else 1)
+        executor = self._executor()
+        queued = []
+        for question in questions:
+            with self.lock:
+                if self.pending >= self.queue:
+                    self._count("queue_full")
+                    break
+                self.pending += 1
+            executor.submit(self._run, model_type, question, context)
+            queued.append(question)
+        seeds = {seed.format(model_type=model_type) for seed in self.seeds}
+        return [question for question in queued if question in seeds]
+
+    def hit(self, cache_key):
+        """Count a cache hit on ``cache_key``; True when it was filled speculatively."""
+        used = shared_db.connect(self.path).execute(
+            "UPDATE speculations SET hits = hits + 1 WHERE cache_key = ? AND expires_at > ?", (cache_key, time.time())
+        ).rowcount
+        if used and self.registry is not None:
+            self.registry.inc("speculation_hits_total")
+        return bool(used)
+
+    def report(self):
+        rate, samples = self.hit_rate()
+        return {"hit_rate": None if rate is None else round(rate, 3), "settled": samples,
+                "sample_rate": round(self.sample_rate(), 3), "tokens_last_hour": self.spent(),
+                "budget_tokens": self.budget_tokens, "pending": self.pending}
+
+    # ✅ Background generation on a low-priority pool (created lazily, once per process)
+    def _executor(self):
+        if self.executor_pid != os.getpid():
+            with self.lock:
+                if self.executor_pid != os.getpid():
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="speculation",
+                                                       initializer=_lower_priority)
+                    self.pending = 0
+                    self.executor_pid = os.getpid()
+        return self.executor
+
+    def _run(self, model_type, question, context):
+        try:
+            if self.busy():
+                self._count("busy")
+                return
+            cache_key, tokens = self.generate(model_type, question, context)
+            if tokens is None:
+                self._count("cached")
+                return
+            now = time.time()
+            db = shared_db.connect(self.path)
+            db.execute(
+                "INSERT INTO speculations (cache_key, model_type, question, tokens, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(cache_key) DO UPDATE SET tokens = excluded.tokens, "
+                "hits = 0, created_at = excluded.created_at, expires_at = excluded.expires_at",
+                (cache_key, model_type or "", question, tokens, now, now + self.ttl),
+            )
+            self._count("generated")
+            with self.lock:
+                self.writes += 1
+                trim = self.writes % 100 == 0
+            if trim:
+                db.execute("DELETE FROM speculations WHERE created_at < ?", (now - 86400,))
+        except Exception:
+            log.exception("⚠️ Speculative answer failed (model type %r)", model_type)
+            self._count("failed")  # speculation is best effort; the real request generates as usual
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def _count(self, outcome):
+        if self.registry is not None:
+            self.registry.inc("speculation_total", outcome=outcome)
+
+
+def _lower_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)  # Linux: per-thread nice value
+    except (AttributeError, OSError):
+        pass
@@ -0,0 +1,54 @@
+"""Input deck parsing edge cases (run from the repo root: python -m unittest discover -s tests)."""
+import os
+import tempfile
+import unittest
+
+import inp_parser
+
+NODES = "*NODE\n1, 0.0, 0.0, 0.0\n2, 1.0, 0.0, 0.0\n3, 1.0, 1.0, 0.0\n4, 0.0, 1.0, 0.0\n"
+
+
+class ParseTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def deck(self, text, name="model.inp"):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as file:
+            file.write(text)
+        return path
+
+    def test_valid_deck(self):
+        deck = inp_parser.parse_inp(self.deck(NODES + "*ELEMENT, TYPE=S4R\n1, 1, 2, 3, 4\n"))
+        self.assertEqual(len(deck.node_ids), 4)
+        self.assertEqual(deck.elements["S4R"].connectivity.tolist(), [[1, 2, 3, 4]])
+
+    def test_malformed_value_is_an_error_not_a_truncation(self):
+        for line in ("5, 1.0d0, 2.0, 0.0", "5, x, 2.0, 0.0", "5, , 2.0, 0.0"):
+            with self.subTest(line=line), self.assertRaises(ValueError):
+                inp_parser.parse_inp(self.deck(NODES + line + "\n6, 2.0, 2.0, 0.0\n"))
+
+    def test_generate_set(self):
+        deck = inp_parser.parse_inp(self.deck(NODES + "*NSET, NSET=ALL, GENERATE\n1, 4, 2\n"))
+        self.assertEqual(sorted(deck.nsets["ALL"].tolist()), [1, 3])
+
+    def test_generate_needs_start_and_end(self):
+        for line in ("1", "1, 4, 0", "1, x"):
+            with self.subTest(line=line), self.assertRaises(ValueError):
+                inp_parser.parse_inp(self.deck(NODES + "*NSET, NSET=ALL, GENERATE\n" + line + "\n"))
+
+    def test_include_under_deck_directory(self):
+        os.mkdir(os.path.join(self.dir.name, "mesh"))
+        self.deck(NODES, "mesh/nodes.inp")
+        deck = inp_parser.parse_inp(self.deck("*INCLUDE, INPUT=mesh/nodes.inp\n"))
+        self.assertEqual(len(deck.node_ids), 4)
+
+    def test_include_outside_deck_directory(self):
+        for include in ("../outside.inp", "/etc/passwd", "/dev/zero"):
+            with self.subTest(include=include), self.assertRaises(ValueError):
+                inp_parser.parse_inp(self.deck(f"*INCLUDE, INPUT={include}\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Connection warming against the mock upstream (run from the repo root: python -m unittest discover -s tests).
+
+The mock adds ``handshake_delay`` to the first request on every new
+connection, so a warmed transport must serve API requests on reused
+connections without paying it, and the mock must see no new connections.
+"""
+import asyncio
+import threading
+import time
+import unittest
+
+from aiohttp import web
+
+import metrics
+import mock_openai
+import upstream
+
+HANDSHAKE_DELAY = 0.3
+BODY = {"model": "gpt-4", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 5}
+
+
+class MockUpstream:
+    """mock_openai's app on an ephemeral port, served from a background event loop."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(mock_openai.create_app(settings))
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self._call(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self._call(site.start())
+        self.port = self.runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(10)
+
+    def stats(self):
+        return dict(self.settings.counts)
+
+    def close(self):
+        self._call(self.runner.cleanup())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class WarmTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockUpstream(mock_openai.MockSettings(latency="fixed:0", tokens_per_second=0,
+                                                          handshake_delay=HANDSHAKE_DELAY))
+        self.registry = metrics.Registry()
+        self.transport = upstream.UpstreamTransport(self.mock.base_url, min_warm=2, http2=False)
+        self.transport.init_metrics(self.registry)
+
+    def tearDown(self):
+        self.transport.client().close()
+        self.mock.close()
+
+    def requests(self, purpose, connection):
+        key = ("upstream_requests_total", (("connection", connection), ("purpose", purpose)))
+        return self.registry.collect().get(key, 0)
+
+    def post(self):
+        started = time.perf_counter()
+        response = self.transport.client().post(self.mock.base_url + "/chat/completions", json=BODY)
+        response.read()
+        self.assertEqual(response.status_code, 200)
+        return time.perf_counter() - started
+
+    def test_warm_connections_are_reused_by_api_requests(self):
+        self.transport.warm()
+        self.assertEqual(self.requests("warm", "new"), 2)
+        connections = self.mock.stats()["connections"]
+        self.assertEqual(connections, 2)
+
+        elapsed = [self.post() for _ in range(4)]
+
+        self.assertEqual(self.requests("api", "reused"), 4)
+        self.assertEqual(self.requests("api", "new"), 0)
+        self.assertEqual(self.mock.stats()["connections"], connections)
+        self.assertLess(max(elapsed), HANDSHAKE_DELAY)
+
+    def test_cold_transport_pays_the_handshake(self):
+        elapsed = self.post()
+
+        self.assertEqual(self.requests("api", "new"), 1)
+        self.assertEqual(self.mock.stats()["connections"], 1)
+        self.assertGreaterEqual(elapsed, HANDSHAKE_DELAY)
+
+
+if __name__ == "__main__":
+    unittest.main()
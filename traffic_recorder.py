@@ -0,0 +1,103 @@
+"""Sampled, scrubbed recording of API traffic for replay load tests (see replay.py).
+
+Each recorded request becomes one JSON line: arrival time, method, path,
+scrubbed JSON body, status, latency and the ``X-Cache`` header. Sampling is
+per user (a stable hash of ``user_id``) so recorded conversations stay
+whole and replay through the same step machine. Lines are written with a
+single ``O_APPEND`` write, so every worker can share one file.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+from flask import g, request
+
+DEFAULT_PATHS = ("/chat", "/generate_script")
+
+_SCRUBBERS = (
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"\bsk-[A-Za-z0-9_-]{16,}"), "<secret>"),
+    (re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._~+/=-]{16,}"), "Bearer <secret>"),
+    (re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b"), "<ip>"),
+)
+
+
+def scrub_text(text):
+    for pattern, replacement in _SCRUBBERS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def pseudonym(user_id):
+    """Stable stand-in for a user id, so replayed sessions stay distinct but anonymous."""
+    return "user-" + hashlib.sha256(str(user_id).encode()).hexdigest()[:12]
+
+
+def scrub(payload):
+    if isinstance(payload, dict):
+        return {key: pseudonym(value) if key == "user_id" else scrub(value) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [scrub(value) for value in payload]
+    if isinstance(payload, str):
+        return scrub_text(payload)
+    return payload
+
+
+class TrafficRecorder:
+    """Flask before/after-request hooks appending sampled requests to a JSONL file."""
+
+    def __init__(self, path, sample_rate=0.0, paths=DEFAULT_PATHS):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.paths = set(paths)
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        if self.sample_rate <= 0:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        app.before_request(self._before)
+        app.after_request(self._after)
+
+    def sampled(self, payload):
+        user_id = payload.get("user_id") if isinstance(payload, dict) else None
+        if user_id is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(str(user_id).encode()) / 2 ** 32 < self.sample_rate
+
+    def _before(self):
+        if request.path in self.paths:
+            g.traffic_started = time.time()
+
+    def _after(self, response):
+        started = g.pop("traffic_started", None)
+        if started is None:
+            return response
+        payload = request.get_json(silent=True)
+        if not self.sampled(payload):
+            return response
+        record = {
+            "ts": round(started, 6),
+            "method": request.method,
+            "path": request.path,
+            "json": scrub(payload),
+            "status": response.status_code,
+            "latency_ms": round((time.time() - started) * 1000, 3),
+            "cache": response.headers.get("X-Cache"),
+        }
+        self.append(record)
+        return response
+
+    def append(self, record):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        with self.lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
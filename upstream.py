@@ -0,0 +1,130 @@
+"""Shared HTTP transport for upstream LLM calls, kept warm in the background.
+
+One ``httpx`` client per worker process carries every upstream request, with
+keep-alive tuned to outlive the gaps between requests and HTTP/2 when the
+optional ``h2`` package is installed. A daemon thread opens ``min_warm``
+connections as soon as the worker starts and, whenever upstream has been
+idle for ``warm_interval`` seconds, sends cheap concurrent ``GET /models``
+requests to refresh or reopen them, so the first request after a quiet
+spell does not pay DNS, TCP and TLS setup. httpcore trace events feed the metrics: requests on new versus
+reused connections, and how long TCP connects and TLS handshakes took.
+"""
+import importlib.util
+import os
+import threading
+import time
+
+WARM_PATH = "/models"
+
+
+class UpstreamTransport:
+    def __init__(self, base_url, api_key=None, max_connections=64, keepalive=16, keepalive_expiry=90.0,
+                 min_warm=2, warm_interval=30.0, http2=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.keepalive = keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.min_warm = min_warm
+        self.warm_interval = warm_interval
+        self.http2 = importlib.util.find_spec("h2") is not None if http2 is None else http2
+        self.registry = None
+        self.lock = threading.Lock()
+        self.pid = None
+        self.warmer_pid = None
+        self.transport = None
+        self.http_client = None
+        self.last_used = 0.0  # last real request or warming round, time.monotonic()
+
+    def client(self):
+        """This process's ``httpx.Client`` (rebuilt after a fork: sockets must not be shared)."""
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    import httpx
+
+                    self.transport = httpx.HTTPTransport(
+                        http2=self.http2, retries=0,
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.keepalive,
+                                            keepalive_expiry=self.keepalive_expiry))
+                    self.http_client = httpx.Client(
+                        transport=self.transport, follow_redirects=True,
+                        timeout=httpx.Timeout(60.0, connect=5.0),
+                        event_hooks={"request": [self._trace_request]})
+                    self.pid = os.getpid()
+        return self.http_client
+
+    # ✅ Connection reuse and handshake metrics from httpcore trace events
+    def init_metrics(self, registry):
+        self.registry = registry
+        registry.counter("upstream_requests_total", "Upstream HTTP requests by purpose and new/reused connection.")
+        registry.histogram("upstream_handshake_seconds", "Upstream TCP connect and TLS handshake time.")
+        registry.gauge("upstream_idle_connections", "Idle pooled upstream connections, sampled by the warmer.")
+
+    def _trace_request(self, request):
+        purpose = "warm" if request.extensions.get("warm") else "api"
+        if purpose == "api":
+            self.last_used = time.monotonic()
+        started, state = {}, {"new": False}
+
+        def trace(name, info):
+            event, _, phase = name.rpartition(".")
+            if event in ("connection.connect_tcp", "connection.start_tls"):
+                state["new"] = True
+                if phase == "started":
+                    started[event] = time.perf_counter()
+                elif phase == "complete" and self.registry is not None:
+                    self.registry.observe("upstream_handshake_seconds", time.perf_counter() - started.pop(event),
+                                          phase="tcp" if event.endswith("tcp") else "tls")
+            elif event.endswith(".send_request_headers") and phase == "started" and self.registry is not None:
+                self.registry.inc("upstream_requests_total", purpose=purpose,
+                                  connection="new" if state["new"] else "reused")
+
+        request.extensions["trace"] = trace
+
+    # ✅ Background warming
+    def idle_connections(self):
+        pool = getattr(self.transport, "_pool", None)  # httpcore.ConnectionPool behind httpx.HTTPTransport
+        return sum(1 for connection in getattr(pool, "connections", ()) if connection.is_idle())
+
+    def warm(self):
+        """Open or refresh up to ``min_warm`` connections with concurrent lightweight requests."""
+        client = self.client()
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        count = 1 if self.http2 else self.min_warm  # HTTP/2 multiplexes over one connection
+
+        def ping():
+            try:
+                client.get(self.base_url + WARM_PATH, headers=headers, extensions={"warm": True}).close()
+            except Exception:
+                pass  # warming is best effort; the next real request connects as usual
+
+        threads = [threading.Thread(target=ping, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.last_used = time.monotonic()
+        if self.registry is not None:
+            self.registry.set("upstream_idle_connections", self.idle_connections())
+
+    def start(self):
+        """Start this process's warming thread (once per process; a no-op when ``min_warm`` is 0)."""
+        if self.min_warm <= 0 or self.warmer_pid == os.getpid():
+            return
+        with self.lock:
+            if self.warmer_pid == os.getpid():
+                return
+            self.warmer_pid = os.getpid()
+        threading.Thread(target=self._warm_loop, name="upstream-warm", daemon=True).start()
+
+    def _warm_loop(self):
+        self.warm()
+        while self.warmer_pid == os.getpid():
+            time.sleep(min(5.0, self.warm_interval))
+            if time.monotonic() - self.last_used >= self.warm_interval:
+                self.warm()
+
+    def init_app(self, app):
+        app.before_request(self.start)
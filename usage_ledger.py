@@ -0,0 +1,210 @@
+"""Token and cost accounting per user, endpoint, model and cache outcome.
+
+``record`` only appends to an in-memory ring buffer. A background thread
+flushes it every ``flush_interval`` seconds, or as soon as it is half full: the
+events are summed into time buckets and added to a SQLite table shared by
+all workers, one UPSERT per bucket row. Cache hits are recorded with the
+tokens the answer would have cost, so the report can show what caching
+saved next to what was spent. Prices are USD per million tokens and can be
+overridden with a JSON mapping (see ``load_prices``).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import shared_db
+
+log = logging.getLogger(__name__)
+
+# model: (input, cached input, output) USD per 1M tokens; matched by longest prefix
+DEFAULT_PRICES = {
+    "gpt-4": (30.0, 30.0, 60.0),
+    "gpt-4-turbo": (10.0, 10.0, 30.0),
+    "gpt-4o": (2.5, 1.25, 10.0),
+    "gpt-4o-mini": (0.15, 0.075, 0.6),
+    "gpt-4.1": (2.0, 0.5, 8.0),
+    "gpt-4.1-mini": (0.4, 0.1, 1.6),
+    "gpt-3.5-turbo": (0.5, 0.5, 1.5),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_buckets (
+    bucket_start INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    model TEXT NOT NULL,
+    cache TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    PRIMARY KEY (bucket_start, user_id, endpoint, model, cache)
+);
+CREATE INDEX IF NOT EXISTS usage_buckets_start ON usage_buckets (bucket_start);
+"""
+
+GROUPS = {"user": "user_id", "endpoint": "endpoint", "model": "model", "cache": "cache"}
+
+
+def load_prices(value=None):
+    """DEFAULT_PRICES updated from a JSON object of model -> [input, cached input, output]."""
+    prices = dict(DEFAULT_PRICES)
+    if value:
+        prices.update({model: tuple(rates) for model, rates in json.loads(value).items()})
+    return prices
+
+
+class UsageLedger:
+    """Buffered per-request token records aggregated into SQLite time buckets."""
+
+    def __init__(self, path, bucket_seconds=60, flush_interval=5.0, capacity=10000, prices=None):
+        self.path = path
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=capacity)
+        self.capacity = capacity
+        self.prices = prices or dict(DEFAULT_PRICES)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flusher_pid = None
+        self.wake = threading.Event()
+        self.dropped = 0
+        shared_db.connect(path).executescript(_SCHEMA)
+        atexit.register(self.flush)
+
+    def record(self, user_id, endpoint, model, cache, prompt_tokens, completion_tokens, cached_tokens=0):
+        event = (time.time(), str(user_id), endpoint, model, cache,
+                 int(prompt_tokens or 0), int(cached_tokens or 0), int(completion_tokens or 0))
+        with self.lock:
+            if len(self.buffer) == self.capacity:
+                self.dropped += 1  # only if flushing has fallen a whole buffer behind
+            self.buffer.append(event)
+            full = len(self.buffer) >= self.capacity // 2
+            if self.flusher_pid != os.getpid():  # threads don't survive fork
+                self.flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name="usage-flush", daemon=True).start()
+        if full:
+            self.wake.set()  # flush now, but on the flusher thread: a failing write must not fail the request
+
+    def _flush_loop(self):
+        while self.flusher_pid == os.getpid():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("⚠️ Usage ledger flush failed; %d events stay buffered for the next attempt",
+                              len(self.buffer))
+
+    def record_usage(self, user_id, endpoint, model, cache, usage):
+        """``record`` from an OpenAI ``usage`` object (ignored if missing)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record(user_id, endpoint, model, cache, getattr(usage, "prompt_tokens", 0),
+                    getattr(usage, "completion_tokens", 0), getattr(details, "cached_tokens", 0) if details else 0)
+
+    def flush(self):
+        if not self.flush_lock.acquire(blocking=False):
+            return  # another thread is already flushing
+        try:
+            with self.lock:
+                events = list(self.buffer)
+                self.buffer.clear()
+            if not events:
+                return
+            buckets = {}
+            for at, user_id, endpoint, model, cache, prompt, cached, completion in events:
+                key = (int(at // self.bucket_seconds * self.bucket_seconds), user_id, endpoint, model, cache)
+                row = buckets.setdefault(key, [0, 0, 0, 0])
+                row[0] += 1
+                row[1] += prompt
+                row[2] += cached
+                row[3] += completion
+            db = None
+            try:
+                db = shared_db.connect(self.path)
+                db.execute("BEGIN IMMEDIATE")
+                db.executemany(
+                    "INSERT INTO usage_buckets (bucket_start, user_id, endpoint, model, cache, requests, "
+                    "prompt_tokens, cached_tokens, completion_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(bucket_start, user_id, endpoint, model, cache) DO UPDATE SET "
+                    "requests = requests + excluded.requests, prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                    "cached_tokens = cached_tokens + excluded.cached_tokens, "
+                    "completion_tokens = completion_tokens + excluded.completion_tokens",
+                    [key + tuple(row) for key, row in buckets.items()],
+                )
+                db.execute("COMMIT")
+            except Exception:
+                if db is not None and db.in_transaction:
+                    db.execute("ROLLBACK")
+                with self.lock:  # keep the events for the next flush, ahead of newer ones; drop the oldest if full
+                    pending = events + list(self.buffer)
+                    overflow = max(0, len(pending) - self.capacity)
+                    self.dropped += overflow
+                    self.buffer.clear()
+                    self.buffer.extend(pending[overflow:])
+                raise
+        finally:
+            self.flush_lock.release()
+
+    # ✅ Pricing and reports
+    def price(self, model):
+        matches = [name for name in self.prices if model == name or model.startswith(name + "-")]
+        return self.prices[max(matches, key=len)] if matches else None
+
+    def cost(self, model, prompt_tokens, cached_tokens, completion_tokens):
+        """(spend, prompt-cache savings) in USD, or (None, None) for an unpriced model."""
+        rates = self.price(model)
+        if rates is None:
+            return None, None
+        input_rate, cached_rate, output_rate = rates
+        spend = ((prompt_tokens - cached_tokens) * input_rate + cached_tokens * cached_rate
+                 + completion_tokens * output_rate) / 1e6
+        return spend, cached_tokens * (input_rate - cached_rate) / 1e6
+
+    def report(self, window=3600, group_by="endpoint", top=50):
+        """Totals and per-group token throughput, spend and savings over the last ``window`` seconds."""
+        column = GROUPS[group_by]
+        self.flush()
+        since = int((time.time() - window) // self.bucket_seconds * self.bucket_seconds)
+        rows = shared_db.connect(self.path).execute(
+            f"SELECT {column}, model, cache, SUM(requests), SUM(prompt_tokens), SUM(cached_tokens), "
+            f"SUM(completion_tokens) FROM usage_buckets WHERE bucket_start >= ? GROUP BY {column}, model, cache",
+            (since,),
+        ).fetchall()
+
+        def empty():
+            return {"requests": 0, "llm_requests": 0, "cache_hits": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                    "completion_tokens": 0, "spend_usd": 0.0, "response_cache_savings_usd": 0.0,
+                    "prompt_cache_savings_usd": 0.0, "unpriced_tokens": 0}
+
+        groups, total = {}, empty()
+        for group, model, cache, requests, prompt, cached, completion in rows:
+            spend, prompt_savings = self.cost(model, prompt, cached, completion)
+            for entry in (groups.setdefault(group, empty()), total):
+                entry["requests"] += requests
+                if spend is None:
+                    entry["unpriced_tokens"] += prompt + completion
+                if cache == "hit":  # answered from the response cache: no tokens spent
+                    entry["cache_hits"] += requests
+                    entry["response_cache_savings_usd"] += spend or 0.0
+                    continue
+                entry["llm_requests"] += requests
+                entry["prompt_tokens"] += prompt
+                entry["cached_tokens"] += cached
+                entry["completion_tokens"] += completion
+                entry["spend_usd"] += spend or 0.0
+                entry["prompt_cache_savings_usd"] += prompt_savings or 0.0
+
+        for entry in list(groups.values()) + [total]:
+            entry["tokens_per_second"] = round((entry["prompt_tokens"] + entry["completion_tokens"]) / window, 3)
+            for key in ("spend_usd", "response_cache_savings_usd", "prompt_cache_savings_usd"):
+                entry[key] = round(entry[key], 6)
+        ranked = sorted(groups.items(), key=lambda item: (-item[1]["spend_usd"], -item[1]["prompt_tokens"]))
+        return {"window_seconds": window, "group_by": group_by, "total": total,
+                "groups": dict(ranked[:top]), "dropped_events": self.dropped}